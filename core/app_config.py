@@ -0,0 +1,110 @@
+"""
+进程内配置缓存
+option.yml和checked_api.txt在进程内只解析一次，得到不可变的配置快照；
+文件修改时间或大小变化后下次读取时重新解析，调用方不再反复读写配置文件。
+"""
+import os
+import copy
+import threading
+from types import MappingProxyType
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return copy.copy(value)
+
+
+def _file_stamp(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """某一时刻的option.yml与已验证域名列表（不可变）"""
+    config_path: str
+    data: MappingProxyType
+    checked_domains: Tuple[str, ...] = ()
+    domains_path: Optional[str] = None
+    stamps: Tuple[Any, ...] = ()
+
+    def get(self, *keys, default=None):
+        """按路径取值，例如 get('client', 'retry_times')"""
+        value: Any = self.data
+        for key in keys:
+            if not isinstance(value, MappingProxyType) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    @property
+    def domains(self) -> Tuple[str, ...]:
+        """优先使用checked_api.txt中的域名，否则使用option.yml中的域名"""
+        return self.checked_domains or tuple(self.get('client', 'domain', default=()))
+
+    def option_dict(self, domains=None) -> Dict[str, Any]:
+        """返回可交给JmOption.construct的可变副本，可以替换域名列表"""
+        data = _thaw(self.data)
+        if domains is not None:
+            data.setdefault('client', {})['domain'] = list(domains)
+        data.setdefault('filepath', self.config_path)
+        return data
+
+    def is_current(self) -> bool:
+        return self.stamps == (_file_stamp(self.config_path), _file_stamp(self.domains_path))
+
+
+_cache: Dict[Tuple[str, Optional[str]], ConfigSnapshot] = {}
+_lock = threading.Lock()
+
+
+def _read_snapshot(config_path: str, domains_path: Optional[str]) -> ConfigSnapshot:
+    # 先取时间戳再读文件，读取期间文件被改写时下次会重新加载
+    stamps = (_file_stamp(config_path), _file_stamp(domains_path))
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+
+    checked = ()
+    if stamps[1] is not None:
+        with open(domains_path, 'r', encoding='utf-8') as f:
+            checked = tuple(line.strip() for line in f if line.strip())
+
+    return ConfigSnapshot(
+        config_path=config_path,
+        data=_freeze(data),
+        checked_domains=checked,
+        domains_path=domains_path,
+        stamps=stamps
+    )
+
+
+def load_config(config_path: str, domains_path: Optional[str] = None) -> ConfigSnapshot:
+    """返回配置快照，文件未变化时直接复用上次解析的结果"""
+    key = (os.path.abspath(config_path), os.path.abspath(domains_path) if domains_path else None)
+    with _lock:
+        snapshot = _cache.get(key)
+        if snapshot is None or not snapshot.is_current():
+            snapshot = _read_snapshot(*key)
+            _cache[key] = snapshot
+        return snapshot
@@ -0,0 +1,23 @@
+"""
+各模块共用的文件工具
+应用数据目录和文件内容摘要。只依赖标准库，依赖检查（deps.py）之前也能导入。
+"""
+import os
+import hashlib
+from pathlib import Path
+
+
+def app_data_dir() -> Path:
+    """应用数据目录，与init_app.py保持一致"""
+    if os.name == 'nt':
+        return Path(os.environ.get('APPDATA', Path.home() / 'AppData' / 'Roaming')) / 'JMF'
+    return Path.home() / '.jmf'
+
+
+def file_digest(path: str) -> str:
+    """计算文件内容的SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
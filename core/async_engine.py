@@ -0,0 +1,246 @@
+"""
+asyncio下载引擎
+用一个事件循环代替jmcomic的线程池并发下载图片：每个域名一个信号量，
+另有全局并发上限和全局带宽限制，取消时所有请求立即停止。
+本子/章节信息仍由jmcomic的同步client获取（放在线程中执行），
+跳过已下载或已缓存的图片、写任务日志、提交预处理等沿用传入的下载器，两种引擎行为一致。
+"""
+import os
+import time
+import types
+import asyncio
+import threading
+from urllib.parse import urlparse
+from typing import Dict, Optional
+
+from jmcomic import JmImageResp, JmModuleConfig
+
+from concurrency import DownloadCancelled
+from http_pool import normalize_proxies
+
+
+class BandwidthLimiter:
+    """全局带宽限制（令牌桶），bytes_per_second为0时不限速"""
+
+    def __init__(self, bytes_per_second: int = 0, burst: Optional[int] = None):
+        self.rate = bytes_per_second
+        self.capacity = burst or bytes_per_second
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def consume(self, size: int):
+        """取走size字节的额度，额度不足时等待（持锁等待，先到先得）"""
+        if self.rate <= 0:
+            return
+
+        # asyncio.Lock需要在事件循环内创建
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= size
+            if self.tokens < 0:
+                await asyncio.sleep(-self.tokens / self.rate)
+
+
+class AsyncDownloadEngine:
+    """用asyncio下载整本的图片"""
+
+    def __init__(self,
+                 downloader,
+                 concurrency: int = 256,
+                 host_concurrency: int = 20,
+                 photo_concurrency: int = 8,
+                 bandwidth: int = 0,
+                 timeout: float = 30,
+                 retries: int = 3,
+                 cancel_event: Optional[threading.Event] = None):
+        self.downloader = downloader
+        self.option = downloader.option
+        self.client = downloader.client
+        self.concurrency = max(1, concurrency)
+        self.host_concurrency = max(1, host_concurrency)
+        self.photo_concurrency = max(1, photo_concurrency)
+        self.bandwidth = BandwidthLimiter(bandwidth)
+        self.timeout = timeout
+        self.retries = retries
+        self.cancel_event = cancel_event
+
+        self.session = None
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.global_semaphore: Optional[asyncio.Semaphore] = None
+        self.photo_semaphore: Optional[asyncio.Semaphore] = None
+
+    def run(self, album_id: str):
+        """下载本子，返回本子信息；被取消时抛出DownloadCancelled"""
+        return asyncio.run(self._run(album_id))
+
+    async def _run(self, album_id: str):
+        self.global_semaphore = asyncio.Semaphore(self.concurrency)
+        self.photo_semaphore = asyncio.Semaphore(self.photo_concurrency)
+        self.host_semaphores = {}
+
+        main = asyncio.ensure_future(self._download_album(album_id))
+        watcher = asyncio.ensure_future(self._watch_cancel(main))
+        try:
+            return await main
+        except asyncio.CancelledError:
+            raise DownloadCancelled('任务已取消')
+        finally:
+            watcher.cancel()
+
+    async def _watch_cancel(self, task: asyncio.Future):
+        if self.cancel_event is None:
+            return
+        while not task.done():
+            if self.cancel_event.is_set():
+                task.cancel()
+                return
+            await asyncio.sleep(0.2)
+
+    @staticmethod
+    async def _in_thread(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _session_kwargs(self) -> Dict:
+        meta_data = self.option.client.postman.meta_data
+        kwargs = {'max_clients': self.concurrency}
+        proxies = normalize_proxies(meta_data.get('proxies'))
+        if proxies:
+            kwargs['proxies'] = proxies
+        if meta_data.get('impersonate'):
+            kwargs['impersonate'] = meta_data.get('impersonate')
+        return kwargs
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.host_semaphores[host] = asyncio.Semaphore(self.host_concurrency)
+        return semaphore
+
+    async def _download_album(self, album_id: str):
+        from curl_cffi.requests import AsyncSession
+
+        dler = self.downloader
+        album = await self._in_thread(self.client.get_album_detail, album_id)
+
+        # jmcomic新版本才有manifest
+        if hasattr(dler, 'begin_manifest'):
+            dler.begin_manifest(album)
+
+        album.save_path = self.option.dir_rule.decide_album_root_dir(album)
+        dler.before_album(album)
+        if album.skip:
+            return album
+
+        async with AsyncSession(**self._session_kwargs()) as session:
+            self.session = session
+            await asyncio.gather(*(self._download_photo(photo) for photo in dler.do_filter(album)))
+        self.session = None
+
+        dler.after_album(album)
+        if hasattr(dler, 'finish_manifest'):
+            dler.finish_manifest(album)
+        return album
+
+    async def _download_photo(self, photo):
+        dler = self.downloader
+        try:
+            async with self.photo_semaphore:
+                await self._in_thread(self.client.check_photo, photo)
+                photo.save_path = self.option.decide_image_save_dir(photo)
+
+                dler.before_photo(photo)
+                if photo.skip:
+                    return
+
+                await asyncio.gather(*(self._download_image(image) for image in dler.do_filter(photo)))
+                dler.after_photo(photo)
+        except Exception as e:
+            print(f"章节下载失败 {photo.id}: {e}")
+            dler.download_failed_photo.append((photo, e))
+
+    async def _download_image(self, image):
+        dler = self.downloader
+        try:
+            img_save_path = self.option.decide_image_filepath(image)
+
+            # 任务日志或图片缓存中已有
+            skipped, key = await self._in_thread(dler.reuse_local_image, image, img_save_path)
+            if skipped:
+                return
+
+            image.save_path = img_save_path
+            image.exists = os.path.exists(img_save_path)
+            image.cache = self.option.decide_download_cache(image)
+
+            dler.before_image(image, img_save_path)
+            if image.skip:
+                return
+
+            if not (image.cache and image.exists):
+                started = time.perf_counter()
+                data = await self.fetch(image.download_url)
+                latency = time.perf_counter() - started
+                decode = self.option.decide_download_image_decode(image)
+                decode_time = await self._in_thread(self._save_image, image, data, img_save_path, decode)
+                await self._in_thread(dler.store_image, img_save_path, key)
+                dler.report_image(image, len(data), latency, decode=decode_time)
+
+            dler.after_image(image, img_save_path)
+        except Exception as e:
+            print(f"图片下载失败 {image.download_url}: {e}")
+            dler.download_failed_image.append((image, e))
+
+    async def fetch(self, url: str) -> bytes:
+        """下载一张图片，失败时按指数退避重试（退避期间不占用并发槽位）"""
+        host = urlparse(url).netloc
+        last_error = None
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.global_semaphore, self._host_semaphore(host):
+                    return await self._fetch_once(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+                if attempt < self.retries:
+                    await asyncio.sleep(min(0.5 * 2 ** attempt, 8))
+
+        raise last_error
+
+    async def _fetch_once(self, url: str) -> bytes:
+        resp = await self.session.get(
+            url,
+            headers=JmModuleConfig.new_html_headers(),
+            stream=True,
+            timeout=self.timeout
+        )
+        chunks = []
+        try:
+            if resp.status_code != 200:
+                raise RuntimeError(f"图片获取失败: [{url}]，http状态码={resp.status_code}")
+            async for chunk in resp.aiter_content():
+                await self.bandwidth.consume(len(chunk))
+                chunks.append(chunk)
+        finally:
+            await resp.aclose()
+
+        data = b''.join(chunks)
+        if not data:
+            raise RuntimeError(f"图片获取失败: [{url}]，响应数据为空")
+        return data
+
+    @staticmethod
+    def _save_image(image, data: bytes, img_save_path: str, decode: bool) -> float:
+        """解密并保存图片，与同步client的处理方式相同，返回耗时"""
+        started = time.perf_counter()
+        resp = types.SimpleNamespace(content=data, status_code=200, url=image.download_url)
+        scramble_id = int(image.scramble_id) if image.scramble_id is not None else None
+        JmImageResp(resp).transfer_to(img_save_path, scramble_id, decode, image.download_url)
+        return time.perf_counter() - started
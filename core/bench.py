@@ -0,0 +1,947 @@
+"""
+下载和PDF流水线的性能基准
+生成合成本子（JPEG/PNG/WebP/GIF混合，RGB/RGBA/P/L等模式，尺寸和页数各异），
+分别测量图片转PDF（convert_images_to_pdf，含各阶段耗时）、原样打包CBZ（build_cbz）以及通过本地模拟镜像站的完整下载流程，
+结果（pages/s、MB/s、峰值内存等）写入JSON，可以和以前版本的结果对比。
+startup项用 python -X importtime 测量 import downloader 和 downloader.py --help 的冷启动耗时，
+并检查启动时没有加载jmcomic、PIL等重量级包；--startup-budget-ms 设置启动耗时的预算。
+
+每个测试项在单独的子进程中运行，峰值内存互不影响；模拟镜像站运行在主进程中。
+
+--check 不测性能，检查依赖版本约束的判断，并用模拟镜像站检查行为：域名探测排序和运行期降级，在fpdf生成的PDF之后追加页面，
+以及线程和异步两种下载引擎的页数、失败重试和取消。有失败项时返回非零。
+
+用法:
+  python bench.py                                   # 默认测试项，结果写入bench_result.json
+  python bench.py --cases convert --pages 300       # 只测转换
+  python bench.py --latency-ms 80 --bandwidth-kb 1024 --baseline old.json
+  python bench.py --cases startup --startup-budget-ms 80  # 只测启动耗时
+  python bench.py --check --pages 24                # 行为检查
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import threading
+import contextlib
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from jmcomic import JmModuleConfig, JmAlbumDetail
+from jmcomic.jm_client_impl import AbstractJmClient
+
+# 测试项: 名称 -> 下载引擎（None表示只测转换）
+CASES = {
+    'convert': None,
+    'convert-cbz': None,
+    'download-thread': 'thread',
+    'download-async': 'async',
+}
+
+# 启动耗时测试项，在主进程中直接运行子进程测量
+STARTUP_CASE = 'startup'
+
+# 启动时（import downloader）不应加载的重量级包，只在用到的阶段导入
+HEAVY_MODULES = ('jmcomic', 'PIL', 'fpdf', 'natsort', 'curl_cffi')
+
+# 合成图片的格式和颜色模式组合
+SYNTHETIC_KINDS = [
+    ('JPEG', 'RGB'),
+    ('JPEG', 'L'),
+    ('PNG', 'RGBA'),
+    ('PNG', 'P'),
+    ('PNG', 'L'),
+    ('WEBP', 'RGB'),
+    ('WEBP', 'RGBA'),
+    ('GIF', 'P'),
+]
+
+SUFFIXES = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+
+CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+}
+
+# 合成本子的ID（大于jmcomic的分割阈值，下载时会执行和真实图片相同的解密切割）
+BENCH_ALBUM_ID = '350000'
+BENCH_SCRAMBLE_ID = '220980'
+
+
+def synthetic_image(rng: random.Random, image_format: str, mode: str) -> bytes:
+    """生成一张类似漫画页的图片：渐变背景、色块和一小块噪点（避免被压缩得过小）"""
+    from PIL import Image, ImageDraw
+
+    width = rng.choice((720, 900, 1080, 1400))
+    height = int(width * rng.uniform(1.3, 3.0))
+
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(8, 24)):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randint(40, width // 2), y0 + rng.randint(40, height // 3)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.ellipse((x0, y0, x1, y1), outline=color, width=rng.randint(2, 8))
+
+    noise_w, noise_h = width // 4, height // 8
+    noise = Image.frombytes('L', (noise_w, noise_h), rng.randbytes(noise_w * noise_h))
+    img.paste(noise.convert('RGB'), (rng.randrange(width - noise_w), rng.randrange(height - noise_h)))
+
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize((width, height)).point(lambda v: 255 - v // 2))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.ADAPTIVE, colors=64)
+    elif mode != 'RGB':
+        img = img.convert(mode)
+
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        img.save(buffer, 'JPEG', quality=rng.choice((80, 90, 95)))
+    elif image_format == 'WEBP':
+        img.save(buffer, 'WEBP', quality=85)
+    else:
+        img.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def generate_album(album_dir: str, pages: int, chapters: int, seed: int = 0) -> Dict[str, Any]:
+    """在album_dir下生成合成本子，每个章节一个子目录（目录名即章节ID），返回本子概况"""
+    rng = random.Random(seed)
+    shutil.rmtree(album_dir, ignore_errors=True)
+
+    chapters = max(1, min(chapters, pages))
+    # 各章节页数不同
+    weights = [rng.uniform(0.5, 1.5) for _ in range(chapters)]
+    counts = [max(1, int(pages * w / sum(weights))) for w in weights]
+    counts[-1] += pages - sum(counts)
+
+    kinds: Dict[str, int] = {}
+    total_bytes = 0
+    for index, count in enumerate(counts):
+        photo_dir = os.path.join(album_dir, str(int(BENCH_ALBUM_ID) + index))
+        os.makedirs(photo_dir)
+        for page in range(1, count + 1):
+            image_format, mode = rng.choice(SYNTHETIC_KINDS)
+            data = synthetic_image(rng, image_format, mode)
+            with open(os.path.join(photo_dir, f"{page:05d}{SUFFIXES[image_format]}"), 'wb') as f:
+                f.write(data)
+            kinds[f"{image_format}/{mode}"] = kinds.get(f"{image_format}/{mode}", 0) + 1
+            total_bytes += len(data)
+
+    return {'pages': sum(counts), 'chapters': chapters, 'bytes': total_bytes, 'kinds': kinds, 'seed': seed}
+
+
+class StubMirror:
+    """本地模拟图片镜像站：按 /media/photos/<章节ID>/<文件名> 提供合成本子中的图片
+
+    每个请求先等待latency秒，响应体按每个连接bandwidth字节/秒的速度分块发送（0表示不限速）。
+    fail_first大于0时，每个路径的前fail_first次请求返回503（模拟不稳定的镜像站）。
+    """
+
+    def __init__(self, album_dir: str, latency: float = 0.0, bandwidth: int = 0, fail_first: int = 0):
+        self.album_dir = album_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_first = fail_first
+        self.requests = 0
+        self.bytes = 0
+        self.failures = 0
+        self.seen: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def reset(self, latency: float = 0.0, fail_first: int = 0):
+        """修改模拟条件并清空计数"""
+        with self.lock:
+            self.latency = latency
+            self.fail_first = fail_first
+            self.requests = self.bytes = self.failures = 0
+            self.seen.clear()
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        import http.server
+        mirror = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                path = os.path.join(mirror.album_dir, *parts[2:]) if parts[:2] == ['media', 'photos'] else None
+                if not path or not os.path.isfile(path):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                with open(path, 'rb') as f:
+                    data = f.read()
+
+                if mirror.latency:
+                    time.sleep(mirror.latency)
+
+                with mirror.lock:
+                    attempt = mirror.seen[self.path] = mirror.seen.get(self.path, 0) + 1
+                    failing = attempt <= mirror.fail_first
+                    if failing:
+                        mirror.failures += 1
+                if failing:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'))
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+
+                chunk = 16 * 1024
+                try:
+                    for offset in range(0, len(data), chunk):
+                        self.wfile.write(data[offset:offset + chunk])
+                        if mirror.bandwidth:
+                            time.sleep(min(chunk, len(data) - offset) / mirror.bandwidth)
+                except (ConnectionError, OSError):
+                    # 客户端提前断开（只读前几个字节的探测、取消的下载）
+                    self.close_connection = True
+                    return
+
+                with mirror.lock:
+                    mirror.requests += 1
+                    mirror.bytes += len(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubMirror':
+        import http.server
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def peak_rss() -> Dict[str, Optional[float]]:
+    """本进程和已结束子进程（预处理进程池）的峰值内存(MB)，取不到时为None"""
+    try:
+        import resource
+    except ImportError:
+        return {'self': _windows_peak_rss(), 'children': None}
+
+    # Linux上ru_maxrss单位是KB，macOS上是字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def _windows_peak_rss() -> Optional[float]:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize',
+                    'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return round(counters.PeakWorkingSetSize / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def summarize_runs(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """取各次运行耗时的中位数那一次作为代表结果"""
+    ok = [run for run in runs if run.get('success')]
+    if not ok:
+        return {'success': False, 'runs': runs}
+
+    median = sorted(ok, key=lambda run: run['elapsed'])[(len(ok) - 1) // 2]
+    return {
+        'success': len(ok) == len(runs),
+        'elapsed': median['elapsed'],
+        'elapsed_min': min(run['elapsed'] for run in ok),
+        'elapsed_stdev': round(statistics.pstdev(run['elapsed'] for run in ok), 4),
+        'pages_per_s': median['pages_per_s'],
+        'mb_per_s': median['mb_per_s'],
+        'stages': median.get('stages', {}),
+        'runs': runs,
+    }
+
+
+def parse_importtime(output: str) -> List[tuple]:
+    """解析 -X importtime 的输出，返回 [(模块名, 自身耗时us, 累计耗时us), ...]"""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        modules.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return modules
+
+
+def measure_startup(repeat: int) -> Dict[str, Any]:
+    """测量 import downloader 和 downloader.py --help 的冷启动耗时（各运行repeat次取中位数）"""
+    core_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=core_dir)
+    import_ms, process_ms, help_ms = [], [], []
+    modules = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import downloader'],
+            cwd=core_dir, env=env, capture_output=True, text=True, encoding='utf-8'
+        )
+        process_ms.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            return {'success': False, 'error': proc.stderr.strip().splitlines()[-1:]}
+
+        modules = parse_importtime(proc.stderr)
+        total = next((cumulative for name, _, cumulative in modules if name == 'downloader'), 0)
+        import_ms.append(total / 1000)
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(core_dir, 'downloader.py'), '--help'],
+                       cwd=core_dir, env=env, capture_output=True)
+        help_ms.append((time.perf_counter() - start) * 1000)
+
+    heavy = sorted({name for name, _, _ in modules if name.split('.')[0] in HEAVY_MODULES})
+    slowest = sorted(modules, key=lambda m: m[1], reverse=True)[:10]
+    return {
+        'success': True,
+        'import_ms': round(statistics.median(import_ms), 2),
+        'process_ms': round(statistics.median(process_ms), 2),
+        'help_ms': round(statistics.median(help_ms), 2),
+        'heavy_modules': heavy,
+        'slowest_imports': [{'module': name, 'self_ms': round(own / 1000, 2)} for name, own, _ in slowest],
+    }
+
+
+def write_bench_option(work_dir: str, config_path: Optional[str], host: str) -> str:
+    """以用户的option.yml为基础生成基准用的配置：client换成模拟镜像站，不使用代理"""
+    import yaml
+
+    data = {}
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+
+    client = data.setdefault('client', {})
+    client['impl'] = BenchClient.client_key
+    client['domain'] = [host]
+    client['retry_times'] = client.get('retry_times', 3)
+    meta_data = client.setdefault('postman', {}).setdefault('meta_data', {})
+    meta_data['proxies'] = None
+    data['dir_rule'] = {'base_dir': os.path.join(work_dir, 'jobs'), 'rule': 'Bd_Aid'}
+    data['log'] = False
+
+    path = os.path.join(work_dir, 'option.yml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(data, f, allow_unicode=True)
+    return path
+
+
+class BenchClient(AbstractJmClient):
+    """从合成本子目录生成本子/章节信息的jmcomic客户端，图片仍通过postman从模拟镜像站下载"""
+    client_key = 'jmf_bench'
+    album_dir: Optional[str] = None
+
+    def _photo_ids(self) -> List[str]:
+        return sorted(os.listdir(self.album_dir), key=int)
+
+    def get_album_detail(self, album_id) -> JmAlbumDetail:
+        photo_ids = self._photo_ids()
+        episodes = [(pid, str(i + 1), f"第{i + 1}话") for i, pid in enumerate(photo_ids)]
+        pages = sum(len(os.listdir(os.path.join(self.album_dir, pid))) for pid in photo_ids)
+        return JmAlbumDetail(
+            str(album_id), BENCH_SCRAMBLE_ID, f"Bench {album_id}", episodes, pages,
+            '', '', 0, 0, 0, [], [], [], []
+        )
+
+    def check_photo(self, photo):
+        photo.page_arr = sorted(os.listdir(os.path.join(self.album_dir, str(photo.photo_id))))
+        photo.data_original_domain = self.domain_list[0]
+
+
+def run_convert(downloader, album_dir: str, work_dir: str, repeat: int, output_format: str = 'pdf') -> Dict[str, Any]:
+    from events import AlbumMetrics, EventEmitter
+
+    input_mb = sum(p.stat().st_size for p in Path(album_dir).rglob('*') if p.is_file()) / 1024 / 1024
+    runs = []
+    for i in range(repeat):
+        pdf_path = os.path.join(work_dir, f"convert_{i}.{output_format}")
+        metrics = AlbumMetrics(EventEmitter(), 'convert')
+        start = time.perf_counter()
+        if output_format == 'cbz':
+            success = downloader.build_cbz(album_dir, pdf_path) > 0
+        else:
+            success = downloader.convert_images_to_pdf(album_dir, pdf_path, metrics=metrics)
+        elapsed = time.perf_counter() - start
+        pages = len(downloader.collect_images(album_dir))
+        runs.append({
+            'success': success,
+            'elapsed': round(elapsed, 4),
+            'pages': pages,
+            'pages_per_s': round(pages / elapsed, 2),
+            'mb_per_s': round(input_mb / elapsed, 3),
+            'output_mb': round(os.path.getsize(pdf_path) / 1024 / 1024, 3) if success else 0,
+            'stages': metrics.summary(pages)['stages'],
+        })
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+    return summarize_runs(runs)
+
+
+def run_download(downloader, work_dir: str, repeat: int) -> Dict[str, Any]:
+    from events import EventEmitter
+
+    runs = []
+    for i in range(repeat):
+        # 每次运行使用新的输出和任务日志目录，避免被当作已完成跳过
+        run_dir = os.path.join(work_dir, f"{downloader.config.engine}_{i}")
+        downloader.config.output_dir = os.path.join(run_dir, 'pdf')
+        downloader.config.journal_dir = os.path.join(run_dir, 'journal')
+        result = downloader.process_album(BENCH_ALBUM_ID, events=EventEmitter())
+        stats = result.stats or {}
+        runs.append({
+            'success': result.success,
+            'error': result.error,
+            'elapsed': result.elapsed,
+            'pages': stats.get('pages', 0),
+            'pages_per_s': stats.get('pages_per_s', 0.0),
+            'mb_per_s': stats.get('mb_per_s', 0.0),
+            'bytes': stats.get('bytes', 0),
+            'stages': stats.get('stages', {}),
+        })
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return summarize_runs(runs)
+
+
+def run_case(args) -> Dict[str, Any]:
+    """在子进程中执行一个测试项"""
+    import downloader as dl
+
+    JmModuleConfig.PROT = 'http://'
+    JmModuleConfig.register_client(BenchClient)
+    BenchClient.album_dir = args.album_dir
+
+    downloader = dl.JMcomicDownloader(config_path=args.bench_option)
+    downloader.domains_path = None
+    config = downloader.config
+    config.probe_domains = False
+    config.cache_max_mb = 0
+    # 本子库索引按本子ID跳过已生成的本子，每次运行都要重新下载
+    config.library = False
+    config.base_dir = os.path.join(args.work_dir, 'jobs')
+    if args.workers:
+        config.workers = args.workers
+    if args.output_profile:
+        config.profile = args.output_profile
+    if args.pdf_backend:
+        config.pdf_backend = args.pdf_backend
+
+    engine = CASES[args.run_case]
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            if engine is None:
+                output_format = 'cbz' if args.run_case == 'convert-cbz' else 'pdf'
+                result = run_convert(downloader, args.album_dir, args.work_dir, args.repeat, output_format)
+            else:
+                config.engine = engine
+                result = run_download(downloader, args.work_dir, args.repeat)
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            downloader.close()
+
+    rss = peak_rss()
+    result['peak_rss_mb'] = rss['self']
+    result['children_peak_rss_mb'] = rss['children']
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        from importlib.metadata import version
+        for package in ('jmcomic', 'Pillow', 'fpdf2', 'curl_cffi'):
+            try:
+                info[package] = version(package)
+            except Exception:
+                info[package] = None
+    except ImportError:
+        pass
+
+    try:
+        info['git'] = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        info['git'] = None
+    return info
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """和以前的结果对比，打印变化，返回吞吐下降超过threshold的测试项"""
+    regressions = []
+    for name, case in current['cases'].items():
+        old = baseline.get('cases', {}).get(name)
+        if name == STARTUP_CASE and old and old.get('import_ms') and case.get('import_ms'):
+            # 启动耗时只打印变化，是否超标由 --startup-budget-ms 判断
+            change = case['import_ms'] / old['import_ms'] - 1
+            print(f"  {name}: import downloader {old['import_ms']} -> {case['import_ms']} ms ({change:+.1%}), "
+                  f"--help {old.get('help_ms')} -> {case.get('help_ms')} ms")
+            continue
+        if not old or not old.get('pages_per_s') or not case.get('pages_per_s'):
+            continue
+
+        change = case['pages_per_s'] / old['pages_per_s'] - 1
+        print(f"  {name}: {old['pages_per_s']} -> {case['pages_per_s']} pages/s ({change:+.1%}), "
+              f"峰值内存 {old.get('peak_rss_mb')} -> {case.get('peak_rss_mb')} MB")
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    from downloader import OUTPUT_PROFILES
+
+    parser = argparse.ArgumentParser(description='下载和PDF流水线的性能基准')
+    all_cases = [STARTUP_CASE, *CASES]
+    parser.add_argument('--cases', default=','.join(all_cases), help=f"测试项，逗号分隔: {', '.join(all_cases)}")
+    parser.add_argument('--pages', type=int, default=120, help='合成本子的总页数')
+    parser.add_argument('--chapters', type=int, default=3, help='合成本子的章节数')
+    parser.add_argument('--seed', type=int, default=0, help='合成图片的随机种子，相同种子生成相同的本子')
+    parser.add_argument('--repeat', type=int, default=3, help='每个测试项的运行次数，取中位数')
+    parser.add_argument('--latency-ms', type=float, default=30, help='模拟镜像站每个请求的延迟(毫秒)')
+    parser.add_argument('--bandwidth-kb', type=int, default=0, help='模拟镜像站每个连接的带宽(KB/s)，0表示不限速')
+    parser.add_argument('--workers', type=int, default=0, help='图片预处理进程数，默认使用CPU核心数')
+    parser.add_argument('--output-profile', choices=list(OUTPUT_PROFILES), help='输出档位，默认使用配置')
+    parser.add_argument('--pdf-backend', help='PDF写入后端，默认使用配置')
+    parser.add_argument('--config', help='作为基础的option.yml，默认使用下载器找到的配置')
+    parser.add_argument('--work-dir', help='工作目录，默认在临时目录中创建')
+    parser.add_argument('--output', default='bench_result.json', help='结果文件(JSON)')
+    parser.add_argument('--baseline', help='用于对比的旧结果文件')
+    parser.add_argument('--fail-threshold', type=float, help='吞吐下降超过该比例(例如0.05)时返回非零')
+    parser.add_argument('--startup-budget-ms', type=float,
+                        help='import downloader 的耗时预算(毫秒)，超出或启动时加载了重量级包时返回非零')
+    parser.add_argument('--verbose', action='store_true', help='显示下载器的输出')
+    parser.add_argument('--check', action='store_true', help='用模拟镜像站检查域名探测、页数、重试和取消，不测性能')
+    # 子进程内部使用
+    parser.add_argument('--run-case', choices=list(CASES), help=argparse.SUPPRESS)
+    parser.add_argument('--album-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--bench-option', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        result = run_case(args)
+        sys.stdout.write(json.dumps(result, ensure_ascii=False) + '\n')
+        return 0
+
+    if args.check:
+        return run_checks(args)
+
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = [c for c in cases if c not in all_cases]
+    if unknown:
+        print(f"未知的测试项: {', '.join(unknown)}")
+        return 1
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment(),
+        'params': {
+            'pages': args.pages,
+            'chapters': args.chapters,
+            'repeat': args.repeat,
+            'latency_ms': args.latency_ms,
+            'bandwidth_kb': args.bandwidth_kb,
+            'workers': args.workers or os.cpu_count(),
+            'output_profile': args.output_profile,
+            'pdf_backend': args.pdf_backend,
+        },
+        'cases': {},
+    }
+
+    over_budget = False
+    if STARTUP_CASE in cases:
+        print(f"运行 {STARTUP_CASE} ...")
+        result = measure_startup(max(args.repeat, 5))
+        report['cases'][STARTUP_CASE] = result
+        if result['success']:
+            print(f"  import downloader {result['import_ms']} ms, 进程 {result['process_ms']} ms, "
+                  f"--help {result['help_ms']} ms")
+            if result['heavy_modules']:
+                print(f"  启动时加载了重量级包: {', '.join(result['heavy_modules'])}")
+            if args.startup_budget_ms is not None and (
+                    result['import_ms'] > args.startup_budget_ms or result['heavy_modules']):
+                print(f"  超出启动预算 {args.startup_budget_ms} ms")
+                over_budget = True
+        else:
+            print(f"  失败: {result.get('error')}")
+        cases.remove(STARTUP_CASE)
+
+    if cases:
+        run_cases(args, cases, report)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"对比 {args.baseline} ({baseline.get('environment', {}).get('git')}):")
+        regressions = compare(baseline, report, args.fail_threshold or 0.0)
+        if args.fail_threshold is not None and regressions:
+            print(f"性能下降: {', '.join(regressions)}")
+            return 1
+
+    if over_budget:
+        return 1
+    return 0 if all(case.get('success') for case in report['cases'].values()) else 1
+
+
+def run_cases(args, cases: List[str], report: Dict[str, Any]):
+    """生成合成本子、启动模拟镜像站，逐个在子进程中运行测试项，结果写入report"""
+    import tempfile
+
+    own_work_dir = not args.work_dir
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='jmf_bench_'))
+    os.makedirs(work_dir, exist_ok=True)
+    album_dir = os.path.join(work_dir, 'album')
+
+    print(f"生成合成本子: {args.pages} 页, {args.chapters} 个章节")
+    album = generate_album(album_dir, args.pages, args.chapters, args.seed)
+    print(f"  {album['bytes'] / 1024 / 1024:.1f} MB, " + ', '.join(f"{k} {v}" for k, v in sorted(album['kinds'].items())))
+
+    mirror = StubMirror(album_dir, args.latency_ms / 1000, args.bandwidth_kb * 1024).start()
+
+    if args.config:
+        config_path = args.config
+    else:
+        import downloader as dl
+        with contextlib.redirect_stdout(io.StringIO()):
+            config_path = dl.JMcomicDownloader().config_path
+    bench_option = write_bench_option(work_dir, config_path, mirror.host)
+    report['album'] = album
+
+    try:
+        for name in cases:
+            print(f"运行 {name} ...")
+            command = [
+                sys.executable, os.path.abspath(__file__),
+                '--run-case', name,
+                '--album-dir', album_dir,
+                '--bench-option', bench_option,
+                '--work-dir', work_dir,
+                '--repeat', str(args.repeat),
+                '--workers', str(args.workers),
+            ]
+            if args.output_profile:
+                command += ['--output-profile', args.output_profile]
+            if args.pdf_backend:
+                command += ['--pdf-backend', args.pdf_backend]
+
+            proc = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=None if args.verbose else subprocess.DEVNULL,
+                text=True, encoding='utf-8'
+            )
+            lines = proc.stdout.strip().splitlines()
+            if proc.returncode != 0 or not lines:
+                print(f"  {name} 运行失败（退出码 {proc.returncode}），使用 --verbose 查看输出")
+                report['cases'][name] = {'success': False, 'returncode': proc.returncode}
+                continue
+
+            result = json.loads(lines[-1])
+            report['cases'][name] = result
+            if result.get('pages_per_s'):
+                print(f"  {result['pages_per_s']} pages/s, {result['mb_per_s']} MB/s, "
+                      f"耗时 {result['elapsed']}s, 峰值内存 {result['peak_rss_mb']} MB")
+            else:
+                print(f"  失败: {[run.get('error') for run in result.get('runs', [])]}")
+    finally:
+        mirror.close()
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class CheckReport:
+    """行为检查的结果：逐项打印到stream（下载器的输出另行重定向），最后汇总"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.failed: List[str] = []
+
+    def section(self, title: str):
+        print(f"{title}:", file=self.stream, flush=True)
+
+    def check(self, name: str, ok: bool, detail: str = ''):
+        print(f"  {'通过' if ok else '失败'}: {name}" + (f" ({detail})" if detail else ''), file=self.stream, flush=True)
+        if not ok:
+            self.failed.append(name)
+
+
+def check_domains(report: CheckReport, mirror: StubMirror, work_dir: str):
+    """域名探测：可用、返回5xx和无法连接的域名按健康程度排序，结果在TTL内复用；运行期出错的域名被降级"""
+    import socket
+    from domain_probe import DomainProber, DomainRanker
+
+    broken = StubMirror(mirror.album_dir, fail_first=10 ** 9).start()
+    flaky = StubMirror(mirror.album_dir, fail_first=1).start()
+    # 绑定后立即关闭的端口，连接会被拒绝
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead = f"127.0.0.1:{sock.getsockname()[1]}"
+
+    try:
+        photo_dir = sorted(os.listdir(mirror.album_dir))[0]
+        image = sorted(os.listdir(os.path.join(mirror.album_dir, photo_dir)))[0]
+        prober = DomainProber(cache_path=os.path.join(work_dir, 'domain_health.json'), scheme='http',
+                              path=f"/media/photos/{photo_dir}/{image}", timeout=2)
+        domains = [dead, broken.host, flaky.host, mirror.host]
+        results = prober.probe(domains)
+        ranked = [health.domain for health in results]
+        # 503和无法连接都算不可用，两者之间的顺序不确定
+        report.check('按健康程度排序', ranked[:2] == [mirror.host, flaky.host],
+                     ', '.join(f"{h.domain} 错误率 {h.error_rate:.0%}" for h in results))
+        report.check('不可用的域名保留在最后', set(ranked[2:]) == {broken.host, dead}
+                     and not any(h.alive for h in results[2:]))
+
+        requests = mirror.requests + flaky.requests + flaky.failures + broken.failures
+        cached = prober.probe(domains)
+        report.check('TTL内复用探测结果',
+                     mirror.requests + flaky.requests + flaky.failures + broken.failures == requests
+                     and [h.checked_at for h in cached] == [h.checked_at for h in results])
+    finally:
+        broken.close()
+        flaky.close()
+
+    ranker = DomainRanker([mirror.host, dead])
+    ranker.report_failure(mirror.host)
+    report.check('出错的域名被降级', ranker.ranked([mirror.host, dead]) == [dead, mirror.host])
+
+
+def check_pdf_append(report: CheckReport, downloader, album_dir: str, work_dir: str):
+    """追加模式：在fpdf生成的PDF（MediaBox写在页面树根节点上）之后追加一个章节，原有页面的尺寸不能丢失"""
+    from pdf_writer import read_pdf_structure
+
+    chapters = sorted(os.listdir(album_dir), key=int)
+    if len(chapters) < 2:
+        report.check('fpdf生成的PDF追加章节', False, '需要至少2个章节')
+        return
+
+    pdf_path = os.path.join(work_dir, 'append', 'fpdf.pdf')
+    backend = downloader.config.pdf_backend
+    downloader.config.pdf_backend = 'fpdf'
+    try:
+        base = downloader.build_pdf(os.path.join(album_dir, chapters[0]), pdf_path)
+    finally:
+        downloader.config.pdf_backend = backend
+    added = downloader.build_pdf(os.path.join(album_dir, chapters[1]), pdf_path, append=True) if base else 0
+
+    structure = read_pdf_structure(pdf_path) if added else None
+    ok = bool(structure) and structure['count'] == base + added
+    detail = f"{base} + {added} 页"
+    try:
+        import pypdf
+    except ImportError:
+        detail += ', 未安装pypdf，只检查了页数'
+    else:
+        if ok:
+            # 每页都要能取到四个数的MediaBox（原有页面从根节点继承）
+            try:
+                reader = pypdf.PdfReader(pdf_path, strict=True)
+                boxes = [page.mediabox for page in reader.pages]
+                ok = len(boxes) == base + added and all(box.width > 0 and box.height > 0 for box in boxes)
+            except Exception as e:
+                ok, detail = False, f"{detail}, pypdf: {e}"
+    report.check('fpdf生成的PDF追加章节', ok, detail)
+
+
+VERSION_CASES = (
+    ('2.0.5', '~=2.0.0', True),
+    ('2.5', '~=2.0.0', False),
+    ('2.5', '~=2.0', True),
+    ('3.0', '~=2.0', False),
+    ('2.7.10', '~=2.7.8', True),
+    ('2.0.9', '==2.0.*', True),
+    ('2.5', '==2.0.*', False),
+    ('2.7.8', '>=2.7.8, <3', True),
+)
+
+
+def check_versions(report: CheckReport):
+    """依赖检查用的版本约束判断（PEP 440的 ~= 和 .* 前缀匹配）"""
+    from deps import version_satisfies
+
+    for version, spec, expected in VERSION_CASES:
+        result = version_satisfies(version, spec)
+        report.check(f"{version} {spec}", result == expected,
+                     "" if result == expected else f"结果 {result}, 应为 {expected}")
+
+
+def check_engine(report: CheckReport, downloader, mirror: StubMirror, work_dir: str, pages: int):
+    """单个下载引擎：完整下载的页数、镜像站先返回503时的重试，以及下载中途取消"""
+    from events import EventEmitter
+    from pdf_writer import read_pdf_structure
+
+    engine = downloader.config.engine
+
+    def run(name: str, cancel_event=None):
+        run_dir = os.path.join(work_dir, f"check_{engine}_{name}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+        downloader.config.output_dir = os.path.join(run_dir, 'pdf')
+        downloader.config.journal_dir = os.path.join(run_dir, 'journal')
+        return downloader.process_album(BENCH_ALBUM_ID, cancel_event, events=EventEmitter())
+
+    mirror.reset()
+    result = run('pages')
+    count = read_pdf_structure(result.pdf_path)['count'] if result.success else 0
+    report.check(f"{engine}: 页数", result.success and count == pages, f"{count}/{pages} 页, {result.error or 'OK'}")
+
+    mirror.reset(fail_first=1)
+    result = run('retry')
+    count = read_pdf_structure(result.pdf_path)['count'] if result.success else 0
+    report.check(f"{engine}: 失败重试", result.success and count == pages and mirror.failures >= pages,
+                 f"{count}/{pages} 页, 503 {mirror.failures} 次, {result.error or 'OK'}")
+
+    # 每个请求都很慢，镜像站收到第一个图片请求时取消
+    mirror.reset(latency=0.5)
+    cancel_event = threading.Event()
+    cancelled_at = []
+
+    def cancel_when_started():
+        while not mirror.seen and not cancel_event.is_set():
+            time.sleep(0.01)
+        cancelled_at.append(time.perf_counter())
+        cancel_event.set()
+
+    canceller = threading.Thread(target=cancel_when_started, daemon=True)
+    canceller.start()
+    result = run('cancel', cancel_event)
+    cancel_event.set()
+    canceller.join()
+    waited = time.perf_counter() - cancelled_at[0]
+    report.check(f"{engine}: 取消", result.cancelled and not result.success and not result.pdf_path,
+                 f"取消后 {waited:.1f}s 返回, 已下载 {mirror.requests}/{pages} 张")
+
+
+def run_checks(args) -> int:
+    """用模拟镜像站检查下载器的行为（在主进程中运行）"""
+    import tempfile
+    import downloader as dl
+
+    own_work_dir = not args.work_dir
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix='jmf_check_'))
+    os.makedirs(work_dir, exist_ok=True)
+    album_dir = os.path.join(work_dir, 'album')
+
+    print(f"生成合成本子: {args.pages} 页, {args.chapters} 个章节")
+    album = generate_album(album_dir, args.pages, args.chapters, args.seed)
+    mirror = StubMirror(album_dir).start()
+    report = CheckReport(sys.stdout)
+
+    # 下载器的输出默认丢弃（--verbose时写到stderr），stdout只显示检查结果
+    try:
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else io.StringIO()):
+            report.section('依赖版本约束')
+            check_versions(report)
+
+            report.section('域名探测')
+            check_domains(report, mirror, work_dir)
+
+            JmModuleConfig.PROT = 'http://'
+            JmModuleConfig.register_client(BenchClient)
+            BenchClient.album_dir = album_dir
+            bench_option = write_bench_option(work_dir, None, mirror.host)
+
+            report.section('PDF追加')
+            downloader = dl.JMcomicDownloader(config_path=bench_option)
+            try:
+                check_pdf_append(report, downloader, album_dir, work_dir)
+            except Exception as e:
+                report.check('fpdf生成的PDF追加章节', False, repr(e))
+            finally:
+                downloader.close()
+
+            for engine in ('thread', 'async'):
+                report.section(f"{engine}引擎")
+                downloader = dl.JMcomicDownloader(config_path=bench_option)
+                downloader.domains_path = None
+                config = downloader.config
+                config.probe_domains = False
+                config.cache_max_mb = 0
+                config.library = False
+                config.base_dir = os.path.join(work_dir, 'jobs')
+                config.engine = engine
+                if args.workers:
+                    config.workers = args.workers
+                try:
+                    check_engine(report, downloader, mirror, work_dir, album['pages'])
+                except Exception as e:
+                    report.check(f"{engine}: 运行", False, repr(e))
+                finally:
+                    downloader.close()
+    finally:
+        mirror.close()
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if report.failed:
+        print(f"{len(report.failed)} 项失败: {', '.join(report.failed)}")
+        return 1
+    print("全部通过")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+CBZ写入器
+CBZ是只存储（不压缩）的ZIP：图片文件按顺序原样写入，不解码、不重新编码，速度只受磁盘限制。
+页面按 0001.jpg、0002.png … 命名，保留原来的扩展名；本子信息写入 ComicInfo.xml
+（ComicRack格式，Komga、Kavita、Tachiyomi等阅读器都能识别）。
+
+追加模式把原有的图片条目原样复制到新文件（同样不解码），再写入新页面和新的ComicInfo.xml。
+"""
+import os
+import shutil
+import zipfile
+from typing import Any, Dict, List, Optional
+from xml.etree import ElementTree
+
+COMIC_INFO = 'ComicInfo.xml'
+
+# ComicInfo.xml中的字段顺序（与ComicInfo.xsd一致）
+COMIC_INFO_FIELDS = ('Title', 'Series', 'Number', 'Summary', 'Notes', 'Year', 'Month', 'Day',
+                     'Writer', 'Penciller', 'Genre', 'Tags', 'Web', 'PageCount', 'LanguageISO', 'Characters')
+
+
+def comic_info_xml(info: Dict[str, Any]) -> bytes:
+    """生成ComicInfo.xml，info的键为ComicInfo字段名，空值不写入"""
+    root = ElementTree.Element('ComicInfo', {
+        'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+        'xmlns:xsd': 'http://www.w3.org/2001/XMLSchema',
+    })
+    for field in COMIC_INFO_FIELDS:
+        value = info.get(field)
+        if value is None or value == '' or value == []:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ', '.join(str(item) for item in value)
+        ElementTree.SubElement(root, field).text = str(value)
+
+    ElementTree.indent(root)
+    return b'<?xml version="1.0" encoding="utf-8"?>\n' + ElementTree.tostring(root, encoding='utf-8')
+
+
+class CbzWriter:
+    """逐页写入的CBZ写入器，写入临时文件，完成后原子替换目标文件"""
+
+    def __init__(self, path: str, append: bool = False):
+        """append为True时保留已有CBZ中的页面，page_count只计新增的页数"""
+        self.path = path
+        self.temp_path = f"{path}.part"
+        self.names: List[str] = []
+        self.base_count = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.zip = zipfile.ZipFile(self.temp_path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        if append:
+            try:
+                self._copy_existing(path)
+            except BaseException:
+                self.abort()
+                raise
+
+    @property
+    def page_count(self) -> int:
+        return len(self.names)
+
+    def _copy_existing(self, path: str):
+        with zipfile.ZipFile(path) as source:
+            for info in source.infolist():
+                if info.is_dir() or info.filename == COMIC_INFO:
+                    continue
+                info.compress_type = zipfile.ZIP_STORED
+                with source.open(info) as src, self.zip.open(info, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                self.base_count += 1
+
+    def add_image(self, img_path: str):
+        """原样写入一张图片（按块复制，不整体读入内存）"""
+        ext = os.path.splitext(img_path)[1].lower()
+        if ext == '.jpeg':
+            ext = '.jpg'
+        name = f"{self.base_count + len(self.names) + 1:04d}{ext}"
+
+        info = zipfile.ZipInfo.from_file(img_path, name)
+        info.compress_type = zipfile.ZIP_STORED
+        with open(img_path, 'rb') as src, self.zip.open(info, 'w') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        self.names.append(name)
+
+    def close(self, comic_info: Optional[Dict[str, Any]] = None):
+        """写入ComicInfo.xml（PageCount为总页数），并把临时文件原子替换为目标文件"""
+        info = dict(comic_info or {})
+        info['PageCount'] = self.base_count + len(self.names)
+        self.zip.writestr(COMIC_INFO, comic_info_xml(info))
+        self.zip.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        try:
+            self.zip.close()
+        except Exception:
+            pass
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,197 @@
+"""
+自适应并发控制
+按域名分别限制同时进行的图片请求数，参考AIMD拥塞控制：
+请求顺利且延迟没有明显上升时逐步加一，遇到429/5xx或连接错误时减半，
+最终稳定在该域名能承受的并发数附近。
+另外按采样窗口测量实际吞吐（窗口内完成的字节数/时长）：并发增加后吞吐没有相应提高，
+说明带宽已经用满，退回到吞吐最好时的并发数，不再继续加并发去抢带宽。
+另外定义了下载引擎共用的取消异常。
+"""
+import re
+import time
+import threading
+from urllib.parse import urlparse
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+class DownloadCancelled(Exception):
+    """任务被取消（例如界面上点击了取消）"""
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """从jmcomic的异常中取出HTTP状态码，取不到时返回None"""
+    context = getattr(error, 'context', None)
+    resp = context.get('resp') if isinstance(context, dict) else None
+    for attr in ('http_code', 'status_code'):
+        code = getattr(resp, attr, None)
+        if isinstance(code, int):
+            return code
+
+    match = re.search(r'状态码[=:：]\s*(\d{3})', str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_congestion_error(error: Exception) -> bool:
+    """429、5xx以及没有状态码的网络错误视为拥塞信号，404等其他4xx不算"""
+    status = error_status(error)
+    if status is None:
+        return True
+    return status == 429 or status >= 500
+
+
+@dataclass
+class HostStats:
+    """单个域名的并发状态和统计"""
+    limit: float
+    inflight: int = 0
+    min_latency: Optional[float] = None
+    avg_latency: Optional[float] = None
+    last_decrease: float = 0.0
+    successes: int = 0
+    throttled: int = 0
+    bytes: int = 0
+    busy_time: float = 0.0
+    window_start: float = 0.0  # 当前吞吐采样窗口
+    window_bytes: int = 0
+    window_count: int = 0
+    rate: float = 0.0  # 最近一个窗口测得的吞吐（字节/秒）
+    best_rate: float = 0.0  # 不超过best_level时测得的最好吞吐
+    best_level: int = 0
+
+    @property
+    def level(self) -> int:
+        return int(self.limit)
+
+    @property
+    def throughput(self) -> float:
+        """域名吞吐（字节/秒）：优先使用实测值，还没有完整的采样窗口时用单个请求的平均速度乘以并发数估算"""
+        if self.rate:
+            return self.rate
+        if not self.busy_time:
+            return 0.0
+        return self.bytes / self.busy_time * self.level
+
+
+class AdaptiveLimiter:
+    """按域名的AIMD并发限制器（线程安全）"""
+
+    def __init__(self,
+                 initial: int = 8,
+                 min_limit: int = 1,
+                 max_limit: int = 64,
+                 backoff: float = 0.5,
+                 latency_tolerance: float = 2.0,
+                 sample_interval: float = 1.0,
+                 min_scaling: float = 0.5):
+        self.initial = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.sample_interval = sample_interval
+        self.min_scaling = min_scaling  # 并发增加后吞吐至少要按并发增加的比例提高这么多（1为线性增长）
+        self.hosts: Dict[str, HostStats] = {}
+        self.cond = threading.Condition()
+
+    def _host(self, host: str) -> HostStats:
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = HostStats(limit=float(self.initial))
+        return stats
+
+    def acquire(self, host: str) -> float:
+        """等待域名有空闲槽位，返回开始时间"""
+        with self.cond:
+            stats = self._host(host)
+            while stats.inflight >= max(self.min_limit, stats.level):
+                self.cond.wait()
+            stats.inflight += 1
+        return time.perf_counter()
+
+    def _sample(self, stats: HostStats, started: float, now: float, size: int):
+        """累计吞吐采样窗口，窗口结束时按实测吞吐调整并发数"""
+        if not stats.window_start:
+            stats.window_start = started
+        stats.window_bytes += size
+        stats.window_count += 1
+
+        span = now - stats.window_start
+        # 窗口至少覆盖几个延迟周期、完成一轮请求，避免单个慢请求造成误判
+        if span < max(self.sample_interval, (stats.avg_latency or 0) * 4) or stats.window_count < stats.level:
+            return
+        stats.rate = stats.window_bytes / span
+        stats.window_start, stats.window_bytes, stats.window_count = now, 0, 0
+
+        added = (stats.level - stats.best_level) / max(stats.best_level, 1)
+        if stats.level <= stats.best_level or stats.rate >= stats.best_rate * (1 + self.min_scaling * added):
+            # 并发没有超过之前最好的水平（例如刚减半过），或者吞吐确实提高了：更新基准
+            stats.best_rate, stats.best_level = stats.rate, stats.level
+        else:
+            # 并发增加了吞吐却没有提高，带宽已经用满，退回去
+            stats.limit = float(max(self.min_limit, stats.best_level))
+
+    def release(self, host: str, started: float, ok: bool = True, size: int = 0):
+        """请求结束：成功时记录延迟和字节数，延迟没有明显变差则加性增长，并按实测吞吐修正"""
+        now = time.perf_counter()
+        elapsed = now - started
+        with self.cond:
+            stats = self._host(host)
+            stats.inflight -= 1
+
+            if ok:
+                stats.successes += 1
+                stats.bytes += size
+                stats.busy_time += elapsed
+                stats.min_latency = elapsed if stats.min_latency is None else min(stats.min_latency, elapsed)
+                stats.avg_latency = elapsed if stats.avg_latency is None else stats.avg_latency * 0.8 + elapsed * 0.2
+
+                # 平均延迟明显高于最低延迟说明已经排队，不再增加
+                if stats.avg_latency <= stats.min_latency * self.latency_tolerance:
+                    stats.limit = min(self.max_limit, stats.limit + 1 / max(stats.limit, 1))
+                self._sample(stats, started, now, size)
+
+            self.cond.notify_all()
+
+    def report_error(self, host: str, error: Exception):
+        """请求出错（每次重试前调用）：遇到拥塞信号时乘性减小，一个延迟周期内只减一次"""
+        if not is_congestion_error(error):
+            return
+
+        now = time.perf_counter()
+        with self.cond:
+            stats = self._host(host)
+            stats.throttled += 1
+            if now - stats.last_decrease < (stats.avg_latency or 1.0):
+                return
+            stats.last_decrease = now
+            stats.limit = max(float(self.min_limit), stats.limit * self.backoff)
+
+    def levels(self) -> Dict[str, int]:
+        """各域名当前稳定的并发数"""
+        with self.cond:
+            return {host: stats.level for host, stats in self.hosts.items()}
+
+    def summary(self) -> str:
+        with self.cond:
+            return ', '.join(
+                f"{host}: {stats.level} (成功 {stats.successes}, 限流 {stats.throttled}, "
+                f"{stats.throughput / 1024 / 1024:.1f} MB/s)"
+                for host, stats in self.hosts.items()
+            )
+
+    def attach(self, client):
+        """接入jmcomic客户端：每次请求失败重试前上报对应域名"""
+        if getattr(client, '_jmf_limiter', None) is self:
+            return
+        client._jmf_limiter = self
+
+        before_retry = client.before_retry
+
+        def limited_before_retry(e, kwargs, retry_count, url):
+            host = urlparse(url).netloc
+            if host:
+                self.report_error(host, e)
+            return before_retry(e, kwargs, retry_count, url)
+
+        client.before_retry = limited_before_retry
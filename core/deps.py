@@ -1,22 +1,131 @@
 import sys
+import json
 import subprocess
 import importlib
+import importlib.util
+import importlib.metadata
 import os
+import re
+import site
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 if sys.platform.startswith('win'):
     import codecs
+    import ctypes
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.detach())
-    os.system('chcp 65001 >nul 2>&1')
+    # 直接设置控制台代码页，不再启动 chcp 子进程
+    try:
+        ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+        ctypes.windll.kernel32.SetConsoleCP(65001)
+    except (AttributeError, OSError):
+        pass
+
+
+REQUIREMENTS_FILE = Path(__file__).parent / 'requirements.txt'
+CACHE_VERSION = 1
+
+_SPEC_PATTERN = re.compile(r'(~=|==|!=|<=|>=|<|>)\s*([^\s,;]+)')
+
+
+def parse_requirements(path: Path = REQUIREMENTS_FILE) -> Dict[str, str]:
+    """读取requirements文件，返回 包名(小写) -> 版本约束字符串，例如 {'pillow': '>=9.0.0'}"""
+    requirements = {}
+    try:
+        lines = Path(path).read_text(encoding='utf-8').splitlines()
+    except OSError:
+        return requirements
+
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('-'):
+            continue
+        line = line.split(';', 1)[0]
+        match = re.match(r'([A-Za-z0-9_.\-]+)(\[[^\]]*\])?\s*(.*)', line)
+        if match:
+            requirements[match.group(1).lower()] = match.group(3).strip()
+    return requirements
+
+
+def release_segments(version: str) -> Tuple[int, ...]:
+    """版本号的发布段（按原样保留末尾的0），例如 '2.0.0rc1' -> (2, 0, 0)；预发布等后缀忽略"""
+    match = re.match(r'\s*v?(\d+(?:\.\d+)*)', version)
+    if not match:
+        return ()
+    return tuple(int(p) for p in match.group(1).split('.'))
+
+
+def version_tuple(version: str) -> Tuple[int, ...]:
+    """用于比较大小的版本号，去掉末尾的0，例如 '2.7.8.post1' -> (2, 7, 8)，'2.0.0' -> (2,)"""
+    parts = list(release_segments(version))
+    while len(parts) > 1 and parts[-1] == 0:
+        parts.pop()
+    return tuple(parts)
+
+
+def _prefix_matches(version: str, prefix: Tuple[int, ...]) -> bool:
+    """版本的前几个发布段是否等于prefix（段数不够时按0补齐，'2' 视为 '2.0.0'）"""
+    segments = release_segments(version)
+    segments += (0,) * (len(prefix) - len(segments))
+    return segments[:len(prefix)] == prefix
+
+
+def version_satisfies(version: str, spec: str) -> bool:
+    """检查版本是否满足约束（>=, <=, ==, !=, >, <, ~=，逗号分隔表示同时满足）"""
+    current = version_tuple(version)
+    for op, target in _SPEC_PATTERN.findall(spec):
+        if target.endswith('.*'):
+            matched = _prefix_matches(version, release_segments(target[:-2]))
+            if (op == '==' and not matched) or (op == '!=' and matched):
+                return False
+            continue
+
+        wanted = version_tuple(target)
+        if op == '>=' and not current >= wanted:
+            return False
+        if op == '<=' and not current <= wanted:
+            return False
+        if op == '>' and not current > wanted:
+            return False
+        if op == '<' and not current < wanted:
+            return False
+        if op == '==' and current != wanted:
+            return False
+        if op == '!=' and current == wanted:
+            return False
+        if op == '~=':
+            # PEP 440: ~=2.0.0 等价于 >=2.0.0, ==2.0.*，前缀取约束中原样写出的发布段去掉最后一段
+            prefix = release_segments(target)[:-1] or release_segments(target)
+            if not (current >= wanted and _prefix_matches(version, prefix)):
+                return False
+    return True
+
+
+@dataclass
+class DependencyStatus:
+    """单个依赖的检查结果"""
+    package: str
+    import_name: str
+    optional: bool = False
+    installed: bool = False
+    version: Optional[str] = None
+    required: str = ''
+    satisfied: bool = False  # 已安装且版本满足requirements中的约束
 
 
 class DependencyManager:
-    """依赖管理器"""
+    """依赖管理器
+
+    通过包元数据（importlib.metadata）和 importlib.util.find_spec 检查依赖，不导入任何包。
+    检查结果缓存在应用数据目录，缓存键为解释器路径和各 site-packages 目录的修改时间，
+    pip安装/卸载包会改变目录修改时间，缓存随之失效。
+    """
 
     CORE_DEPENDENCIES = {
         'jmcomic': 'jmcomic',
+        'curl_cffi': 'curl_cffi',
         'yaml': 'PyYAML',
         'fpdf': 'fpdf2', 
         'PIL': 'Pillow',
@@ -28,45 +137,141 @@ class DependencyManager:
         'urllib3': 'urllib3'
     }
     
-    def __init__(self):
+    def __init__(self, use_cache: bool = True):
         self.python_executable = sys.executable
-    
-    def check_dependencies(self) -> Dict[str, bool]:
-        """检查依赖是否已安装"""
-        results = {}
+        self.use_cache = use_cache
+        self._status: Optional[Dict[str, DependencyStatus]] = None
+
+    @staticmethod
+    def cache_path() -> Path:
+        from app_files import app_data_dir
+
+        return app_data_dir() / 'deps_cache.json'
+
+    @staticmethod
+    def _mtime(path) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def cache_key(self) -> Dict[str, object]:
+        """缓存键：解释器、各 site-packages 目录及requirements文件的修改时间
         
-        for import_name, package_name in self.CORE_DEPENDENCIES.items():
-            try:
-                importlib.import_module(import_name)
-                results[package_name] = True
-                print(f"✅ {package_name} 已安装")
-            except ImportError:
-                results[package_name] = False
-                print(f"❌ {package_name} 未安装")
+        只包括安装包的目录（site-packages、用户site和PYTHONPATH中的目录），不包括脚本所在的core目录：
+        任务目录、日志和预览文件都写在那里，它的修改时间几乎每次运行都会变。
+        """
+        paths = list(site.getsitepackages()) if hasattr(site, 'getsitepackages') else []
+        user_site = site.getusersitepackages() if hasattr(site, 'getusersitepackages') else None
+        if user_site:
+            paths.append(user_site)
+        paths.extend(os.environ.get('PYTHONPATH', '').split(os.pathsep))
         
-        # 检查可选依赖
+        script_dir = os.path.normcase(os.path.abspath(os.path.dirname(__file__)))
+        paths = [os.path.abspath(p) for p in paths if p and os.path.isdir(p)]
+        paths = [p for p in paths if os.path.normcase(p) != script_dir]
+
+        return {
+            'version': CACHE_VERSION,
+            'python': os.path.realpath(self.python_executable),
+            'python_version': sys.version,
+            'paths': {p: self._mtime(p) for p in dict.fromkeys(paths)},
+            'requirements': self._mtime(REQUIREMENTS_FILE),
+        }
+
+    def _load_cache(self, key: Dict[str, object]) -> Optional[Dict[str, DependencyStatus]]:
+        try:
+            with open(self.cache_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('key') != key:
+                return None
+            return {name: DependencyStatus(**item) for name, item in data['status'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_cache(self, key: Dict[str, object], status: Dict[str, DependencyStatus]):
+        try:
+            path = self.cache_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'status': {name: asdict(s) for name, s in status.items()}},
+                          f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _check_one(self, import_name: str, package_name: str, optional: bool,
+                   requirements: Dict[str, str]) -> DependencyStatus:
+        status = DependencyStatus(package_name, import_name, optional,
+                                  required=requirements.get(package_name.lower(), ''))
+        try:
+            status.version = importlib.metadata.version(package_name)
+        except importlib.metadata.PackageNotFoundError:
+            status.version = None
+
+        try:
+            # 只查找模块位置，不执行导入
+            status.installed = importlib.util.find_spec(import_name) is not None
+        except (ImportError, ValueError):
+            status.installed = False
+
+        if status.installed:
+            # 没有元数据的包（例如直接放在PYTHONPATH中）无法检查版本，视为满足
+            status.satisfied = status.version is None or version_satisfies(status.version, status.required)
+        return status
+
+    def scan(self, refresh: bool = False) -> Dict[str, DependencyStatus]:
+        """检查所有依赖，返回 包名 -> DependencyStatus，结果在进程内和磁盘上缓存"""
+        if self._status is not None and not refresh:
+            return self._status
+
+        key = self.cache_key()
+        if self.use_cache and not refresh:
+            cached = self._load_cache(key)
+            if cached is not None:
+                self._status = cached
+                return cached
+
+        importlib.invalidate_caches()
+        requirements = parse_requirements()
+        status = {}
+        for import_name, package_name in self.CORE_DEPENDENCIES.items():
+            status[package_name] = self._check_one(import_name, package_name, False, requirements)
         for import_name, package_name in self.OPTIONAL_DEPENDENCIES.items():
-            try:
-                importlib.import_module(import_name)
-                results[package_name] = True
-                print(f"✅ {package_name} 已安装 (可选)")
-            except ImportError:
-                results[package_name] = False
-                print(f"⚠️ {package_name} 未安装 (可选)")
-        
+            status[package_name] = self._check_one(import_name, package_name, True, requirements)
+
+        self._status = status
+        if self.use_cache:
+            self._save_cache(key, status)
+        return status
+
+    def requirement_spec(self, package_name: str) -> str:
+        """pip安装用的需求字符串，带上requirements中的版本约束"""
+        status = self.scan().get(package_name)
+        return f"{package_name}{status.required}" if status and status.required else package_name
+
+    def check_dependencies(self) -> Dict[str, bool]:
+        """检查依赖是否已安装且版本满足要求"""
+        results = {}
+
+        for package_name, status in self.scan().items():
+            results[package_name] = status.satisfied
+            suffix = " (可选)" if status.optional else ""
+            version = f" {status.version}" if status.version else ""
+            if status.satisfied:
+                print(f"✅ {package_name}{version} 已安装{suffix}")
+            elif status.installed:
+                print(f"{'⚠️' if status.optional else '❌'} {package_name}{version} 版本不满足 {status.required}{suffix}")
+            else:
+                print(f"{'⚠️' if status.optional else '❌'} {package_name} 未安装{suffix}")
+
         return results
     
     def get_missing_dependencies(self) -> List[str]:
-        """获取缺失的核心依赖"""
-        missing = []
-        
-        for import_name, package_name in self.CORE_DEPENDENCIES.items():
-            try:
-                importlib.import_module(import_name)
-            except ImportError:
-                missing.append(package_name)
-        
-        return missing
+        """获取缺失或版本不满足要求的核心依赖"""
+        return [name for name, status in self.scan().items()
+                if not status.optional and not status.satisfied]
     
     def install_package(self, package_name: str) -> Tuple[bool, str]:
         """安装单个包"""
@@ -89,6 +294,7 @@ class DependencyManager:
             
             if result.returncode == 0:
                 print(f"✅ {package_name} 安装成功")
+                self._status = None
                 return True, "安装成功"
             else:
                 error_msg = result.stderr or result.stdout
@@ -107,7 +313,7 @@ class DependencyManager:
     def install_from_requirements(self, requirements_file: str = None) -> Tuple[bool, str]:
         """从requirements文件安装"""
         if not requirements_file:
-            requirements_file = Path(__file__).parent / 'requirements.txt'
+            requirements_file = REQUIREMENTS_FILE
         
         if not Path(requirements_file).exists():
             return False, f"要求文件不存在: {requirements_file}"
@@ -131,6 +337,7 @@ class DependencyManager:
             
             if result.returncode == 0:
                 print("✅ 所有依赖安装完成")
+                self._status = None
                 return True, "安装完成"
             else:
                 error_msg = result.stderr or result.stdout
@@ -159,7 +366,7 @@ class DependencyManager:
         failed_packages = []
         
         for package in missing:
-            success, error = self.install_package(package)
+            success, error = self.install_package(self.requirement_spec(package))
             if not success:
                 failed_packages.append(f"{package}: {error}")
         
@@ -170,7 +377,8 @@ class DependencyManager:
             return True, "所有依赖安装完成"
     
     def verify_installation(self) -> Tuple[bool, List[str]]:
-        """验证安装结果"""
+        """验证安装结果（重新检查，不使用缓存）"""
+        self.scan(refresh=True)
         missing = self.get_missing_dependencies()
         
         if missing:
@@ -181,28 +389,27 @@ class DependencyManager:
             return True, []
     
     def get_package_info(self, package_name: str) -> Dict[str, str]:
-        """获取包信息"""
+        """获取包信息（读取已安装包的元数据，字段与 pip show 一致）"""
         try:
-            result = subprocess.run(
-                [self.python_executable, '-m', 'pip', 'show', package_name],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                info = {}
-                for line in result.stdout.split('\n'):
-                    if ':' in line:
-                        key, value = line.split(':', 1)
-                        info[key.strip()] = value.strip()
-                return info
-            else:
-                return {}
-                
-        except Exception:
+            dist = importlib.metadata.distribution(package_name)
+        except importlib.metadata.PackageNotFoundError:
             return {}
 
+        meta = dist.metadata
+        info = {
+            'Name': meta.get('Name', package_name),
+            'Version': dist.version,
+            'Summary': meta.get('Summary', ''),
+            'Home-page': meta.get('Home-page', ''),
+            'Author': meta.get('Author', ''),
+            'Author-email': meta.get('Author-email', ''),
+            'License': meta.get('License', ''),
+            'Location': str(dist.locate_file('')),
+            'Requires': ', '.join(re.split(r'[\s;<>=!~\[(]', r, 1)[0] for r in (dist.requires or [])
+                                  if 'extra ==' not in r),
+        }
+        return {k: v for k, v in info.items() if v is not None}
+
 
 def main():
     """主函数 - 用于命令行调用"""
@@ -211,11 +418,11 @@ def main():
     print("JMcomic Fetcher 依赖检查器")
     print("=" * 40)
     
-    # 检查当前状态
+    # 检查当前状态（一次扫描，检查和安装共用结果）
     print("\n📋 检查依赖状态:")
-    status = manager.check_dependencies()
+    manager.check_dependencies()
     
-    # 安装缺失的依赖
+    # 安装缺失或版本不满足要求的依赖
     missing = manager.get_missing_dependencies()
     if missing:
         print(f"\n🔧 开始安装 {len(missing)} 个缺失的依赖...")
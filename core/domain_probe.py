@@ -0,0 +1,187 @@
+"""
+域名健康探测
+并发探测每个域名的延迟和错误率，结果带TTL缓存到磁盘，
+按健康程度排序后交给客户端；下载过程中出错的域名会被降级到后面。
+"""
+import sys
+import json
+import time
+import threading
+import urllib.request
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+from app_files import app_data_dir
+
+
+@dataclass
+class DomainHealth:
+    """单个域名的探测结果"""
+    domain: str
+    latency: Optional[float] = None  # 成功请求的平均延迟（秒），全部失败时为None
+    error_rate: float = 1.0
+    checked_at: float = 0.0
+
+    @property
+    def alive(self) -> bool:
+        return self.latency is not None
+
+    def sort_key(self):
+        return (not self.alive, round(self.error_rate, 2), self.latency or 0.0)
+
+
+def default_probe_cache() -> str:
+    return str(app_data_dir() / 'domain_health.json')
+
+
+class DomainProber:
+    """并发探测域名延迟和错误率"""
+
+    def __init__(self,
+                 cache_path: str = None,
+                 ttl: int = 600,
+                 timeout: float = 5,
+                 attempts: int = 2,
+                 scheme: str = 'https',
+                 path: str = '/',
+                 proxies: Optional[str] = None,
+                 max_workers: int = 16):
+        self.cache_path = Path(cache_path or default_probe_cache())
+        self.ttl = ttl
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.scheme = scheme
+        self.path = path
+        self.max_workers = max_workers
+
+        handlers = []
+        if proxies:
+            proxy = proxies if '://' in proxies else f"http://{proxies}"
+            handlers.append(urllib.request.ProxyHandler({'http': proxy, 'https': proxy}))
+        self.opener = urllib.request.build_opener(*handlers)
+
+    def _load_cache(self) -> Dict[str, DomainHealth]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {item['domain']: DomainHealth(**item) for item in data}
+        except (OSError, ValueError, TypeError, KeyError):
+            return {}
+
+    def _save_cache(self, results: Dict[str, DomainHealth]):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.cache_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump([asdict(h) for h in results.values()], f, ensure_ascii=False, indent=2)
+            temp_path.replace(self.cache_path)
+        except OSError as e:
+            print(f"保存域名探测结果失败: {e}")
+
+    def probe_one(self, domain: str) -> DomainHealth:
+        """探测单个域名：状态码小于500即视为可用"""
+        url = f"{self.scheme}://{domain}{self.path}"
+        latencies = []
+
+        for _ in range(self.attempts):
+            start = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+                with self.opener.open(request, timeout=self.timeout) as resp:
+                    resp.read(1024)
+                latencies.append(time.perf_counter() - start)
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    latencies.append(time.perf_counter() - start)
+            except Exception:
+                pass
+
+        return DomainHealth(
+            domain=domain,
+            latency=round(sum(latencies) / len(latencies), 4) if latencies else None,
+            error_rate=round(1 - len(latencies) / self.attempts, 2),
+            checked_at=time.time()
+        )
+
+    def probe(self, domains: List[str], force: bool = False) -> List[DomainHealth]:
+        """探测域名（未过期的缓存结果直接复用），返回按健康程度排序的结果"""
+        cached = {} if force else self._load_cache()
+        now = time.time()
+
+        results = {}
+        stale = []
+        for domain in domains:
+            health = cached.get(domain)
+            if health and now - health.checked_at < self.ttl:
+                results[domain] = health
+            else:
+                stale.append(domain)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stale))) as executor:
+                for health in executor.map(self.probe_one, stale):
+                    results[health.domain] = health
+
+            cached.update(results)
+            self._save_cache(cached)
+
+        return sorted(results.values(), key=DomainHealth.sort_key)
+
+    def rank(self, domains: List[str], force: bool = False) -> List[str]:
+        """返回排序后的域名列表，不可用的域名排在最后而不是删除"""
+        return [health.domain for health in self.probe(domains, force)]
+
+
+class DomainRanker:
+    """运行期域名排序：请求失败的域名按失败次数降级到后面"""
+
+    def __init__(self, domains: List[str]):
+        self.base_order = {domain: index for index, domain in enumerate(domains)}
+        self.failures: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.clients = []
+
+    def ranked(self, domains: List[str]) -> List[str]:
+        with self.lock:
+            return sorted(
+                domains,
+                key=lambda d: (self.failures.get(d, 0), self.base_order.get(d, len(self.base_order)))
+            )
+
+    def report_failure(self, domain: str):
+        with self.lock:
+            self.failures[domain] = self.failures.get(domain, 0) + 1
+        self._reorder_clients()
+
+    def _reorder_clients(self):
+        for client in self.clients:
+            client.domain_list[:] = self.ranked(client.domain_list)
+
+    def attach(self, client):
+        """接入jmcomic客户端：请求失败重试前降级当前域名，并按当前排名调整域名顺序"""
+        if getattr(client, '_jmf_domain_ranker', None) is self:
+            return
+        client._jmf_domain_ranker = self
+
+        from urllib.parse import urlparse
+
+        before_retry = client.before_retry
+
+        def ranked_before_retry(e, kwargs, retry_count, url):
+            domain = urlparse(url).netloc
+            if domain in self.base_order:
+                self.report_failure(domain)
+            return before_retry(e, kwargs, retry_count, url)
+
+        client.before_retry = ranked_before_retry
+        self.clients.append(client)
+        self._reorder_clients()
+
+
+if __name__ == '__main__':
+    targets = sys.argv[1:] or ['18comic-mygo.vip', '18comic-mygo.org']
+    for health in DomainProber().probe(targets, force=True):
+        status = f"{health.latency * 1000:.0f}ms" if health.alive else '不可用'
+        print(f"{health.domain}: {status}, 错误率 {health.error_rate:.0%}")
@@ -3,27 +3,29 @@ import sys
 import yaml
 import json
 import time
+import copy
 import shutil
-import tempfile
+import functools
+import io
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass
 
 if sys.platform.startswith('win'):
     import codecs
+    import ctypes
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.detach())
-    os.system('chcp 65001 >nul 2>&1')
+    # 直接设置控制台代码页，不再启动 chcp 子进程
+    try:
+        ctypes.windll.kernel32.SetConsoleOutputCP(65001)
+        ctypes.windll.kernel32.SetConsoleCP(65001)
+    except (AttributeError, OSError):
+        pass
 
-try:
-    import jmcomic
-    from fpdf import FPDF
-    from PIL import Image
-    from natsort import natsorted
-except ImportError as e:
-    print(f"缺少必要的Python包: {e}")
-    print("请运行: pip install -r requirements.txt")
-    sys.exit(1)
+# jmcomic、fpdf、PIL、natsort 在用到的阶段才导入：
+# 查看帮助、校验配置、跳过已完成的本子都不需要加载它们
+from concurrency import DownloadCancelled
 
 
 @dataclass
@@ -35,15 +37,534 @@ class DownloadConfig:
     image_format: str = ".jpg"
     max_retries: int = 3
     timeout: int = 30
+    workers: int = 0  # 图片预处理进程数，0表示使用CPU核心数
+    jpeg_passthrough: bool = True  # 基线JPEG原样嵌入PDF，不重新编码
+    pdf_backend: str = "stream"  # PDF写入后端: stream（流式落盘）/ fpdf
+    output_formats: str = "pdf"  # 输出格式，逗号分隔: pdf、cbz（原样打包图片，不解码），"pdf,cbz"一次生成两种
+    profile: str = "original"  # 输出档位，见OUTPUT_PROFILES
+    cache_dir: Optional[str] = None  # 图片缓存目录，None表示使用应用数据目录
+    cache_max_mb: int = 2048  # 图片缓存容量上限，0表示不启用
+    journal_dir: Optional[str] = None  # 任务日志目录，None表示输出目录下的.journal
+    library: bool = True  # 维护本子库索引，按本子ID跳过已生成的PDF
+    library_path: Optional[str] = None  # 本子库索引（SQLite），None表示应用数据目录中按输出目录区分的默认位置
+    proxies: Optional[str] = None  # 代理地址，来自client.postman.meta_data.proxies
+    probe_domains: bool = True  # 使用前探测域名并按延迟排序
+    probe_ttl: int = 600  # 域名探测结果的缓存时间（秒）
+    adaptive_threads: bool = False  # 按域名自适应调整图片并发数，从threading.image开始
+    max_image_threads: int = 64  # 自适应模式下单个域名的并发上限
+    pool_size: int = 16  # 每个域名保留的长连接会话数，0表示使用jmcomic默认的postman
+    engine: str = "thread"  # 下载引擎: thread（jmcomic线程池）或 async（asyncio事件循环）
+    async_concurrency: int = 256  # async引擎的全局并发上限，单个域名的并发仍为threading.image
+    bandwidth_limit_kb: int = 0  # async引擎的全局带宽上限(KB/s)，0表示不限速
+    max_buffered_mb: int = 256  # 预处理完成但尚未写入PDF的页面数据上限
+    profiling: bool = False  # 性能分析模式，也可以用环境变量JMF_PROFILE=1开启，见profiling模块
+    previews: bool = True  # 转换时生成预览（封面、缩略图总览、页面尺寸表），见preview模块
+    update: bool = False  # 已生成的本子有新章节时只下载新章节，追加到原来的PDF末尾（PDF增量更新）
+    require_complete: bool = True  # 校验后仍有缺失或损坏的图片时不生成PDF（已下载的图片保留，下次只重新下载缺失的部分）
+
+
+@dataclass
+class AlbumResult:
+    """单个本子的处理结果"""
+    album_id: str
+    success: bool = False
+    title: Optional[str] = None
+    pdf_path: Optional[str] = None
+    cbz_path: Optional[str] = None
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    concurrency: Optional[Dict[str, int]] = None  # 自适应模式下各域名稳定的并发数
+    cancelled: bool = False
+    stats: Optional[Dict[str, Any]] = None  # 字节数、各阶段耗时、pages/s等统计，见events.AlbumMetrics
+    completeness: Optional[Dict[str, Any]] = None  # 图片完整性校验结果，见JMcomicDownloader.verify_album
+
+
+# 支持的图片格式
+SUPPORTED_IMAGE_FORMATS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif')
+
+
+@dataclass
+class PreparedPage:
+    """预处理完成、可以直接写入PDF的页面
+    
+    可直接嵌入的JPEG只记录路径（image_path），转换过的页面以内存中的编码数据（data）交给PDF。
+    width/height始终是原图尺寸，用于决定页面排版。
+    """
+    source_path: str
+    width: int
+    height: int
+    image_path: Optional[str] = None
+    data: Optional[bytes] = None
+    mode: str = 'RGB'
+    image_filter: str = 'DCTDecode'
+    pixel_size: Optional[tuple] = None  # 嵌入图片的像素尺寸，缩放过时与width/height不同
+    elapsed: float = 0.0  # 预处理耗时（秒）
+    thumbnail: Optional[bytes] = None  # 预览用的小缩略图（JPEG），只在生成预览时存在
+    
+    def open(self):
+        """返回交给PDF写入的图片来源（路径或BytesIO）"""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return self.image_path
+
+
+def is_passthrough_jpeg(img) -> bool:
+    """判断图片是否为可以原样嵌入PDF的基线RGB/灰度JPEG（只读取文件头，不解码）"""
+    return (
+        img.format == 'JPEG'
+        and img.mode in ('RGB', 'L')
+        and not img.info.get('progressive')
+        and not img.info.get('progression')
+    )
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """PDF输出档位：决定嵌入图片的分辨率、编码格式和质量"""
+    name: str
+    dpi: Optional[int] = None  # 页面上的目标DPI，None表示保持原始分辨率
+    quality: int = 95
+    image_format: str = 'jpeg'  # jpeg / jpx（PDF不支持嵌入WebP）
+    detect_grayscale: bool = False  # 近似灰度的彩色页面按灰度编码
+
+
+OUTPUT_PROFILES = {
+    'original': OutputProfile('original'),
+    'ebook': OutputProfile('ebook', dpi=150, quality=85, detect_grayscale=True),
+    'screen': OutputProfile('screen', dpi=96, quality=75, detect_grayscale=True),
+    # JPEG 2000同等画质下体积更小，但部分阅读器不支持；不需要缩放的基线JPEG仍原样嵌入。
+    # 只有stream后端直接嵌入JPXDecode数据，fpdf后端会重新按无损压缩写入
+    'ebook-jpx': OutputProfile('ebook-jpx', dpi=150, quality=85, image_format='jpx', detect_grayscale=True),
+}
+
+
+def is_grayscale(img, tolerance: int = 8) -> bool:
+    """抽样判断RGB图片是否实际上是灰度图"""
+    from PIL import Image, ImageChops
+    
+    sample = img.resize((64, 64), Image.NEAREST)
+    r, g, b = sample.split()
+    return max(
+        ImageChops.difference(r, g).getextrema()[1],
+        ImageChops.difference(g, b).getextrema()[1]
+    ) <= tolerance
+
+
+def target_size(width: int, height: int, profile: OutputProfile) -> tuple:
+    """按档位DPI计算图片在页面上需要的像素尺寸，不会超过原图尺寸"""
+    if not profile.dpi:
+        return width, height
+    
+    _, _, _, _, placed_w, placed_h = page_layout(width, height)
+    target_w = max(1, round(placed_w / 72 * profile.dpi))
+    target_h = max(1, round(placed_h / 72 * profile.dpi))
+    
+    # 只缩小，且差距很小时不值得重新采样
+    if target_w * 1.05 >= width:
+        return width, height
+    return target_w, target_h
+
+
+def encode_page(img, profile: OutputProfile) -> tuple:
+    """按档位编码页面，返回(数据, PDF过滤器)"""
+    buffer = io.BytesIO()
+    
+    if profile.image_format == 'jpx':
+        # quality映射为压缩比，95约为3:1，75约为13:1
+        rate = max(1.0, (100 - profile.quality) / 2)
+        img.save(buffer, 'JPEG2000', quality_mode='rates', quality_layers=[rate])
+        return buffer.getvalue(), 'JPXDecode'
+    
+    img.save(buffer, 'JPEG', quality=profile.quality, optimize=True)
+    return buffer.getvalue(), 'DCTDecode'
+
+
+def prepare_page(img_path: str, passthrough: bool = True, profile: str = 'original',
+                 thumbnail: bool = False) -> PreparedPage:
+    """解码并规范化单张图片（透明背景转白色、转RGB、按档位缩放并重新编码）
+    
+    在进程池中执行，主进程只需按顺序把结果写入PDF。
+    passthrough为True时，不需要缩放的基线JPEG以原始DCT数据嵌入，不做重新编码。
+    thumbnail为True时同时生成预览用的小缩略图（见preview模块）。
+    """
+    from PIL import Image
+    
+    profile = OUTPUT_PROFILES[profile]
+    
+    with Image.open(img_path) as img:
+        w, h = img.size
+        target_w, target_h = target_size(w, h, profile)
+        resize = (target_w, target_h) != (w, h)
+        
+        # JPEG可以直接嵌入PDF
+        can_passthrough = passthrough and not resize and is_passthrough_jpeg(img)
+        if can_passthrough and not jpeg_complete(img_path):
+            # 原样嵌入的数据不会被解码，截断的文件只能在这里发现
+            raise ValueError("JPEG文件不完整（缺少结束标记）")
+        if can_passthrough and (img.mode == 'L' or not profile.detect_grayscale):
+            page = PreparedPage(img_path, w, h, image_path=img_path, mode=img.mode)
+            if thumbnail:
+                from preview import TILE_SIZE, make_thumbnail
+                
+                # 原样嵌入的JPEG没有解码过，缩略图按缩小比例解码
+                img.draft(img.mode, TILE_SIZE)
+                page.thumbnail = make_thumbnail(img)
+            return page
+        
+        # JPEG按目标尺寸解码，省去大部分解码开销
+        if resize and img.format == 'JPEG':
+            img.draft(img.mode, (target_w, target_h))
+        
+        # 处理图片格式
+        if img.mode in ['RGBA', 'LA', 'P']:
+            # 创建白色背景
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode in ('P', 'LA'):
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        
+        if profile.detect_grayscale and img.mode == 'RGB' and is_grayscale(img):
+            img = img.convert('L')
+        elif can_passthrough:
+            # 彩色页面且不需要缩放，保持原始数据
+            page = PreparedPage(img_path, w, h, image_path=img_path, mode=img.mode)
+            if thumbnail:
+                from preview import make_thumbnail
+                page.thumbnail = make_thumbnail(img)
+            return page
+        
+        if img.size != (target_w, target_h):
+            img = img.resize((target_w, target_h), Image.LANCZOS)
+        
+        data, image_filter = encode_page(img, profile)
+        page = PreparedPage(
+            img_path, w, h,
+            data=data,
+            mode=img.mode,
+            image_filter=image_filter,
+            pixel_size=img.size
+        )
+        if thumbnail:
+            from preview import make_thumbnail
+            page.thumbnail = make_thumbnail(img)
+        return page
+
+
+def timed_prepare_page(img_path: str, **page_options) -> PreparedPage:
+    """执行prepare_page并记录耗时"""
+    start = time.perf_counter()
+    page = prepare_page(img_path, **page_options)
+    page.elapsed = time.perf_counter() - start
+    return page
+
+
+def jpeg_complete(img_path: str) -> bool:
+    """JPEG文件末尾是否有EOI结束标记，下载中断的文件没有"""
+    with open(img_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 1024))
+        # 熵编码数据中的0xFF后总是跟着0x00，结束标记不会误判；允许标记后有少量填充
+        return b'\xff\xd9' in f.read()
+
+
+def verify_image(img_path: str) -> Optional[str]:
+    """检查下载的图片是否完整，返回问题描述，完整时返回None（在进程池中执行）
+    
+    JPEG只检查结束标记（不做完整解码），PNG校验各数据块的CRC，其他格式完整解码一次。
+    """
+    from PIL import Image
+    
+    try:
+        if os.path.getsize(img_path) == 0:
+            return "文件为空"
+        with Image.open(img_path) as img:
+            if img.format == 'JPEG':
+                if not jpeg_complete(img_path):
+                    return "JPEG文件不完整（缺少结束标记）"
+            elif img.format == 'PNG':
+                img.verify()
+            else:
+                img.load()
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def page_layout(width: int, height: int) -> tuple:
+    """计算图片在A4页面上居中放置的位置
+    
+    :return: (页面宽, 页面高, x, y, 放置宽, 放置高)，单位pt，x/y为距左上角的距离
+    """
+    if height > width:
+        max_w, max_h = 595, 842  # A4尺寸
+    else:
+        max_w, max_h = 842, 595
+    
+    scale = min(max_w / width, max_h / height, 1.0)
+    new_w, new_h = width * scale, height * scale
+    
+    # 居中放置
+    x = (max_w - new_w) / 2
+    y = (max_h - new_h) / 2
+    
+    return max_w, max_h, x, y, new_w, new_h
+
+
+class FpdfPageWriter:
+    """FPDF后端：所有页面保存在内存中，结束时一次性输出"""
+    
+    def __init__(self, path: str):
+        from fpdf import FPDF
+        
+        self.path = path
+        self.pdf = FPDF(unit="pt")
+        self.page_count = 0
+    
+    def add_page(self, page: PreparedPage):
+        page_w, page_h, x, y, w, h = page_layout(page.width, page.height)
+        self.pdf.add_page(orientation='P' if page_h > page_w else 'L')
+        self.pdf.image(page.open(), x, y, w, h)
+        self.page_count += 1
+    
+    def close(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.pdf.output(self.path)
+    
+    def abort(self):
+        pass
+
+
+class StreamPageWriter:
+    """流式后端：每页写入后立即落盘，内存占用与页数无关"""
+    
+    COLOR_SPACES = {'RGB': 'DeviceRGB', 'L': 'DeviceGray'}
+    
+    def __init__(self, path: str, append: bool = False):
+        from pdf_writer import StreamingPdfWriter
+        
+        self.writer = StreamingPdfWriter(path, append=append)
+    
+    @property
+    def page_count(self) -> int:
+        return self.writer.page_count
+    
+    def add_page(self, page: PreparedPage):
+        page_w, page_h, x, y, w, h = page_layout(page.width, page.height)
+        pixel_w, pixel_h = page.pixel_size or (page.width, page.height)
+        self.writer.add_image_page(
+            page.data if page.data is not None else page.image_path,
+            pixel_w, pixel_h,
+            page_w, page_h, x, y, w, h,
+            color_space=self.COLOR_SPACES[page.mode],
+            image_filter=page.image_filter
+        )
+    
+    def close(self):
+        self.writer.close()
+    
+    def abort(self):
+        self.writer.abort()
+
+
+PDF_BACKENDS = {
+    'fpdf': FpdfPageWriter,
+    'stream': StreamPageWriter,
+}
+
+# 输出格式: pdf（排版为A4页面）、cbz（图片原样存入不压缩的ZIP，见cbz_writer模块）
+OUTPUT_FORMATS = ('pdf', 'cbz')
+
+
+class PagePipeline:
+    """图片预处理流水线
+    
+    下载过程中每完成一张图片就提交到进程池预处理，
+    组装PDF时按自然顺序取回结果，使解码/转换与网络下载重叠进行。
+    
+    同时处理中的任务数和已完成未取走的页面数据量都有上限，
+    超出时图片先排队，等有空位或被取用时再提交，保证内存占用有界。
+    
+    进程池损坏（例如子进程被系统因内存不足杀掉）时通过executor_factory换一个新的进程池；
+    没有executor_factory或新的进程池也不可用时，改在线程中处理。
+    """
+    
+    def __init__(self,
+                 executor,
+                 page_options: Dict[str, Any] = None,
+                 max_inflight: int = 8,
+                 max_buffered_bytes: int = 256 * 1024 * 1024,
+                 metrics=None,
+                 executor_factory=None):
+        import threading
+        
+        self.executor = executor
+        self.executor_factory = executor_factory
+        self.fallback_executor = None
+        self.metrics = metrics
+        self.page_options = page_options or {}
+        self.max_inflight = max(1, max_inflight)
+        self.max_buffered_bytes = max_buffered_bytes
+        self.futures = {}
+        self.pending = {}
+        self.inflight = 0
+        self.buffered_bytes = 0
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def _key(img_path: str) -> str:
+        return os.path.normcase(os.path.abspath(img_path))
+    
+    def _has_room(self) -> bool:
+        return self.inflight < self.max_inflight and self.buffered_bytes < self.max_buffered_bytes
+    
+    def _submit(self, img_path: str):
+        # 已损坏或已关闭的执行器在submit时抛出RuntimeError（BrokenProcessPool是它的子类）
+        try:
+            return self.executor.submit(timed_prepare_page, img_path, **self.page_options)
+        except RuntimeError as e:
+            print(f"预处理进程池不可用，重新创建: {e}")
+        
+        if self.executor_factory is not None:
+            try:
+                self.executor = self.executor_factory()
+                return self.executor.submit(timed_prepare_page, img_path, **self.page_options)
+            except (RuntimeError, OSError) as e:
+                print(f"重新创建进程池失败，改在线程中处理: {e}")
+        
+        if self.fallback_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            
+            self.fallback_executor = ThreadPoolExecutor(max_workers=1)
+        self.executor = self.fallback_executor
+        return self.executor.submit(timed_prepare_page, img_path, **self.page_options)
+    
+    def _start(self, key: str, img_path: str):
+        self.inflight += 1
+        try:
+            future = self._submit(img_path)
+        except BaseException:
+            self.inflight -= 1
+            raise
+        self.futures[key] = future
+        future.add_done_callback(self._on_done)
+    
+    def _on_done(self, future):
+        with self.lock:
+            self.inflight -= 1
+            if not future.cancelled() and future.exception() is None and future.result().data:
+                self.buffered_bytes += len(future.result().data)
+            self._drain()
+    
+    def _drain(self):
+        while self.pending and self._has_room():
+            key = next(iter(self.pending))
+            self._start(key, self.pending.pop(key))
+        
+        if self.metrics is not None:
+            self.metrics.queue(len(self.pending), self.inflight, self.buffered_bytes)
+    
+    def submit(self, img_path: str):
+        """提交一张图片进行预处理，重复提交会被忽略"""
+        key = self._key(img_path)
+        with self.lock:
+            if key in self.futures or key in self.pending:
+                return
+            if self._has_room():
+                self._start(key, img_path)
+            else:
+                self.pending[key] = img_path
+            self._drain()
+    
+    def result(self, img_path: str) -> PreparedPage:
+        """等待并取走图片的预处理结果，取走后释放其占用的缓冲"""
+        key = self._key(img_path)
+        with self.lock:
+            if key in self.pending:
+                self._start(key, self.pending.pop(key))
+            elif key not in self.futures:
+                self._start(key, img_path)
+            future = self.futures[key]
+        
+        try:
+            try:
+                return future.result()
+            except Exception as e:
+                from concurrent.futures import BrokenExecutor
+                
+                if not isinstance(e, BrokenExecutor):
+                    raise
+                # 提交后进程池损坏，换新的执行器重新处理一次
+                with self.lock:
+                    self._start(key, img_path)
+                    future = self.futures[key]
+                return future.result()
+        finally:
+            with self.lock:
+                self.futures.pop(key, None)
+                if future.exception() is None and future.result().data:
+                    self.buffered_bytes -= len(future.result().data)
+                self._drain()
+    
+    def discard(self, img_path: str):
+        """丢弃一张图片的预处理结果（图片要重新下载），正在处理时等待其结束"""
+        key = self._key(img_path)
+        with self.lock:
+            if self.pending.pop(key, None) is not None:
+                self._drain()
+                return
+            if key not in self.futures:
+                return
+        
+        try:
+            self.result(img_path)
+        except Exception:
+            pass
+    
+    def close(self):
+        """丢弃排队中的图片并等待已提交的任务结束（执行器由调用方管理）"""
+        from concurrent.futures import wait
+        
+        with self.lock:
+            self.pending.clear()
+            futures = list(self.futures.values())
+            self.futures.clear()
+        
+        wait(futures)
+        if self.fallback_executor is not None:
+            self.fallback_executor.shutdown(wait=False)
+
+
+def _synchronized(method):
+    """在下载器的初始化锁内执行：共享资源的懒加载只创建一次（批量模式下多个线程会同时首次调用）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._init_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class JMcomicDownloader:
     """JMcomic下载器"""
     
     def __init__(self, config_path: str = None):
+        import threading
+
+        self._init_lock = threading.RLock()
         self.config_path = config_path or self._get_config_path()
         self.config = self._load_config()
         self.temp_dirs = []
+        self._option = None
+        self._option_snapshot = None
+        self._limiter = None
+        self._session_pool = None
+        self._executor = None
+        self._image_cache = None
+        self._library = None
+        self.domain_ranker = None
+        self.events = None  # EventEmitter，为None时不输出结构化事件
         
     def _get_config_path(self) -> str:
         """获取配置文件路径"""
@@ -102,18 +623,30 @@ class JMcomicDownloader:
         
         return str(config_path)
     
+    def _get_domains_path(self) -> Optional[str]:
+        """已验证域名列表checked_api.txt的路径"""
+        for domains_file in (Path(__file__).parent / 'checked_api.txt',
+                             Path(__file__).parent / '../checked_api.txt'):
+            if domains_file.exists():
+                return str(domains_file.resolve())
+        return None
+    
+    def get_config_snapshot(self):
+        """获取配置快照（进程内缓存，配置文件修改后自动重新加载）"""
+        from app_config import load_config
+        return load_config(self.config_path, self.domains_path)
+    
     def _load_config(self) -> DownloadConfig:
         """加载配置"""
+        self.domains_path = self._get_domains_path()
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
-            
-            domains = data.get('client', {}).get('domain', [])
+            snapshot = self.get_config_snapshot()
             return DownloadConfig(
-                domains=domains,
-                base_dir=data.get('dir_rule', {}).get('base_dir', '.'),
+                domains=list(snapshot.get('client', 'domain', default=())),
+                base_dir=snapshot.get('dir_rule', 'base_dir', default='.'),
                 output_dir="../PDF",
-                max_retries=data.get('client', {}).get('retry_times', 3)
+                max_retries=snapshot.get('client', 'retry_times', default=3),
+                proxies=snapshot.get('client', 'postman', 'meta_data', 'proxies')
             )
         except Exception as e:
             print(f"配置文件加载失败: {e}")
@@ -123,27 +656,16 @@ class JMcomicDownloader:
                 '18comic-mygo.org'
             ], output_dir="../PDF")
     
-    def setup_domains(self) -> bool:
-        """设置可用域名"""
+    def setup_domains(self, snapshot=None) -> bool:
+        """设置可用域名（只更新内存中的配置，不改写option.yml）"""
         try:
-            # 读取已验证的域名列表
-            domains_file = Path(__file__).parent / 'checked_api.txt'
-            if not domains_file.exists():
-                domains_file = Path(__file__).parent / '../checked_api.txt'
-            
-            if domains_file.exists():
-                with open(domains_file, 'r', encoding='utf-8') as f:
-                    domains = [line.strip() for line in f if line.strip()]
-                self.config.domains = domains
-            
-            # 更新配置文件
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config_data = yaml.safe_load(f)
-            
-            config_data['client']['domain'] = self.config.domains
+            snapshot = snapshot or self.get_config_snapshot()
+            if snapshot.domains:
+                self.config.domains = list(snapshot.domains)
             
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                yaml.safe_dump(config_data, f, default_flow_style=False, allow_unicode=True)
+            # 按探测到的延迟和错误率排序
+            if self.config.probe_domains and self.config.domains:
+                self.config.domains = self.rank_domains(self.config.domains)
             
             print(f"已配置 {len(self.config.domains)} 个域名")
             return True
@@ -152,6 +674,184 @@ class JMcomicDownloader:
             print(f"域名配置失败: {e}")
             return False
     
+    def rank_domains(self, domains: List[str]) -> List[str]:
+        """探测域名健康状况并按延迟排序（结果有缓存，过期前不会重复探测）"""
+        from domain_probe import DomainProber
+        
+        try:
+            prober = DomainProber(ttl=self.config.probe_ttl, proxies=self.config.proxies)
+            results = prober.probe(domains)
+        except Exception as e:
+            print(f"域名探测失败，保持原顺序: {e}")
+            return domains
+        
+        alive = [h for h in results if h.alive]
+        if alive:
+            print(f"可用域名 {len(alive)}/{len(results)}，最快: {alive[0].domain} ({alive[0].latency * 1000:.0f}ms)")
+        else:
+            print("所有域名探测失败，保持原顺序")
+            return domains
+        
+        return [h.domain for h in results]
+    
+    @_synchronized
+    def get_option(self):
+        """获取jmcomic选项（配置文件不变时只创建一次，client随选项复用）"""
+        snapshot = self.get_config_snapshot()
+        if self._option is None or snapshot is not self._option_snapshot:
+            # 设置域名
+            if not self.setup_domains(snapshot):
+                print("警告: 域名配置失败，使用默认配置")
+            
+            import jmcomic
+            
+            # 域名直接传给选项，不再写回option.yml
+            option_class = jmcomic.JmModuleConfig.option_class()
+            self._option = option_class.construct(snapshot.option_dict(domains=self.config.domains))
+            self._option_snapshot = snapshot
+            
+            from domain_probe import DomainRanker
+            self.domain_ranker = DomainRanker(self.config.domains)
+        
+        return self._option
+    
+    @_synchronized
+    def get_executor(self):
+        """获取图片预处理进程池（进程内共享，所有本子复用），进程池损坏后重新创建"""
+        if self._executor is not None and getattr(self._executor, '_broken', False):
+            # 子进程意外退出（例如内存不足被杀掉）后进程池不能再提交任务，常驻进程中换一个新的
+            print(f"预处理进程池已损坏，重新创建: {self._executor._broken}")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+            
+            workers = self.config.workers or os.cpu_count() or 1
+            try:
+                # 进程池在下载线程中首次使用，fork会复制其他线程持有的锁（例如导入锁）导致子进程卡死，
+                # 所有平台统一使用spawn（与Windows相同）
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            except (OSError, NotImplementedError) as e:
+                print(f"进程池创建失败，改用线程池: {e}")
+                self._executor = ThreadPoolExecutor(max_workers=workers)
+        
+        return self._executor
+    
+    def page_options(self) -> Dict[str, Any]:
+        """传给prepare_page的页面处理参数"""
+        return {
+            'passthrough': self.config.jpeg_passthrough,
+            'profile': self.config.profile,
+            'thumbnail': self.config.previews
+        }
+    
+    def output_formats(self) -> List[str]:
+        """解析配置的输出格式"""
+        formats = [name.strip().lower() for name in self.config.output_formats.split(',') if name.strip()]
+        unknown = [name for name in formats if name not in OUTPUT_FORMATS]
+        if unknown or not formats:
+            raise ValueError(f"不支持的输出格式: {self.config.output_formats}（可选: {', '.join(OUTPUT_FORMATS)}）")
+        return formats
+    
+    def new_pipeline(self, metrics=None) -> PagePipeline:
+        """创建一个使用共享进程池的预处理流水线"""
+        workers = self.config.workers or os.cpu_count() or 1
+        return PagePipeline(
+            self.get_executor(),
+            self.page_options(),
+            max_inflight=workers * 2,
+            max_buffered_bytes=self.config.max_buffered_mb * 1024 * 1024,
+            metrics=metrics,
+            executor_factory=self.get_executor
+        )
+    
+    @_synchronized
+    def get_image_cache(self):
+        """获取本地图片缓存，cache_max_mb为0时不启用"""
+        if self._image_cache is None and self.config.cache_max_mb > 0:
+            from image_cache import ImageCache
+            
+            try:
+                self._image_cache = ImageCache(self.config.cache_dir, self.config.cache_max_mb * 1024 * 1024)
+            except Exception as e:
+                print(f"图片缓存初始化失败: {e}")
+                self.config.cache_max_mb = 0
+        
+        return self._image_cache
+    
+    @_synchronized
+    def get_library(self):
+        """获取本子库索引，library为False时不启用"""
+        if self._library is None and self.config.library:
+            from library import LibraryIndex, default_library_path
+            
+            try:
+                self._library = LibraryIndex(self.config.library_path or default_library_path(self.config.output_dir))
+            except Exception as e:
+                print(f"本子库索引初始化失败: {e}")
+                self.config.library = False
+        
+        return self._library
+    
+    @_synchronized
+    def get_session_pool(self):
+        """获取进程内共享的HTTP连接池，pool_size为0时不启用"""
+        if self._session_pool is None and self.config.pool_size > 0:
+            from http_pool import SessionPool
+            
+            impersonate = self.get_option().client.postman.meta_data.get('impersonate', 'chrome')
+            self._session_pool = SessionPool(
+                pool_size=self.config.pool_size,
+                proxies=self.config.proxies,
+                impersonate=impersonate
+            )
+        return self._session_pool
+    
+    @_synchronized
+    def get_limiter(self):
+        """获取自适应并发限制器（未启用时返回None），进程内共享，学到的并发数在本子之间延续"""
+        if not self.config.adaptive_threads:
+            return None
+        
+        if self._limiter is None:
+            from concurrency import AdaptiveLimiter
+            
+            initial = self.get_option().download.threading.image
+            self._limiter = AdaptiveLimiter(initial=initial, max_limit=self.config.max_image_threads)
+        return self._limiter
+    
+    def new_profiler(self, label: str, enabled: bool = None):
+        """创建性能分析器，未开启性能分析模式时返回不做任何事的分析器"""
+        from profiling import AlbumProfiler, profiling_from_env
+        
+        if enabled is None:
+            enabled = self.config.profiling or profiling_from_env()
+        return AlbumProfiler(enabled, label=label)
+    
+    def close(self):
+        """释放进程池、缓存等共享资源"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._image_cache is not None:
+            self._image_cache.close()
+            self._image_cache = None
+        if self._library is not None:
+            self._library.close()
+            self._library = None
+        if self._session_pool is not None:
+            print(f"连接池: {self._session_pool.summary()}")
+            self._session_pool.close()
+            self._session_pool = None
+        if self.events is not None and self.events.stream not in (sys.stdout, sys.stderr):
+            self.events.stream.close()
+            self.events = None
+    
     def validate_album_id(self, album_id: str) -> bool:
         """验证本子ID"""
         if not album_id or not album_id.strip():
@@ -163,140 +863,363 @@ class JMcomicDownloader:
         except ValueError:
             return False
     
-    def download_album(self, album_id: str) -> tuple[Optional[Any], Optional[str]]:
-        """下载本子"""
+    def get_job_dir(self, album_id: str) -> Path:
+        """本子的独立工作目录（同一本子每次运行相同，便于断点续传）"""
+        return Path(self.config.base_dir).resolve() / '.jobs' / str(album_id)
+    
+    def job_option(self, album_id: str):
+        """为单个任务复制jmcomic选项：下载目录指向任务自己的工作目录，client与其他任务共享"""
+        option = self.get_option()
+        # 先创建client，浅拷贝后所有任务复用同一个client和连接池
+        client = option.build_jm_client()
+        session_pool = self.get_session_pool()
+        if session_pool is not None:
+            session_pool.install(client)
+        
+        import jmcomic
+        
+        dir_rule = option.dir_rule
+        rule = dir_rule.rule_dsl
+        # 每个章节单独一个子目录，避免多章节的同名图片互相覆盖
+        if not any(part.startswith('P') for part, _ in dir_rule.parser_list):
+            rule = f"{rule}_Pindex"
+        
+        job_option = copy.copy(option)
+        job_option.dir_rule = jmcomic.DirRule(
+            rule,
+            base_dir=str(self.get_job_dir(album_id)),
+            normalize_zh=dir_rule.normalize_zh
+        )
+        
+        # 自适应模式下由限制器控制实际并发，线程数只作为上限
+        if self.get_limiter() is not None:
+            download = copy.deepcopy(option.download.src_dict)
+            download.setdefault('threading', {})['image'] = self.config.max_image_threads
+            job_option.download = jmcomic.AdvancedDict(download)
+        
+        return job_option
+    
+    def download_album(self,
+                       album_id: str,
+                       pipeline: PagePipeline = None,
+                       journal=None,
+                       cancel_event=None,
+                       metrics=None,
+                       existing_photos: List[str] = None) -> tuple[Optional[Any], Optional[str], Any]:
+        """下载本子，传入pipeline时每张图片下载完成后立即开始预处理，传入journal时支持断点续传
+        
+        返回本子信息、jmcomic按dir_rule决定的本子目录和下载器；cancel_event被设置时抛出DownloadCancelled。
+        个别图片下载失败不会抛出异常，由verify_album校验后只重新下载这些图片。
+        传入existing_photos时只下载之后的新章节（见PipelineDownloader），没有新章节时本子目录为None。
+        """
+        import jmcomic
+        from pipeline_downloader import PipelineDownloader
+        
         if not self.validate_album_id(album_id):
             raise ValueError("无效的本子ID")
         
-        # 设置域名
-        if not self.setup_domains():
-            print("警告: 域名配置失败，使用默认配置")
+        # 获取本任务专用的jmcomic选项
+        options = self.job_option(album_id)
         
         print(f"使用域名: {', '.join(self.config.domains[:3])}...")
         
+        downloader_class = functools.partial(
+            PipelineDownloader,
+            pipeline=pipeline,
+            image_cache=self.get_image_cache(),
+            journal=journal,
+            domain_ranker=self.domain_ranker,
+            limiter=self.get_limiter(),
+            cancel_event=cancel_event,
+            metrics=metrics,
+            existing_photos=existing_photos
+        )
+        
         try:
-            # 创建jmcomic选项
-            options = jmcomic.create_option_by_file(self.config_path)
-            
             # 下载
-            album, _ = jmcomic.download_album(album_id)
+            if self.config.engine == 'async':
+                album, dler = self.download_album_async(album_id, options, downloader_class, cancel_event)
+            else:
+                album, dler = jmcomic.download_album(album_id, options, downloader=downloader_class,
+                                                     check_exception=False)
             
-            # 查找下载的目录
-            possible_dirs = [
-                album.title,
-                f"JM{album_id}",
-                album_id
-            ]
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled('任务已取消')
             
-            download_dir = None
-            for dir_name in possible_dirs:
-                if os.path.exists(dir_name):
-                    download_dir = dir_name
-                    break
+            if dler.skip_photos and len(dler.skip_photos) >= len(album):
+                print("没有新章节")
+                return album, None, dler
             
-            if not download_dir:
-                raise FileNotFoundError("未找到下载的文件目录")
+            download_dir = options.dir_rule.decide_album_root_dir(album)
+            if not os.path.isdir(download_dir):
+                raise FileNotFoundError(f"未找到下载的文件目录: {download_dir}")
             
             print(f"下载完成: {download_dir}")
-            return album, download_dir
+            return album, download_dir, dler
             
+        except DownloadCancelled:
+            raise
         except Exception as e:
+            # 取消后未下载的图片会以失败的形式出现
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled('任务已取消')
             print(f"下载失败: {e}")
             raise
     
-    def convert_images_to_pdf(self, img_dir: str, pdf_path: str) -> bool:
-        """将图片转换为PDF"""
-        if not os.path.exists(img_dir):
-            print(f"图片目录不存在: {img_dir}")
-            return False
+    def download_album_async(self, album_id: str, options, downloader_class, cancel_event=None):
+        """用asyncio引擎下载本子，回调和跳过逻辑与线程池引擎共用同一个下载器，返回本子信息和下载器"""
+        from async_engine import AsyncDownloadEngine
+        
+        dler = downloader_class(options)
+        engine = AsyncDownloadEngine(
+            dler,
+            concurrency=self.config.async_concurrency,
+            host_concurrency=options.download.threading.image or 20,
+            photo_concurrency=options.download.threading.photo or 8,
+            bandwidth=self.config.bandwidth_limit_kb * 1024,
+            timeout=self.config.timeout,
+            retries=self.config.max_retries,
+            cancel_event=cancel_event
+        )
+        album = engine.run(album_id)
+        return album, dler
+    
+    def collect_images(self, img_dir: str) -> List[str]:
+        """收集目录下的所有图片文件，按自然顺序排序"""
+        from natsort import natsorted
         
-        # 支持的图片格式
-        supported_formats = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif']
         images = []
         
-        # 收集所有图片文件
         for root, dirs, files in os.walk(img_dir):
             for file in files:
-                if any(file.lower().endswith(ext) for ext in supported_formats):
+                if file.lower().endswith(SUPPORTED_IMAGE_FORMATS):
                     images.append(os.path.join(root, file))
         
+        return natsorted(images)
+    
+    def convert_images_to_pdf(self,
+                              img_dir: str,
+                              pdf_path: str,
+                              pipeline: 'PagePipeline' = None,
+                              metrics=None,
+                              profiler=None) -> bool:
+        """将图片转换为PDF
+        
+        如果传入了下载阶段使用的流水线，已经预处理好的页面会被直接复用。
+        """
+        own_profiler = profiler is None
+        if own_profiler:
+            profiler = self.new_profiler(pdf_path)
+        
+        try:
+            with profiler.section('convert'):
+                return self.build_pdf(img_dir, pdf_path, pipeline, metrics=metrics, profiler=profiler) > 0
+        finally:
+            if own_profiler:
+                profiler.snapshot('convert')
+                self.dump_profile(profiler, pdf_path)
+    
+    def new_preview(self):
+        """创建预览生成器，previews为False时返回None"""
+        if not self.config.previews:
+            return None
+        from preview import PreviewBuilder
+        
+        return PreviewBuilder()
+    
+    def write_preview(self, preview, pdf_path: str):
+        """生成PDF的预览文件，失败时只打印警告（PDF本身已经生成）"""
+        if preview is None:
+            return
+        try:
+            preview.write(pdf_path)
+        except Exception as e:
+            print(f"生成预览失败: {e}")
+    
+    def build_pdf(self,
+                  img_dir: str,
+                  pdf_path: str,
+                  pipeline: 'PagePipeline' = None,
+                  cancel_event=None,
+                  metrics=None,
+                  profiler=None,
+                  repair=None,
+                  append: bool = False,
+                  archive_path: str = None,
+                  comic_info: Dict[str, Any] = None) -> int:
+        """将图片转换为PDF，返回写入的页数，失败时返回0；cancel_event被设置时放弃写入并抛出DownloadCancelled
+        
+        传入metrics时记录预处理、页面组装和写出文件的耗时，传入profiler时逐页计时。
+        无法处理的图片默认跳过；传入repair时交给repair(图片路径)重新获取页面，仍然失败则放弃整个PDF。
+        append为True时把图片追加到已有的PDF之后（总是使用流式后端），返回新增的页数。
+        传入archive_path时在同一次遍历中把写入PDF的图片原样存入CBZ（见build_cbz）。
+        """
+        if not os.path.exists(img_dir):
+            print(f"图片目录不存在: {img_dir}")
+            return 0
+        
+        images = self.collect_images(img_dir)
+        
         if not images:
             print("未找到图片文件")
-            return False
+            return 0
+        
+        own_pipeline = pipeline is None
+        if own_pipeline:
+            pipeline = self.new_pipeline()
+        if profiler is None:
+            profiler = self.new_profiler(pdf_path, enabled=False)
         
-        # 自然排序
-        images = natsorted(images)
+        # 提交尚未进入流水线的图片，让预处理和PDF组装重叠进行
+        for img_path in images:
+            pipeline.submit(img_path)
         
         # 创建PDF
-        pdf = FPDF(unit="pt")
-        temp_files = []
+        if append:
+            writer = StreamPageWriter(pdf_path, append=True)
+        else:
+            writer = PDF_BACKENDS[self.config.pdf_backend](pdf_path)
+        preview = self.new_preview()
+        if preview is not None and append and not preview.load(pdf_path):
+            print("原PDF没有可用的预览，不生成预览")
+            preview = None
+        archive = None
+        prepare_time = 0.0
+        assemble_time = 0.0
+        archive_time = 0.0
+        skipped = 0
         
         try:
-            for i, img_path in enumerate(images):
+            if archive_path:
+                from cbz_writer import CbzWriter
                 
+                archive = CbzWriter(archive_path, append=append)
+            
+            for img_path in images:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelled('任务已取消')
                 try:
-                    with Image.open(img_path) as img:
-                        # 处理图片格式
-                        if img.mode in ['RGBA', 'LA', 'P']:
-                            # 创建白色背景
-                            background = Image.new('RGB', img.size, (255, 255, 255))
-                            if img.mode == 'P':
-                                img = img.convert('RGBA')
-                            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                            img = background
-                        elif img.mode != 'RGB':
-                            img = img.convert('RGB')
-                        
-                        # 获取图片尺寸
-                        w, h = img.size
-                        
-                        # 处理特殊格式或需要重新保存的图片
-                        if img_path.lower().endswith(('.webp', '.gif')) or img.mode != 'RGB':
-                            temp_jpg = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-                            img.save(temp_jpg.name, 'JPEG', quality=95, optimize=True)
-                            temp_files.append(temp_jpg.name)
-                            use_path = temp_jpg.name
-                            temp_jpg.close()
-                        else:
-                            use_path = img_path
-                        
-                        # 添加到PDF
-                        orientation = 'P' if h > w else 'L'
-                        pdf.add_page(orientation=orientation)
-                        
-                        # 计算适合的尺寸
-                        if orientation == 'P':
-                            max_w, max_h = 595, 842  # A4尺寸
-                        else:
-                            max_w, max_h = 842, 595
-                        
-                        scale = min(max_w / w, max_h / h, 1.0)
-                        new_w, new_h = w * scale, h * scale
-                        
-                        # 居中放置
-                        x = (max_w - new_w) / 2
-                        y = (max_h - new_h) / 2
-                        
-                        pdf.image(use_path, x, y, new_w, new_h)
-                        
+                    with profiler.section('page', os.path.basename(img_path)):
+                        try:
+                            page = pipeline.result(img_path)
+                        except Exception as e:
+                            if repair is None:
+                                raise
+                            print(f"图片无法使用 {os.path.basename(img_path)}: {e}，重新下载")
+                            page = repair(img_path)
+                        prepare_time += page.elapsed
+                        start = time.perf_counter()
+                        writer.add_page(page)
+                        if preview is not None:
+                            preview.add(page)
+                        assemble_time += time.perf_counter() - start
+                        if archive is not None:
+                            start = time.perf_counter()
+                            archive.add_image(img_path)
+                            archive_time += time.perf_counter() - start
                 except Exception as e:
                     print(f"处理图片失败 {os.path.basename(img_path)}: {e}")
+                    skipped += 1
                     continue
             
+            if skipped and repair is not None:
+                raise Exception(f"{skipped} 张图片重新下载后仍无法使用，已放弃生成PDF")
+            
+            if writer.page_count == 0:
+                writer.abort()
+                if archive is not None:
+                    archive.abort()
+                print("没有可写入PDF的页面")
+                return 0
+            
             # 保存PDF
-            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-            pdf.output(pdf_path)
+            start = time.perf_counter()
+            writer.close()
             print(f"PDF已保存: {pdf_path}")
+            write_time = time.perf_counter() - start
             
-            return True
+            if archive is not None:
+                start = time.perf_counter()
+                archive.close(comic_info)
+                print(f"CBZ已保存: {archive_path}")
+                archive_time += time.perf_counter() - start
+            
+            start = time.perf_counter()
+            self.write_preview(preview, pdf_path)
+            
+            if metrics is not None:
+                metrics.record_stage('prepare', prepare_time)
+                metrics.record_stage('assemble', assemble_time)
+                metrics.record_stage('write', write_time)
+                if archive is not None:
+                    metrics.record_stage('archive', archive_time)
+                if preview is not None:
+                    metrics.record_stage('preview', time.perf_counter() - start)
+            
+            return writer.page_count
+        
+        except BaseException:
+            writer.abort()
+            if archive is not None:
+                archive.abort()
+            raise
             
         finally:
-            # 清理临时文件
-            for temp_file in temp_files:
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
+            if own_pipeline:
+                pipeline.close()
+    
+    def build_cbz(self,
+                  img_dir: str,
+                  cbz_path: str,
+                  comic_info: Dict[str, Any] = None,
+                  cancel_event=None,
+                  append: bool = False) -> int:
+        """把图片按自然顺序原样打包为CBZ（不解码、不压缩），返回写入的页数，失败时返回0
+        
+        cancel_event被设置时放弃写入并抛出DownloadCancelled；append为True时追加到已有的CBZ之后，返回新增的页数。
+        """
+        from cbz_writer import CbzWriter
+        
+        if not os.path.exists(img_dir):
+            print(f"图片目录不存在: {img_dir}")
+            return 0
+        
+        images = self.collect_images(img_dir)
+        if not images:
+            print("未找到图片文件")
+            return 0
+        
+        writer = CbzWriter(cbz_path, append=append)
+        try:
+            for img_path in images:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise DownloadCancelled('任务已取消')
+                writer.add_image(img_path)
+            writer.close(comic_info)
+        except BaseException:
+            writer.abort()
+            raise
+        
+        print(f"CBZ已保存: {cbz_path}")
+        return writer.page_count
+    
+    def comic_info(self, album) -> Dict[str, Any]:
+        """CBZ中ComicInfo.xml的本子信息"""
+        info = {
+            'Title': album.title,
+            'Series': album.title,
+            'Summary': getattr(album, 'description', None),
+            'Notes': f"JM{album.id}",
+            'Writer': list(getattr(album, 'authors', None) or []),
+            'Tags': list(getattr(album, 'tags', None) or []),
+            'Characters': list(getattr(album, 'actors', None) or []),
+        }
+        
+        # 发布日期格式为 YYYY-MM-DD
+        date = str(getattr(album, 'pub_date', '') or '').split('-')
+        if len(date) == 3 and all(part.isdigit() for part in date):
+            info['Year'], info['Month'], info['Day'] = (int(part) for part in date)
+        return info
     
     def cleanup_temp_files(self, *paths):
         """清理临时文件"""
@@ -312,76 +1235,655 @@ class JMcomicDownloader:
     
     def download_and_convert(self, album_id: str) -> bool:
         """完整的下载和转换流程"""
+        return self.process_album(album_id).success
+    
+    def get_journal(self, album_id: str):
+        """获取本子的任务日志"""
+        from journal import AlbumJournal
+        
+        journal_dir = self.config.journal_dir or str(Path(self.config.output_dir) / '.journal')
+        return AlbumJournal(journal_dir, album_id)
+    
+    def process_album(self, album_id: str, cancel_event=None, events=None) -> AlbumResult:
+        """完整的下载和转换流程，返回详细结果
+        
+        按output_formats生成PDF和/或CBZ（两种格式共用一次下载和一次遍历）。
+        已生成并校验通过的本子直接跳过，更新模式下只下载新章节并追加到原来的文件；
+        中断或取消的任务保留已下载的图片，下次运行从断点继续。
+        events为结构化事件的输出（默认使用self.events），结束时输出album汇总事件。
+        开启性能分析模式时，分析结果写在PDF旁边（<PDF名>.profile.*）。
+        """
+        from events import AlbumMetrics, EventEmitter
+        
+        result = AlbumResult(album_id=album_id)
+        start = time.time()
         download_dir = None
+        pipeline = None
+        pages = 0
+        base = None
+        pdf_path = None
+        cbz_path = None
+        metrics = AlbumMetrics(events or self.events or EventEmitter(), album_id)
+        profiler = None
         
         try:
+            if not self.validate_album_id(album_id):
+                raise ValueError("无效的本子ID")
+            
             # 创建输出目录
             output_dir = Path(self.config.output_dir)
-            output_dir.mkdir(exist_ok=True)
+            output_dir.mkdir(parents=True, exist_ok=True)
             
-            # 下载
-            album, download_dir = self.download_album(album_id)
+            formats = self.output_formats()
+            want_pdf = 'pdf' in formats
+            want_cbz = 'cbz' in formats
+            journal = self.get_journal(album_id)
+            library = self.get_library()
+            
+            # 已完成的本子直接跳过：先按本子ID查索引（只需一次stat），没有索引记录时再校验任务日志
+            # 输出档位不同的PDF不算完成（换档位就是为了重新生成）
+            finished = None
+            if want_pdf:
+                finished = library.verified(album_id) if library is not None else None
+                if finished is not None and not self.same_profile(finished):
+                    finished = None
+                if finished is None:
+                    finished = journal.verified_pdf()
+                    if finished is not None and not self.same_profile(finished):
+                        finished = None
+                    if finished and library is not None:
+                        # 建立索引之前生成的本子，补充索引记录
+                        self.record_library(album_id, finished['path'], finished.get('pages'),
+                                            title=finished.get('title'), profile=finished.get('profile'),
+                                            sha256=finished['sha256'])
+            if want_cbz:
+                # 要求的格式都已生成才算完成
+                finished_cbz = journal.verified_cbz()
+                if finished_cbz is None:
+                    finished = None
+                elif not want_pdf:
+                    finished = finished_cbz
+            
+            # 更新模式：已生成的本子只下载新章节，追加到原来的文件
+            base = self.append_base(journal, finished, formats) if finished and self.config.update else None
+            if finished and self.config.update and base is None:
+                print("已有的文件不能追加（没有章节记录、输出档位不同或PDF结构不支持），重新生成")
+            elif finished and not self.config.update:
+                print(f"已存在且校验通过，跳过: {finished['path']}")
+                result.success = True
+                result.title = finished.get('title')
+                result.pdf_path = finished['path'] if want_pdf else None
+                result.cbz_path = journal.cbz['path'] if want_cbz else None
+                result.elapsed = round(time.time() - start, 3)
+                result.stats = metrics.finish(True, finished.get('pages', 0), title=result.title, skipped=True)
+                return result
+            
+            # 清理上次中断时写了一半的图片
+            removed = journal.prune_incomplete()
+            if journal.images or removed:
+                print(f"断点续传: 已完成 {len(journal.images)} 张图片，清理 {removed} 个不完整文件")
+            
+            # 只生成CBZ时不需要解码图片，不创建预处理流水线
+            pipeline = self.new_pipeline(metrics) if want_pdf else None
+            profiler = self.new_profiler(f"本子 {album_id}")
+            
+            # 下载（生成PDF时图片在下载过程中即开始预处理）
+            with metrics.stage('download'), profiler.section('download'):
+                album, download_dir, dler = self.download_album(album_id, pipeline, journal, cancel_event, metrics,
+                                                                existing_photos=base['photos'] if base else None)
+            profiler.snapshot('download')
+            
+            if base is not None and not dler.skip_photos:
+                # 章节列表有变化，已重新下载全部章节
+                base = None
+            if base is not None and album and download_dir is None:
+                print(f"没有新章节，跳过: {base['path']}")
+                self.cleanup_temp_files(str(self.get_job_dir(album_id)))
+                journal.compact()
+                result.success = True
+                result.title = album.title
+                result.pdf_path = journal.pdf['path'] if want_pdf else None
+                result.cbz_path = journal.cbz['path'] if want_cbz else None
+                result.elapsed = round(time.time() - start, 3)
+                result.stats = metrics.finish(True, base.get('pages', 0), title=result.title, skipped=True)
+                return result
             
             if not album or not download_dir:
                 raise Exception("下载失败")
             
-            # 生成PDF文件名
-            safe_title = "".join(c for c in album.title if c.isalnum() or c in (' ', '-', '_')).strip()
-            if not safe_title:
-                safe_title = f"JM{album_id}"
+            result.title = album.title
+            
+            # 校验图片，只重新下载缺失或损坏的图片
+            with metrics.stage('verify'), profiler.section('verify'):
+                result.completeness = self.verify_album(album, dler, download_dir, pipeline, cancel_event)
+            completeness = result.completeness
+            if not completeness['complete'] and self.config.require_complete:
+                message = f"图片不完整: {completeness['verified']}/{completeness['images']} 张可用"
+                if completeness['photos_missing']:
+                    message += f"，缺少 {completeness['photos_missing']} 个章节"
+                raise Exception(message)
             
-            pdf_filename = f"{safe_title}.pdf"
-            pdf_path = output_dir / pdf_filename
+            limiter = self.get_limiter()
+            if limiter is not None:
+                result.concurrency = limiter.levels()
+                print(f"自适应并发: {limiter.summary()}")
+            
+            if base is not None:
+                output_path = Path(base['path'])
+            else:
+                # 生成文件名（PDF和CBZ同名，扩展名不同）
+                safe_title = "".join(c for c in album.title if c.isalnum() or c in (' ', '-', '_')).strip()
+                if not safe_title:
+                    safe_title = f"JM{album_id}"
+                
+                suffix = '.pdf' if want_pdf else '.cbz'
+                output_path = output_dir / f"{safe_title}{suffix}"
+                
+                # 如果文件已存在（且不是本子上次生成的文件），添加ID后缀
+                if want_pdf:
+                    indexed = library.get(album_id) if library is not None else None
+                    previous = indexed['path'] if indexed else (journal.pdf['path'] if journal.pdf else None)
+                else:
+                    previous = journal.cbz['path'] if journal.cbz else None
+                if output_path.exists() and os.path.abspath(output_path) != previous:
+                    output_path = output_dir / f"{safe_title}_{album_id}{suffix}"
             
-            # 如果文件已存在，添加ID后缀
-            if pdf_path.exists():
-                pdf_filename = f"{safe_title}_{album_id}.pdf"
-                pdf_path = output_dir / pdf_filename
+            pdf_path = output_path.with_suffix('.pdf') if want_pdf else None
+            cbz_path = output_path.with_suffix('.cbz') if want_cbz else None
+            comic_info = self.comic_info(album) if want_cbz else None
             
-            # 转换为PDF
-            success = self.convert_images_to_pdf(download_dir, str(pdf_path))
+            if want_pdf:
+                # 转换为PDF（同时生成CBZ时在同一次遍历中写入）
+                repair = None
+                if self.config.require_complete:
+                    repair = functools.partial(self.repair_page, dler, pipeline, completeness)
+                with metrics.stage('pdf'), profiler.section('convert'):
+                    pages = self.build_pdf(download_dir, str(pdf_path), pipeline, cancel_event, metrics, profiler,
+                                           repair=repair, append=base is not None,
+                                           archive_path=str(cbz_path) if cbz_path else None,
+                                           comic_info=comic_info)
+            else:
+                with metrics.stage('cbz'), profiler.section('convert'):
+                    pages = self.build_cbz(download_dir, str(cbz_path), comic_info, cancel_event,
+                                           append=base is not None)
+            profiler.snapshot('convert')
             
-            if success:
-                print(f"转换完成: {pdf_path}")
+            if pages:
+                total_pages = pages
+                images = metrics.images_total
+                if base is not None:
+                    print(f"追加 {pages} 页: {output_path}")
+                    total_pages += base.get('pages') or 0
+                    images = images + base['images'] if base.get('images') is not None else None
+                else:
+                    print(f"转换完成: {output_path}")
                 
-                # 清理下载目录
-                self.cleanup_temp_files(download_dir)
+                # 记录文件包含的章节，下次更新时只下载之后的新章节；有缺页的文件不记录，更新时整本重新生成
+                photos = None
+                if completeness['complete']:
+                    included = dler.skip_photos | dler.expected_photos
+                    photos = [str(photo.id) for photo in album if str(photo.id) in included]
+                if want_pdf:
+                    journal.record_pdf(str(pdf_path), total_pages, title=album.title, profile=self.config.profile,
+                                       photos=photos)
+                    self.record_library(album_id, str(pdf_path), total_pages, title=album.title,
+                                        images=images, profile=self.config.profile,
+                                        sha256=journal.pdf['sha256'])
+                    result.pdf_path = str(pdf_path)
+                if want_cbz:
+                    journal.record_cbz(str(cbz_path), total_pages, title=album.title, photos=photos)
+                    result.cbz_path = str(cbz_path)
                 
-                return True
+                # 清理任务工作目录
+                self.cleanup_temp_files(str(self.get_job_dir(album_id)))
+                journal.compact()
+                
+                result.success = True
             else:
-                print("PDF转换失败")
-                return False
+                error = "PDF转换失败" if want_pdf else "CBZ打包失败"
+                print(error)
+                result.error = error
                 
+        except DownloadCancelled as e:
+            print("任务已取消，已下载的图片会保留以便续传")
+            result.error = str(e)
+            result.cancelled = True
         except Exception as e:
             print(f"操作失败: {e}")
+            result.error = str(e)
             if download_dir:
-                self.cleanup_temp_files(download_dir)
-            return False
+                print(f"已保留下载的图片以便续传: {download_dir}")
+        finally:
+            if pipeline is not None:
+                pipeline.close()
+            if profiler is not None:
+                self.dump_profile(profiler, pdf_path or cbz_path, album_id)
+        
+        result.elapsed = round(time.time() - start, 3)
+        result.stats = metrics.finish(
+            result.success, pages,
+            title=result.title,
+            error=result.error,
+            cancelled=result.cancelled,
+            completeness=result.completeness,
+            appended=base is not None
+        )
+        return result
+    
+    def same_profile(self, record: Dict[str, Any]) -> bool:
+        """已有PDF（索引或任务日志中的记录）是否由当前输出档位生成，没有记录档位的按original处理"""
+        return (record.get('profile') or 'original') == self.config.profile
+    
+    def append_base(self, journal, finished: Dict[str, Any], formats: List[str]) -> Optional[Dict[str, Any]]:
+        """更新模式下可以追加新章节的已有文件（任务日志中的记录，包含生成时的章节列表）
+        
+        旧版本生成的文件没有章节记录，PDF和CBZ包含的章节不同，输出档位不同或PDF结构不支持增量更新时
+        返回None，整本重新生成。
+        """
+        from pdf_writer import read_pdf_structure
+        
+        records = [record for name, record in (('pdf', journal.pdf), ('cbz', journal.cbz)) if name in formats]
+        if not all(record and record.get('photos') for record in records):
+            return None
+        if any(record['photos'] != records[0]['photos'] for record in records):
+            return None
+        if os.path.normcase(records[0]['path']) != os.path.normcase(os.path.abspath(finished['path'])):
+            return None
+        
+        pdf = journal.pdf if 'pdf' in formats else None
+        if pdf is not None:
+            if not self.same_profile(pdf):
+                return None
+            try:
+                read_pdf_structure(pdf['path'])
+            except (OSError, ValueError):
+                return None
+        return {**records[0], 'images': finished.get('images')}
+    
+    def verify_album(self, album, dler, download_dir: str, pipeline: PagePipeline = None,
+                     cancel_event=None) -> Dict[str, Any]:
+        """校验下载的图片，只重新下载缺失或损坏的图片，返回完整性报告
+        
+        获取图片列表失败的章节先整章重试一次；图片在进程池中并行校验，
+        有问题的图片从网络重新下载（不使用缓存和任务日志中的记录）后再校验一次。
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        failed_photos = [photo for photo, _ in dler.download_failed_photo]
+        if failed_photos:
+            print(f"重新下载 {len(failed_photos)} 个失败的章节")
+            dler.download_failed_photo.clear()
+            for photo in failed_photos:
+                try:
+                    dler.download_by_photo_detail(photo)
+                except Exception as e:
+                    print(f"章节 {photo.id} 仍然下载失败: {e}")
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise DownloadCancelled('任务已取消')
+        
+        images = dict(dler.expected_images.values())  # 保存路径 -> 图片信息
+        existing = [path for path in images if os.path.exists(path)]
+        problems = {path: "文件缺失" for path in images if not os.path.exists(path)}
+        
+        executor = self.get_executor()
+        workers = self.config.workers or os.cpu_count() or 1
+        chunksize = max(1, len(existing) // (workers * 4))
+        for path, problem in zip(existing, executor.map(verify_image, existing, chunksize=chunksize)):
+            if problem:
+                problems[path] = problem
+        
+        refetched = 0
+        if problems:
+            print(f"校验发现 {len(problems)} 张图片缺失或损坏，重新下载这些图片")
+            paths = list(problems)
+            if pipeline is not None:
+                for path in paths:
+                    pipeline.discard(path)
+            
+            with ThreadPoolExecutor(max_workers=min(len(paths), 8)) as pool:
+                fetched = list(pool.map(lambda path: dler.refetch_image(images[path], path), paths))
+            
+            if cancel_event is not None and cancel_event.is_set():
+                raise DownloadCancelled('任务已取消')
+            
+            retry = [path for path, ok in zip(paths, fetched) if ok]
+            for path, problem in zip(retry, executor.map(verify_image, retry)):
+                if problem:
+                    problems[path] = problem
+                else:
+                    del problems[path]
+                    refetched += 1
+        
+        photos = len(album) - len(dler.skip_photos)
+        photos_missing = max(0, photos - len(dler.expected_photos))
+        report = {
+            'complete': not problems and not photos_missing,
+            'photos': photos,
+            'photos_missing': photos_missing,
+            'images': len(images),
+            'verified': len(images) - len(problems),
+            'refetched': refetched,
+            'broken': [
+                {'file': os.path.relpath(path, download_dir), 'error': problem}
+                for path, problem in sorted(problems.items())
+            ],
+        }
+        
+        if report['complete']:
+            print(f"图片校验通过: {report['images']} 张" + (f"，重新下载 {refetched} 张" if refetched else ""))
+        else:
+            for item in report['broken']:
+                print(f"  {item['file']}: {item['error']}")
+        return report
+    
+    def repair_page(self, dler, pipeline: PagePipeline, completeness: Dict[str, Any], img_path: str) -> PreparedPage:
+        """组装PDF时图片无法处理：重新下载这一张并重新预处理，仍然失败时抛出异常"""
+        expected = dler.expected_image(img_path)
+        if expected is None:
+            raise ValueError("不在本子的图片列表中，无法重新下载")
+        if not dler.refetch_image(expected[1], expected[0]):
+            raise ValueError("重新下载失败")
+        
+        # 下载完成时已重新提交给流水线
+        page = pipeline.result(img_path)
+        completeness['refetched'] += 1
+        return page
+    
+    def record_library(self, album_id: str, pdf_path: str, pages: int, **fields):
+        """把生成的PDF写入本子库索引，失败时只打印警告（PDF本身已经生成）"""
+        library = self.get_library()
+        if library is None:
+            return
+        try:
+            library.record(album_id, pdf_path, pages, **fields)
+        except Exception as e:
+            print(f"更新本子库索引失败: {e}")
+    
+    def dump_profile(self, profiler, pdf_path=None, album_id: str = None):
+        """把性能分析结果写到PDF旁边，还没有决定PDF路径时写到输出目录"""
+        if pdf_path:
+            base_path = os.path.splitext(str(pdf_path))[0]
+        else:
+            base_path = str(Path(self.config.output_dir) / f"JM{album_id}")
+        
+        try:
+            paths = profiler.dump(base_path)
+        except Exception as e:
+            print(f"性能分析结果保存失败: {e}")
+            return
+        if paths:
+            print(f"性能分析已保存: {', '.join(paths)}")
+    
+    def run_batch(self, album_ids: List[str], jobs: int = 2, summary_path: str = None) -> List[AlbumResult]:
+        """批量下载：最多同时处理jobs个本子，所有本子共用同一个选项和client
+        
+        每个本子完成后立即向summary_path追加一行JSON结果。
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from dataclasses import asdict
+        import threading
+        
+        album_ids = [aid for aid in album_ids if self.validate_album_id(aid)]
+        if not album_ids:
+            print("错误: 没有有效的本子ID")
+            return []
+        
+        # 在启动工作线程前准备好共享的选项和client
+        self.get_option().build_jm_client()
+        
+        if not summary_path:
+            output_dir = Path(self.config.output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            summary_path = str(output_dir / f"batch_summary_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        
+        print(f"批量任务: {len(album_ids)} 个本子, 并发数: {jobs}")
+        print(f"结果汇总: {summary_path}")
+        
+        results = []
+        lock = threading.Lock()
+        
+        with open(summary_path, 'a', encoding='utf-8') as summary, \
+                ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {executor.submit(self.process_album, aid): aid for aid in album_ids}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = AlbumResult(album_id=futures[future], error=str(e))
+                
+                with lock:
+                    results.append(result)
+                    summary.write(json.dumps(asdict(result), ensure_ascii=False) + '\n')
+                    summary.flush()
+                    print(f"[{len(results)}/{len(album_ids)}] {result.album_id}: "
+                          f"{'成功' if result.success else '失败'} ({result.elapsed}s)")
+        
+        succeeded = sum(1 for r in results if r.success)
+        print(f"批量任务完成: 成功 {succeeded}, 失败 {len(results) - succeeded}")
+        return results
+
+
+def read_album_ids(source: str) -> List[str]:
+    """从文件或stdin（'-'）读取本子ID，支持空白/逗号分隔和#注释，保持顺序去重"""
+    if source == '-':
+        text = sys.stdin.read()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            text = f.read()
+    
+    album_ids = []
+    seen = set()
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        for token in line.replace(',', ' ').split():
+            if token not in seen:
+                seen.add(token)
+                album_ids.append(token)
+    
+    return album_ids
+
+
+def serve(downloader: JMcomicDownloader, stdin=None, stdout=None) -> int:
+    """常驻模式：从stdin逐行读取JSON任务，向stdout逐行写回JSON结果
+    
+    请求: {"id": 1, "cmd": "download", "album_id": "123"}
+    响应: {"id": 1, "ok": true, "album_id": "123", "elapsed": 1.23}
+    取消: {"id": 2, "cmd": "cancel", "target": 1}，不带target时取消所有任务
+    
+    进度事件: {"event": "image", "job": 1, "album_id": "123", ...}，格式见events模块
+    
+    下载任务在后台线程中按顺序执行，执行期间仍可接收取消命令。
+    任务执行期间的普通输出会被重定向到stderr，stdout只用于协议消息。
+    """
+    import contextlib
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from events import EventEmitter
+    
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    emitter = EventEmitter(stdout)
+    jobs: Dict[Any, threading.Event] = {}
+    
+    def reply(message: Dict[str, Any]):
+        emitter.write(message)
+    
+    def run_download(request_id, album_id: str, cancel_event: threading.Event):
+        try:
+            if cancel_event.is_set():
+                result = AlbumResult(album_id=album_id, error='任务已取消', cancelled=True)
+            else:
+                result = downloader.process_album(album_id, cancel_event, emitter.bind(job=request_id))
+            reply({
+                'id': request_id,
+                'ok': result.success,
+                'album_id': album_id,
+                'pdf_path': result.pdf_path,
+                'cbz_path': result.cbz_path,
+                'elapsed': result.elapsed,
+                'error': result.error,
+                'cancelled': result.cancelled,
+                'concurrency': result.concurrency,
+                'stats': result.stats,
+                'completeness': result.completeness
+            })
+        except Exception as e:
+            reply({'id': request_id, 'ok': False, 'album_id': album_id, 'error': str(e)})
+        finally:
+            jobs.pop(request_id, None)
+    
+    with contextlib.redirect_stdout(sys.stderr), ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            downloader.get_option()
+        except Exception as e:
+            print(f"选项初始化失败: {e}")
+        
+        reply({'event': 'ready', 'pid': os.getpid()})
+        
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply({'ok': False, 'error': f'无效的请求: {line}'})
+                continue
+            
+            request_id = request.get('id')
+            cmd = request.get('cmd', 'download')
+            
+            if cmd == 'ping':
+                reply({'id': request_id, 'ok': True})
+            elif cmd == 'shutdown':
+                # 已排队的任务执行完后再退出
+                reply({'id': request_id, 'ok': True})
+                break
+            elif cmd == 'download':
+                album_id = str(request.get('album_id', '')).strip()
+                cancel_event = threading.Event()
+                jobs[request_id] = cancel_event
+                executor.submit(run_download, request_id, album_id, cancel_event)
+            elif cmd == 'cancel':
+                target = request.get('target')
+                targets = list(jobs) if target is None else [target]
+                cancelled = []
+                for job_id in targets:
+                    cancel_event = jobs.get(job_id)
+                    if cancel_event is not None:
+                        cancel_event.set()
+                        cancelled.append(job_id)
+                reply({'id': request_id, 'ok': bool(cancelled), 'cancelled': cancelled})
+            else:
+                reply({'id': request_id, 'ok': False, 'error': f'未知命令: {cmd}'})
+    
+    return 0
 
 
 def main():
     """主函数"""
+    mode = 'single'
+    
     try:
         import argparse
         
         parser = argparse.ArgumentParser(description='JMcomic下载器')
-        parser.add_argument('album_id', help='本子ID')
+        parser.add_argument('album_id', nargs='*', help='本子ID，提供多个时按批量模式处理')
         parser.add_argument('--config', help='配置文件路径')
         parser.add_argument('--output', help='输出目录路径')
+        parser.add_argument('--serve', action='store_true', help='常驻模式，通过stdin/stdout以JSON行接收任务')
+        parser.add_argument('--batch', metavar='FILE', help='从文件批量读取本子ID，使用 - 表示stdin')
+        parser.add_argument('--jobs', type=int, default=2, help='批量模式下同时处理的本子数')
+        parser.add_argument('--summary', help='批量模式的结果汇总文件（JSON行）')
+        parser.add_argument('--workers', type=int, default=0, help='图片预处理进程数，默认使用CPU核心数')
+        parser.add_argument('--no-passthrough', action='store_true', help='所有图片都重新编码，不原样嵌入JPEG')
+        parser.add_argument('--pdf-backend', choices=sorted(PDF_BACKENDS), help='PDF写入后端，默认stream')
+        parser.add_argument('--profile', choices=list(OUTPUT_PROFILES), help='输出档位，默认original')
+        parser.add_argument('--cache-dir', help='图片缓存目录')
+        parser.add_argument('--cache-max-mb', type=int, help='图片缓存容量上限(MB)，0表示不启用')
+        parser.add_argument('--no-probe', action='store_true', help='不探测域名，按配置顺序使用')
+        parser.add_argument('--adaptive-threads', action='store_true', help='按域名自适应调整图片并发数')
+        parser.add_argument('--max-image-threads', type=int, help='自适应模式下单个域名的并发上限')
+        parser.add_argument('--pool-size', type=int, help='每个域名保留的长连接数，0表示不使用连接池')
+        parser.add_argument('--engine', choices=['thread', 'async'], help='下载引擎（默认thread）')
+        parser.add_argument('--async-concurrency', type=int, help='async引擎的全局并发上限')
+        parser.add_argument('--bandwidth-limit', type=int, help='async引擎的全局带宽上限(KB/s)，0表示不限速')
+        parser.add_argument('--no-previews', action='store_true', help='转换时不生成预览（封面、缩略图总览）')
+        parser.add_argument('--formats', help='输出格式，逗号分隔: pdf、cbz，例如 pdf,cbz 一次生成两种（默认pdf）')
+        parser.add_argument('--update', action='store_true',
+                            help='已生成的本子只下载新章节并追加到原来的PDF（增量更新）')
+        parser.add_argument('--allow-incomplete', action='store_true',
+                            help='重新下载后仍有缺失或损坏的图片时跳过这些页面生成PDF（默认不生成）')
+        parser.add_argument('--profiling', action='store_true',
+                            help='性能分析模式，结果写在PDF旁边（也可以设置环境变量JMF_PROFILE=1）')
+        parser.add_argument('--events', metavar='FILE', help='以JSON行输出进度和统计事件，使用 - 表示stdout（常驻模式始终输出到协议流）')
         
         args = parser.parse_args()
         
-        album_id = args.album_id.strip()
-        if not album_id:
+        album_ids = [aid.strip() for aid in args.album_id if aid.strip()]
+        if args.batch:
+            album_ids.extend(read_album_ids(args.batch))
+        
+        if not album_ids and not args.serve:
             print("错误: 未提供本子ID")
             return 1
         
+        album_id = album_ids[0] if album_ids else ''
+        
         # 创建下载器，使用指定的配置文件
         downloader = JMcomicDownloader(config_path=args.config)
         
         # 如果指定了输出目录，更新配置
         if args.output:
             downloader.config.output_dir = args.output
+        if args.workers:
+            downloader.config.workers = args.workers
+        if args.no_passthrough:
+            downloader.config.jpeg_passthrough = False
+        if args.pdf_backend:
+            downloader.config.pdf_backend = args.pdf_backend
+        if args.profile:
+            downloader.config.profile = args.profile
+        if args.cache_dir:
+            downloader.config.cache_dir = args.cache_dir
+        if args.cache_max_mb is not None:
+            downloader.config.cache_max_mb = args.cache_max_mb
+        if args.no_probe:
+            downloader.config.probe_domains = False
+        if args.adaptive_threads:
+            downloader.config.adaptive_threads = True
+        if args.max_image_threads:
+            downloader.config.max_image_threads = args.max_image_threads
+        if args.pool_size is not None:
+            downloader.config.pool_size = args.pool_size
+        if args.engine:
+            downloader.config.engine = args.engine
+        if args.async_concurrency:
+            downloader.config.async_concurrency = args.async_concurrency
+        if args.bandwidth_limit is not None:
+            downloader.config.bandwidth_limit_kb = args.bandwidth_limit
+        if args.no_previews:
+            downloader.config.previews = False
+        if args.formats:
+            downloader.config.output_formats = args.formats
+        if args.update:
+            downloader.config.update = True
+        if args.allow_incomplete:
+            downloader.config.require_complete = False
+        if args.profiling:
+            downloader.config.profiling = True
+        if args.events and not args.serve:
+            from events import EventEmitter
+            
+            stream = sys.stdout if args.events == '-' else open(args.events, 'a', encoding='utf-8')
+            downloader.events = EventEmitter(stream)
+        
+        if args.serve:
+            mode = 'serve'
+        elif args.batch or len(album_ids) > 1:
+            mode = 'batch'
     
     except Exception as e:
         # 如果argparse失败，回到原始的参数解析方式
@@ -401,6 +1903,13 @@ def main():
         downloader = JMcomicDownloader()
     
     try:
+        if mode == 'serve':
+            return serve(downloader)
+        
+        if mode == 'batch':
+            results = downloader.run_batch(album_ids, jobs=args.jobs, summary_path=args.summary)
+            return 0 if results and all(r.success for r in results) else 1
+        
         success = downloader.download_and_convert(album_id)
         if success:
             return 0
@@ -410,9 +1919,15 @@ def main():
     except KeyboardInterrupt:
         print("\n操作已取消")
         return 1
+    except ImportError as e:
+        print(f"缺少必要的Python包: {e}")
+        print("请运行: pip install -r requirements.txt")
+        return 1
     except Exception as e:
         print(f"未预期的错误: {e}")
         return 1
+    finally:
+        downloader.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+"""
+结构化事件流
+下载器在打印中文状态的同时输出JSON行事件，供Electron界面、日志和统计面板使用。
+
+事件格式: {"event": "<类型>", "ts": <unix时间>, ...上下文字段, ...事件字段}
+  image    单张图片: bytes, latency(秒), source(network/cache/journal), host
+  photo    章节开始下载: photo_id, images
+  stage    阶段耗时: stage, elapsed
+           download/verify（校验并重新下载损坏的图片）/pdf/cbz（只生成CBZ时）为整体耗时，
+           prepare（解码转换）、assemble（组装页面）、write（写出文件）、archive（同时写入CBZ）为累计耗时，preview为生成预览的耗时，
+           fetch（网络请求）和decode（解密）按图片累计，只出现在album汇总中
+  queue    预处理流水线队列深度: pending, inflight, buffered_bytes（节流输出）
+  album    本子完成: 成功与否、各阶段累计耗时、字节数、pages/s、MB/s、completeness（图片完整性校验结果）
+"""
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, TextIO
+
+
+class EventEmitter:
+    """线程安全的JSON行事件输出，stream为None时不输出"""
+
+    def __init__(self, stream: Optional[TextIO] = None, lock: threading.Lock = None, **context):
+        self.stream = stream
+        self.lock = lock or threading.Lock()
+        self.context = context
+
+    @property
+    def enabled(self) -> bool:
+        return self.stream is not None
+
+    def bind(self, **context) -> 'EventEmitter':
+        """返回附加了上下文字段（例如job、album_id）的emitter，共用同一个输出和锁"""
+        return EventEmitter(self.stream, self.lock, **{**self.context, **context})
+
+    def write(self, message: Dict[str, Any]):
+        """原样写出一行JSON"""
+        if self.stream is None:
+            return
+        line = json.dumps(message, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def emit(self, event: str, **fields):
+        if self.stream is None:
+            return
+        self.write({'event': event, 'ts': round(time.time(), 3), **self.context, **fields})
+
+
+class AlbumMetrics:
+    """单个本子的统计：逐张图片、各阶段耗时，结束时汇总为album事件"""
+
+    def __init__(self, emitter: EventEmitter, album_id: str, queue_interval: float = 0.5):
+        self.emitter = emitter.bind(album_id=str(album_id))
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.queue_interval = queue_interval
+        self.last_queue = 0.0
+
+        self.stages: Dict[str, float] = {}
+        self.images_total = 0
+        self.images = {'network': 0, 'cache': 0, 'journal': 0}
+        self.bytes = 0
+        self.max_queue = {'pending': 0, 'inflight': 0, 'buffered_bytes': 0}
+
+    def record_stage(self, stage: str, elapsed: float):
+        """累计阶段耗时并输出stage事件"""
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed
+        self.emitter.emit('stage', stage=stage, elapsed=round(elapsed, 4))
+
+    @contextmanager
+    def stage(self, stage: str):
+        """计时一个整体阶段，结束时输出stage事件"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - start)
+
+    def photo(self, photo_id: str, images: int):
+        with self.lock:
+            self.images_total += images
+        self.emitter.emit('photo', photo_id=str(photo_id), images=images)
+
+    def image(self, host: str, size: int, latency: float, source: str = 'network', decode: float = None):
+        with self.lock:
+            self.images[source] = self.images.get(source, 0) + 1
+            if source == 'network':
+                self.bytes += size
+                self.stages['fetch'] = self.stages.get('fetch', 0.0) + latency
+                if decode is not None:
+                    self.stages['decode'] = self.stages.get('decode', 0.0) + decode
+            done = sum(self.images.values())
+
+        fields = {'host': host, 'bytes': size, 'latency': round(latency, 4), 'source': source,
+                  'done': done, 'total': self.images_total}
+        if decode is not None:
+            fields['decode'] = round(decode, 4)
+        self.emitter.emit('image', **fields)
+
+    def queue(self, pending: int, inflight: int, buffered_bytes: int):
+        """记录流水线队列深度，事件按时间间隔节流"""
+        now = time.perf_counter()
+        with self.lock:
+            self.max_queue['pending'] = max(self.max_queue['pending'], pending)
+            self.max_queue['inflight'] = max(self.max_queue['inflight'], inflight)
+            self.max_queue['buffered_bytes'] = max(self.max_queue['buffered_bytes'], buffered_bytes)
+            if now - self.last_queue < self.queue_interval:
+                return
+            self.last_queue = now
+        self.emitter.emit('queue', pending=pending, inflight=inflight, buffered_bytes=buffered_bytes)
+
+    def summary(self, pages: int = 0) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        with self.lock:
+            return {
+                'elapsed': round(elapsed, 3),
+                'pages': pages,
+                'images': dict(self.images),
+                'bytes': self.bytes,
+                'stages': {k: round(v, 4) for k, v in self.stages.items()},
+                'max_queue': dict(self.max_queue),
+                'pages_per_s': round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+                'mb_per_s': round(self.bytes / 1024 / 1024 / elapsed, 3) if elapsed > 0 else 0.0,
+            }
+
+    def finish(self, success: bool, pages: int = 0, **fields) -> Dict[str, Any]:
+        stats = self.summary(pages)
+        self.emitter.emit('album', success=success, **stats, **fields)
+        return stats
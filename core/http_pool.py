@@ -0,0 +1,133 @@
+"""
+共享HTTP连接池
+jmcomic默认的curl_cffi postman每个请求都新建连接，同一镜像站的TLS握手被反复执行。
+这里按域名维护一组长连接会话，请求时借出、用完归还，
+进程内所有章节和本子（批量任务、常驻模式）复用同一个连接池。
+"""
+import queue
+import threading
+from urllib.parse import urlparse
+from typing import Dict, Optional
+
+from common import AbstractPostman
+
+
+def normalize_proxies(proxies) -> Optional[Dict[str, str]]:
+    """把 '127.0.0.1:7890' 形式的代理地址转换为curl_cffi需要的字典"""
+    if not proxies:
+        return None
+    if isinstance(proxies, dict):
+        return dict(proxies)
+    proxy = proxies if '://' in proxies else f"http://{proxies}"
+    return {'http': proxy, 'https': proxy}
+
+
+class SessionPool:
+    """按域名划分的curl_cffi会话池（线程安全）
+
+    每个会话只持有一个curl句柄，同一时间只借给一个线程；
+    某个域名的会话全部借出时临时新建一个，归还时超出pool_size的会话直接关闭。
+    """
+
+    def __init__(self, pool_size: int = 16, proxies=None, impersonate: Optional[str] = 'chrome'):
+        self.pool_size = max(1, pool_size)
+        self.proxies = normalize_proxies(proxies)
+        self.impersonate = impersonate
+        self.pools: Dict[str, queue.LifoQueue] = {}
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.closed = False
+
+    def _pool(self, host: str) -> queue.LifoQueue:
+        with self.lock:
+            pool = self.pools.get(host)
+            if pool is None:
+                pool = self.pools[host] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def _new_session(self):
+        from curl_cffi import requests
+
+        with self.lock:
+            self.created += 1
+        kwargs = {'use_thread_local_curl': False}
+        if self.proxies:
+            kwargs['proxies'] = self.proxies
+        if self.impersonate:
+            kwargs['impersonate'] = self.impersonate
+        return requests.Session(**kwargs)
+
+    def acquire(self, host: str):
+        """借出一个会话，优先使用最近归还的（连接最可能还活着）"""
+        try:
+            session = self._pool(host).get_nowait()
+        except queue.Empty:
+            return self._new_session()
+
+        with self.lock:
+            self.reused += 1
+        return session
+
+    def release(self, host: str, session, broken: bool = False):
+        """归还会话，连接出错或池已满时关闭"""
+        if not broken and not self.closed:
+            try:
+                self._pool(host).put_nowait(session)
+                return
+            except queue.Full:
+                pass
+        session.close()
+
+    def request(self, method: str, url: str, **kwargs):
+        host = urlparse(url).netloc
+        session = self.acquire(host)
+        broken = True
+        try:
+            resp = session.request(method, url, **kwargs)
+            broken = False
+            return resp
+        finally:
+            self.release(host, session, broken)
+
+    def install(self, client):
+        """把jmcomic客户端的postman替换为使用连接池的postman（重复调用无副作用）"""
+        postman = getattr(client, 'postman', None)
+        if isinstance(postman, PooledPostman) or not isinstance(postman, AbstractPostman):
+            return
+        client.postman = PooledPostman(postman.meta_data, self)
+
+    def summary(self) -> str:
+        with self.lock:
+            idle = sum(pool.qsize() for pool in self.pools.values())
+            return f"新建会话 {self.created} 个，复用 {self.reused} 次，空闲 {idle} 个"
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+class PooledPostman(AbstractPostman):
+    """通过SessionPool发送请求的postman，meta_data（headers、cookies、proxies等）沿用原postman"""
+    postman_key = 'jmf_pooled'
+
+    def __init__(self, kwargs: dict, pool: SessionPool) -> None:
+        super().__init__(kwargs)
+        self.pool = pool
+
+    def __get__(self):
+        return lambda url, **kwargs: self.pool.request('GET', url, **kwargs)
+
+    def __post__(self):
+        return lambda url, **kwargs: self.pool.request('POST', url, **kwargs)
+
+    def copy(self):
+        return self.__class__(self.meta_data.copy(), self.pool)
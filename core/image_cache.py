@@ -0,0 +1,165 @@
+"""
+内容寻址的本地图片缓存
+图片按内容的SHA-256保存一份，图片URL等键只记录指向的内容摘要，
+相同内容在多个本子/章节间共享。总大小超过上限时按最近访问时间淘汰。
+总大小记录在meta表中，和blobs表在同一事务内增减，写入时不必对整张表求和。
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app_files import app_data_dir, file_digest
+
+
+def default_cache_dir() -> str:
+    """默认图片缓存目录"""
+    return str(app_data_dir() / 'image_cache')
+
+
+class ImageCache:
+    """带容量上限和LRU淘汰的内容寻址图片缓存（线程安全，多进程共享同一目录也安全）"""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir or default_cache_dir())
+        self.objects_dir = self.cache_dir / 'objects'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(str(self.cache_dir / 'index.db'), timeout=30, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, digest TEXT NOT NULL, last_access REAL NOT NULL)'
+            )
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS blobs ('
+                'digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            # 旧版本的缓存没有meta表，求和一次作为初始值
+            self.db.execute(
+                "INSERT OR IGNORE INTO meta (name, value) "
+                "SELECT 'total_size', COALESCE(SUM(size), 0) FROM blobs"
+            )
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def get(self, key: str, dest_path: str) -> bool:
+        """如果缓存中有key对应的图片，复制到dest_path并返回True"""
+        with self.lock:
+            row = self.db.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False
+
+        blob = self._blob_path(row[0])
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+            temp_path = f"{dest_path}.cache-{threading.get_ident()}"
+            shutil.copyfile(blob, temp_path)
+            os.replace(temp_path, dest_path)
+        except OSError:
+            # 内容文件已丢失，删除失效的索引
+            with self.lock, self.db:
+                self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return False
+
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            self.db.execute('UPDATE blobs SET last_access = ? WHERE digest = ?', (now, row[0]))
+        return True
+
+    def put(self, key: str, src_path: str) -> Optional[str]:
+        """把src_path的内容存入缓存并关联到key，返回内容摘要"""
+        try:
+            digest = file_digest(src_path)
+            size = os.path.getsize(src_path)
+            blob = self._blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = f"{blob}.tmp-{os.getpid()}-{threading.get_ident()}"
+                shutil.copyfile(src_path, temp_path)
+                os.replace(temp_path, blob)
+        except OSError as e:
+            print(f"写入图片缓存失败 {src_path}: {e}")
+            return None
+
+        now = time.time()
+        with self.lock, self.db:
+            inserted = self.db.execute(
+                'INSERT OR IGNORE INTO blobs (digest, size, last_access) VALUES (?, ?, ?)',
+                (digest, size, now)
+            ).rowcount
+            if inserted:
+                self.db.execute("UPDATE meta SET value = value + ? WHERE name = 'total_size'", (size,))
+            else:
+                self.db.execute('UPDATE blobs SET last_access = ? WHERE digest = ?', (now, digest))
+            self.db.execute(
+                'INSERT OR REPLACE INTO entries (key, digest, last_access) VALUES (?, ?, ?)',
+                (key, digest, now)
+            )
+            total = self._total_size()
+
+        if total > self.max_bytes:
+            self.evict()
+        return digest
+
+    def _total_size(self) -> int:
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()
+        return row[0] if row else 0
+
+    def total_size(self) -> int:
+        with self.lock:
+            return self._total_size()
+
+    def evict(self):
+        """总大小超过上限时，按最近访问时间淘汰到上限的90%"""
+        if self.total_size() <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        with self.lock:
+            total = self._total_size()
+            rows = self.db.execute('SELECT digest, size FROM blobs ORDER BY last_access').fetchall()
+
+            evicted = []
+            for digest, size in rows:
+                if total <= target:
+                    break
+                evicted.append((digest, size))
+                total -= size
+
+            with self.db:
+                freed = 0
+                for digest, size in evicted:
+                    # 其他进程可能已经淘汰了同一内容，只扣除本次实际删除的大小
+                    if self.db.execute('DELETE FROM blobs WHERE digest = ?', (digest,)).rowcount:
+                        freed += size
+                    self.db.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+                self.db.execute("UPDATE meta SET value = value - ? WHERE name = 'total_size'", (freed,))
+
+        for digest, _ in evicted:
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+if __name__ == '__main__':
+    cache = ImageCache(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"缓存目录: {cache.cache_dir}")
+    print(f"已用空间: {cache.total_size() / 1024 / 1024:.1f} MB")
+    cache.close()
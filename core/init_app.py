@@ -117,6 +117,7 @@ def create_default_settings(settings_path: Path, output_dir: str):
             ],
             'retryTimes': 3,
             'imageThreads': 20,
+            'adaptiveThreads': False,
             'enableProxy': False,
             'proxyAddress': '127.0.0.1:7890'
         },
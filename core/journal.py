@@ -0,0 +1,143 @@
+"""
+本子任务日志
+每个本子一个JSON行文件，追加记录已完成的图片、章节以及生成的PDF/CBZ，
+进程中断后重新运行时可以从断点继续，已经生成且校验通过的文件直接跳过。
+"""
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Set
+
+from app_files import file_digest
+
+
+class AlbumJournal:
+    """单个本子的任务日志"""
+
+    def __init__(self, journal_dir: str, album_id: str):
+        self.album_id = str(album_id)
+        self.path = Path(journal_dir) / f"{self.album_id}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+        self.download_dir: Optional[str] = None
+        self.images: Dict[str, int] = {}
+        self.photos: Set[str] = set()
+        self.pdf: Optional[Dict[str, Any]] = None
+        self.cbz: Optional[Dict[str, Any]] = None
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    continue
+                self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]):
+        kind = record.get('type')
+        if kind == 'download_dir':
+            self.download_dir = record['path']
+        elif kind == 'image':
+            self.images[os.path.normcase(os.path.abspath(record['path']))] = record['size']
+        elif kind == 'photo':
+            self.photos.add(str(record['id']))
+        elif kind == 'pdf':
+            self.pdf = record
+        elif kind == 'cbz':
+            self.cbz = record
+
+    def _append(self, record: Dict[str, Any]):
+        record.setdefault('time', round(time.time(), 3))
+        with self.lock:
+            self._apply(record)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def record_download_dir(self, path: str):
+        if self.download_dir != path:
+            self._append({'type': 'download_dir', 'path': path})
+
+    def record_image(self, path: str):
+        self._append({'type': 'image', 'path': os.path.abspath(path), 'size': os.path.getsize(path)})
+
+    def record_photo(self, photo_id: str):
+        self._append({'type': 'photo', 'id': str(photo_id)})
+
+    def _record_output(self, kind: str, path: str, pages: int, extra: Dict[str, Any]):
+        self._append({
+            'type': kind,
+            'path': os.path.abspath(path),
+            'size': os.path.getsize(path),
+            'sha256': file_digest(path),
+            'pages': pages,
+            **extra
+        })
+
+    def record_pdf(self, pdf_path: str, pages: int, **extra):
+        self._record_output('pdf', pdf_path, pages, extra)
+
+    def record_cbz(self, cbz_path: str, pages: int, **extra):
+        self._record_output('cbz', cbz_path, pages, extra)
+
+    def has_image(self, path: str) -> bool:
+        """图片是否已完整下载（日志中有记录且文件大小一致）"""
+        key = os.path.normcase(os.path.abspath(path))
+        size = self.images.get(key)
+        return size is not None and os.path.exists(path) and os.path.getsize(path) == size
+
+    @staticmethod
+    def _verified(record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not record or not os.path.exists(record['path']):
+            return None
+        if os.path.getsize(record['path']) != record['size']:
+            return None
+        if file_digest(record['path']) != record['sha256']:
+            return None
+        return record
+
+    def verified_pdf(self) -> Optional[Dict[str, Any]]:
+        """返回已生成且校验通过（大小与SHA-256一致）的PDF记录"""
+        return self._verified(self.pdf)
+
+    def verified_cbz(self) -> Optional[Dict[str, Any]]:
+        """返回已生成且校验通过的CBZ记录"""
+        return self._verified(self.cbz)
+
+    def prune_incomplete(self) -> int:
+        """删除下载目录中日志未记录的图片（中断时可能只写了一半），返回删除数量"""
+        if not self.download_dir or not os.path.isdir(self.download_dir):
+            return 0
+
+        removed = 0
+        for root, dirs, files in os.walk(self.download_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                if not self.has_image(path):
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def compact(self):
+        """本子完成后只保留PDF和CBZ记录"""
+        with self.lock:
+            self.download_dir = None
+            self.images.clear()
+            self.photos.clear()
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in (self.pdf, self.cbz):
+                    if record:
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
@@ -0,0 +1,317 @@
+"""
+本子库索引
+用SQLite记录输出目录中的PDF：本子ID、路径、页数、大小、SHA-256、源图片数和输出档位。
+转换完成时在一个事务中写入，按本子ID查询已生成的PDF只需要一次索引查找和一次stat，
+不再需要按标题猜测文件名或遍历输出目录。
+
+输出目录中不是由下载器生成的PDF（手动放入、旧版本生成）通过sync加入索引（没有本子ID）；
+目录修改时间不变时sync不会遍历目录。索引数据库默认放在应用数据目录中（按输出目录区分），
+不放在输出目录里：数据库和WAL文件的创建、删除会改变输出目录的修改时间，导致每次sync都要遍历。
+
+命令行:
+  python library.py --dir ../PDF list --json --sync   # 列出本子库（先同步目录变化）
+  python library.py --dir ../PDF get 123456           # 查询某个本子，不存在时返回1
+  python library.py --dir ../PDF import-journals      # 从任务日志导入已生成的PDF
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from app_files import app_data_dir, file_digest
+
+LEGACY_LIBRARY_FILENAME = '.library.db'  # 旧版本放在输出目录中的索引
+
+COLUMNS = ('path', 'album_id', 'title', 'pages', 'size', 'mtime', 'sha256', 'images', 'profile', 'created')
+
+
+def default_library_path(output_dir: str) -> str:
+    """默认索引位置：应用数据目录下的library/<输出目录路径的摘要>.db
+    
+    旧版本在输出目录中留下的.library.db（连同-wal、-shm文件）第一次使用时移过来。
+    """
+    output_dir = os.path.normcase(os.path.abspath(output_dir))
+    digest = hashlib.sha256(output_dir.encode('utf-8')).hexdigest()[:16]
+    path = app_data_dir() / 'library' / f"{digest}.db"
+
+    legacy = Path(output_dir) / LEGACY_LIBRARY_FILENAME
+    if not path.exists() and legacy.exists():
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            for suffix in ('-wal', '-shm', ''):
+                if os.path.exists(f"{legacy}{suffix}"):
+                    shutil.move(f"{legacy}{suffix}", f"{path}{suffix}")
+        except OSError as e:
+            print(f"迁移旧的本子库索引失败: {e}", file=sys.stderr)
+    return str(path)
+
+
+def path_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def created_time(stat: os.stat_result) -> float:
+    """文件创建时间：Windows上st_ctime就是创建时间，其他系统有st_birthtime时使用，否则使用修改时间"""
+    if os.name == 'nt':
+        return stat.st_ctime
+    return getattr(stat, 'st_birthtime', stat.st_mtime)
+
+
+class LibraryIndex:
+    """本子库索引（线程安全，多进程共享同一数据库也安全）"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS pdfs ('
+                'key TEXT PRIMARY KEY, path TEXT NOT NULL, album_id TEXT UNIQUE, title TEXT, '
+                'pages INTEGER, size INTEGER NOT NULL, mtime INTEGER NOT NULL, sha256 TEXT, '
+                'images INTEGER, profile TEXT, created REAL NOT NULL)'
+            )
+            self.db.execute('CREATE INDEX IF NOT EXISTS pdfs_created ON pdfs (created)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    @staticmethod
+    def _entry(row) -> Optional[Dict[str, Any]]:
+        return {name: row[name] for name in COLUMNS} if row is not None else None
+
+    def record(self,
+               album_id: str,
+               pdf_path: str,
+               pages: int,
+               title: str = None,
+               images: int = None,
+               profile: str = None,
+               sha256: str = None) -> Dict[str, Any]:
+        """转换完成后记录本子，替换该本子以前的记录和同一路径上的旧记录"""
+        stat = os.stat(pdf_path)
+        entry = {
+            'path': os.path.abspath(pdf_path),
+            'album_id': str(album_id),
+            'title': title,
+            'pages': pages,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'sha256': sha256 or file_digest(pdf_path),
+            'images': images,
+            'profile': profile,
+            'created': time.time(),
+        }
+
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM pdfs WHERE album_id = ? OR key = ?', (entry['album_id'], path_key(pdf_path)))
+            self.db.execute(
+                f"INSERT INTO pdfs (key, {', '.join(COLUMNS)}) VALUES (?{', ?' * len(COLUMNS)})",
+                (path_key(pdf_path), *(entry[name] for name in COLUMNS))
+            )
+        return entry
+
+    def get(self, album_id: str) -> Optional[Dict[str, Any]]:
+        """按本子ID查询索引记录（不检查文件）"""
+        with self.lock:
+            row = self.db.execute('SELECT * FROM pdfs WHERE album_id = ?', (str(album_id),)).fetchone()
+        return self._entry(row)
+
+    def verified(self, album_id: str) -> Optional[Dict[str, Any]]:
+        """返回本子已生成且未被改动的PDF记录
+
+        文件大小和修改时间与记录一致时直接认为有效；只有修改时间变化（例如复制、还原）时才重新计算SHA-256。
+        """
+        entry = self.get(album_id)
+        if entry is None:
+            return None
+
+        try:
+            stat = os.stat(entry['path'])
+        except OSError:
+            return None
+        if stat.st_size != entry['size']:
+            return None
+        if stat.st_mtime_ns == entry['mtime']:
+            return entry
+
+        if entry['sha256'] and file_digest(entry['path']) == entry['sha256']:
+            with self.lock, self.db:
+                self.db.execute('UPDATE pdfs SET mtime = ? WHERE album_id = ?', (stat.st_mtime_ns, entry['album_id']))
+            entry['mtime'] = stat.st_mtime_ns
+            return entry
+        return None
+
+    def remove(self, album_id: str) -> bool:
+        with self.lock, self.db:
+            return self.db.execute('DELETE FROM pdfs WHERE album_id = ?', (str(album_id),)).rowcount > 0
+
+    def entries(self, search: str = None, limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """按创建时间从新到旧列出本子库，search匹配标题、文件路径或本子ID"""
+        sql = 'SELECT * FROM pdfs'
+        params: List[Any] = []
+        if search:
+            sql += ' WHERE title LIKE ? OR path LIKE ? OR album_id = ?'
+            params += [f"%{search}%", f"%{search}%", search]
+        sql += ' ORDER BY created DESC'
+        if limit:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [limit, offset]
+
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def sync(self, output_dir: str, force: bool = False) -> Dict[str, int]:
+        """同步输出目录的变化：新出现的PDF加入索引，已删除的移出索引
+
+        目录修改时间与上次同步时一致时不遍历目录（force为True时总是遍历）。
+        """
+        output_dir = os.path.abspath(output_dir)
+        try:
+            dir_mtime = str(os.stat(output_dir).st_mtime_ns)
+        except OSError:
+            return {'added': 0, 'removed': 0}
+
+        meta_name = f"dir_mtime:{os.path.normcase(output_dir)}"
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE name = ?', (meta_name,)).fetchone()
+        if row is not None and row[0] == dir_mtime and not force:
+            return {'added': 0, 'removed': 0}
+
+        found = {}
+        with os.scandir(output_dir) as it:
+            for entry in it:
+                if entry.name.lower().endswith('.pdf') and entry.is_file():
+                    found[path_key(entry.path)] = entry
+
+        dir_key = os.path.normcase(output_dir)
+        with self.lock:
+            known = {key for (key,) in self.db.execute('SELECT key FROM pdfs')}
+            removed = [key for key in known if os.path.dirname(key) == dir_key and key not in found]
+            added = []
+            for key, entry in found.items():
+                if key in known:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                added.append((key, entry.path, os.path.splitext(entry.name)[0], stat.st_size,
+                              stat.st_mtime_ns, created_time(stat)))
+
+            with self.db:
+                self.db.executemany('DELETE FROM pdfs WHERE key = ?', [(key,) for key in removed])
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO pdfs (key, path, title, size, mtime, created) VALUES (?, ?, ?, ?, ?, ?)',
+                    added
+                )
+                self.db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (meta_name, dir_mtime))
+
+        return {'added': len(added), 'removed': len(removed)}
+
+    def import_journals(self, journal_dir: str) -> int:
+        """从任务日志导入已生成的PDF（升级前生成的本子），返回导入数量"""
+        from journal import AlbumJournal
+
+        if not os.path.isdir(journal_dir):
+            return 0
+
+        imported = 0
+        for file in os.listdir(journal_dir):
+            if not file.endswith('.jsonl'):
+                continue
+            journal = AlbumJournal(journal_dir, file[:-len('.jsonl')])
+            pdf = journal.pdf
+            if not pdf or self.get(journal.album_id) is not None:
+                continue
+            try:
+                if os.path.getsize(pdf['path']) != pdf['size']:
+                    continue
+                self.record(journal.album_id, pdf['path'], pdf.get('pages'), title=pdf.get('title'),
+                            profile=pdf.get('profile'), sha256=pdf['sha256'])
+                imported += 1
+            except OSError:
+                continue
+        return imported
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本子库索引')
+    parser.add_argument('--dir', default='../PDF', help='PDF输出目录')
+    parser.add_argument('--db', help='索引数据库路径，默认在应用数据目录中按输出目录区分')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='列出本子库')
+    list_parser.add_argument('--json', action='store_true', help='以JSON输出')
+    list_parser.add_argument('--sync', action='store_true', help='列出前同步输出目录的变化')
+    list_parser.add_argument('--search', help='按标题、文件名或本子ID筛选')
+    list_parser.add_argument('--limit', type=int, help='最多列出的数量')
+    list_parser.add_argument('--offset', type=int, default=0)
+
+    get_parser = commands.add_parser('get', help='查询某个本子，不存在或文件已改动时返回1')
+    get_parser.add_argument('album_id')
+
+    sync_parser = commands.add_parser('sync', help='同步输出目录的变化')
+    sync_parser.add_argument('--force', action='store_true', help='忽略目录修改时间，总是遍历目录')
+
+    import_parser = commands.add_parser('import-journals', help='从任务日志导入已生成的PDF')
+    import_parser.add_argument('journal_dir', nargs='?', help='任务日志目录，默认为输出目录下的.journal')
+
+    args = parser.parse_args()
+
+    library = LibraryIndex(args.db or default_library_path(args.dir))
+    try:
+        if args.command == 'list':
+            if args.sync:
+                library.sync(args.dir)
+            entries = library.entries(args.search, args.limit, args.offset)
+            if args.json:
+                sys.stdout.write(json.dumps(entries, ensure_ascii=False) + '\n')
+            else:
+                for entry in entries:
+                    album = f"JM{entry['album_id']}" if entry['album_id'] else '-'
+                    pages = entry['pages'] if entry['pages'] is not None else '-'
+                    print(f"{album:<12} {pages:>5}页 {entry['size'] / 1024 / 1024:8.1f} MB  {entry['path']}")
+                print(f"共 {len(entries)} 个PDF")
+            return 0
+
+        if args.command == 'get':
+            entry = library.verified(args.album_id)
+            if entry is None:
+                print(json.dumps(None))
+                return 1
+            print(json.dumps(entry, ensure_ascii=False))
+            return 0
+
+        if args.command == 'sync':
+            result = library.sync(args.dir, force=args.force)
+            print(f"新增 {result['added']} 个，移除 {result['removed']} 个")
+            return 0
+
+        if args.command == 'import-journals':
+            imported = library.import_journals(args.journal_dir or str(Path(args.dir) / '.journal'))
+            print(f"导入 {imported} 个本子")
+            return 0
+    finally:
+        library.close()
+
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
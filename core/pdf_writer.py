@@ -0,0 +1,346 @@
+"""
+流式PDF写入器
+每页的图片对象写入后立即落盘，只在内存中保留对象偏移量，
+结束时再写入页面树、交叉引用表和trailer，峰值内存与页数无关。
+
+追加模式以PDF增量更新的方式在已有文件末尾添加页面：原有对象原样保留，
+只写入新页面、新的页面树和一段只包含这些对象的交叉引用表（/Prev指向原来的表）。
+"""
+import os
+import re
+import shutil
+from typing import Any, Dict, List, Optional, Union
+
+
+# 各图片编码需要的最低PDF版本（JPXDecode从PDF 1.5开始支持）
+FILTER_VERSIONS = {'JPXDecode': '1.5'}
+BASE_VERSION = '1.4'
+
+
+def _version_key(version: str):
+    return tuple(int(part) for part in version.split('.'))
+
+
+# 页面从页面树节点继承的条目，重写页面树根节点时需要保留
+INHERITABLE_KEYS = (b'/Resources', b'/MediaBox', b'/CropBox', b'/Rotate')
+
+
+def _read_xref_section(f, offset: int):
+    """读取一段传统交叉引用表，返回 ({对象号: 偏移量}, trailer字典)"""
+    f.seek(offset)
+    if f.readline().strip() != b'xref':
+        raise ValueError("不支持的PDF结构（交叉引用流）")
+
+    offsets = {}
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("交叉引用表不完整")
+        line = line.strip()
+        if line.startswith(b'trailer'):
+            trailer = line[len(b'trailer'):] + f.read(4096)
+            return offsets, trailer.split(b'startxref', 1)[0]
+        start, count = (int(value) for value in line.split())
+        for obj_id in range(start, start + count):
+            fields = f.readline().split()
+            if len(fields) == 3 and fields[2] == b'n':
+                offsets[obj_id] = int(fields[0])
+
+
+def _read_object(f, offset: int) -> bytes:
+    f.seek(offset)
+    data = b''
+    while b'endobj' not in data:
+        chunk = f.read(64 * 1024)
+        if not chunk:
+            raise ValueError("PDF对象不完整")
+        data += chunk
+    return data.split(b'endobj', 1)[0]
+
+
+def _dict_entries(data: bytes) -> Dict[bytes, bytes]:
+    """解析对象中第一个字典的顶层条目，返回 {键: 原始值}（嵌套的字典和数组原样保留）"""
+    start = data.find(b'<<')
+    if start < 0:
+        return {}
+    entries: Dict[bytes, bytes] = {}
+    tokens = re.finditer(rb'<<|>>|\[|\]|\((?:\\.|[^\\)])*\)|/[^\s/<>\[\]()]+', data[start + 2:])
+    depth, key, value_start = 0, None, None
+    for token in tokens:
+        text = token.group()
+        if depth == 0 and text == b'>>':
+            if key is not None:
+                entries[key] = data[start + 2 + value_start:start + 2 + token.start()].strip()
+            break
+        if text in (b'<<', b'['):
+            depth += 1
+        elif text in (b'>>', b']'):
+            depth -= 1
+        elif depth == 0 and text.startswith(b'/'):
+            if key is None:
+                key, value_start = text, token.end()
+                continue
+            if data[start + 2 + value_start:start + 2 + token.start()].strip():
+                # 上一个键的值已经结束，这是下一个键
+                entries[key] = data[start + 2 + value_start:start + 2 + token.start()].strip()
+                key, value_start = text, token.end()
+    return entries
+
+
+def _ref(data: bytes, key: bytes) -> Optional[int]:
+    match = re.search(re.escape(key) + rb'\s+(\d+)\s+\d+\s+R', data)
+    return int(match.group(1)) if match else None
+
+
+def read_pdf_structure(path: str) -> Dict[str, Any]:
+    """读取已有PDF的交叉引用表和页面树，供追加模式使用
+    
+    只支持传统的交叉引用表（本写入器和fpdf生成的PDF都是），返回
+    version（文件头中的PDF版本）、size（对象数）、root、info、pages（页面树对象号）、kids、count、startxref，
+    以及页面树根节点上可被页面继承的条目 inherited（例如fpdf把MediaBox写在这里）。
+    """
+    with open(path, 'rb') as f:
+        header = re.match(rb'%PDF-(\d\.\d)', f.read(16))
+        if not header:
+            raise ValueError("不是PDF文件")
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 1024))
+        match = re.search(rb'startxref\s+(\d+)\s+%%EOF\s*$', f.read())
+        if not match:
+            raise ValueError("找不到交叉引用表")
+        startxref = int(match.group(1))
+
+        offsets: Dict[int, int] = {}
+        trailer = None
+        section, visited = startxref, set()
+        while section is not None and section not in visited:
+            visited.add(section)
+            section_offsets, section_trailer = _read_xref_section(f, section)
+            for obj_id, offset in section_offsets.items():
+                offsets.setdefault(obj_id, offset)
+            if trailer is None:
+                trailer = section_trailer
+            prev = re.search(rb'/Prev\s+(\d+)', section_trailer)
+            section = int(prev.group(1)) if prev else None
+
+        size = re.search(rb'/Size\s+(\d+)', trailer)
+        root = _ref(trailer, b'/Root')
+        if size is None or root not in offsets:
+            raise ValueError("trailer不完整")
+
+        pages = _ref(_read_object(f, offsets[root]), b'/Pages')
+        if pages not in offsets:
+            raise ValueError("找不到页面树")
+        pages_object = _read_object(f, offsets[pages])
+        kids = re.search(rb'/Kids\s*\[([^\]]*)\]', pages_object)
+        count = re.search(rb'/Count\s+(\d+)', pages_object)
+        if kids is None or count is None:
+            raise ValueError("页面树不完整")
+
+    return {
+        'version': header.group(1).decode('ascii'),
+        'size': int(size.group(1)),
+        'root': root,
+        'info': _ref(trailer, b'/Info'),
+        'pages': pages,
+        'kids': [int(obj_id) for obj_id in re.findall(rb'(\d+)\s+\d+\s+R', kids.group(1))],
+        'count': int(count.group(1)),
+        'startxref': startxref,
+        'inherited': {key: value for key, value in _dict_entries(pages_object).items()
+                      if key in INHERITABLE_KEYS},
+    }
+
+
+class StreamingPdfWriter:
+    """增量写入的PDF写入器（只支持整页图片，图片数据为JPEG/DCTDecode或JPEG 2000/JPXDecode）"""
+
+    # 对象1固定为Catalog，对象2固定为页面树，在close时写入
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path: str, producer: str = 'JMF', append: bool = False):
+        """append为True时在已有的PDF之后追加页面（增量更新），page_count只计新增的页数"""
+        self.path = path
+        self.temp_path = f"{path}.part"
+        self.producer = producer
+        self.offsets: List[Optional[int]] = [None, None, None]
+        self.page_ids: List[int] = []
+        self.catalog_id = self.CATALOG_ID
+        self.pages_id = self.PAGES_ID
+        self.info_id: Optional[int] = None
+        self.base_kids: List[int] = []
+        self.base_count = 0
+        self.base_inherited: Dict[bytes, bytes] = {}
+        self.prev_xref: Optional[int] = None
+        self.header_version = BASE_VERSION
+        self.version = BASE_VERSION  # 已写入的页面需要的版本，close时大于文件头版本则改写文件头
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if append:
+            structure = read_pdf_structure(path)
+            self.catalog_id = structure['root']
+            self.pages_id = structure['pages']
+            self.info_id = structure['info']
+            self.base_kids = structure['kids']
+            self.base_count = structure['count']
+            self.base_inherited = structure['inherited']
+            self.prev_xref = structure['startxref']
+            self.header_version = self.version = structure['version']
+            self.offsets = [None] * structure['size']
+
+            # 在副本上追加，完成后原子替换，中途失败不影响原文件
+            shutil.copyfile(path, self.temp_path)
+            self.file = open(self.temp_path, 'r+b')
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(self.temp_path, 'wb')
+            self.file.write(f"%PDF-{BASE_VERSION}\n".encode('ascii') + b'%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_ids)
+
+    def _new_id(self) -> int:
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _begin_object(self, obj_id: int):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n".encode('ascii'))
+
+    def _write_object(self, obj_id: int, body: str):
+        self._begin_object(obj_id)
+        self.file.write(body.encode('latin-1'))
+        self.file.write(b'\nendobj\n')
+
+    def _write_stream(self, obj_id: int, dictionary: str, data: Union[bytes, str]):
+        """写入流对象，data为bytes或文件路径（按块复制，不整体读入内存）"""
+        if isinstance(data, (bytes, bytearray)):
+            length = len(data)
+        else:
+            length = os.path.getsize(data)
+
+        self._begin_object(obj_id)
+        self.file.write(f"<< {dictionary} /Length {length} >>\nstream\n".encode('latin-1'))
+        if isinstance(data, (bytes, bytearray)):
+            self.file.write(data)
+        else:
+            with open(data, 'rb') as src:
+                shutil.copyfileobj(src, self.file, 1024 * 1024)
+        self.file.write(b'\nendstream\nendobj\n')
+
+    def add_image_page(self,
+                       source: Union[bytes, str],
+                       img_width: int,
+                       img_height: int,
+                       page_width: float,
+                       page_height: float,
+                       x: float,
+                       y: float,
+                       width: float,
+                       height: float,
+                       color_space: str = 'DeviceRGB',
+                       image_filter: str = 'DCTDecode'):
+        """添加一页，图片按给定位置放置（x, y为距页面左上角的距离，单位pt）"""
+        required = FILTER_VERSIONS.get(image_filter)
+        if required and _version_key(required) > _version_key(self.version):
+            self.version = required
+
+        image_id = self._new_id()
+        content_id = self._new_id()
+        page_id = self._new_id()
+
+        self._write_stream(
+            image_id,
+            f"/Type /XObject /Subtype /Image /Width {img_width} /Height {img_height} "
+            f"/ColorSpace /{color_space} /BitsPerComponent 8 /Filter /{image_filter}",
+            source
+        )
+
+        # PDF坐标系原点在左下角
+        content = (
+            f"q {width:.2f} 0 0 {height:.2f} {x:.2f} {page_height - y - height:.2f} cm /Im0 Do Q"
+        ).encode('ascii')
+        self._write_stream(content_id, '', content)
+
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent {self.pages_id} 0 R "
+            f"/MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>"
+        )
+
+        self.page_ids.append(page_id)
+        self.file.flush()
+
+    def close(self):
+        """写入页面树、Catalog、交叉引用表，并把临时文件原子替换为目标文件
+        
+        追加模式只重写页面树，Catalog和Info沿用原来的对象；原来根节点上可继承的条目原样保留
+        （新页面自己带有MediaBox和Resources，不受影响）。
+        页面用到了更高版本的编码（例如JPXDecode）时改写文件头的版本号（长度相同，不影响对象偏移量），
+        追加模式下不会低于原文件的版本。
+        """
+        if self.version != self.header_version:
+            self.file.seek(0)
+            self.file.write(f"%PDF-{self.version}".encode('ascii'))
+            self.file.seek(0, os.SEEK_END)
+
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self.base_kids + self.page_ids)
+        inherited = ''.join(f" {key.decode('latin-1')} {value.decode('latin-1')}"
+                            for key, value in self.base_inherited.items())
+        self._write_object(
+            self.pages_id,
+            f"<< /Type /Pages /Kids [{kids}] /Count {self.base_count + len(self.page_ids)}{inherited} >>"
+        )
+
+        if self.prev_xref is None:
+            self._write_object(self.catalog_id, f"<< /Type /Catalog /Pages {self.pages_id} 0 R >>")
+            self.info_id = self._new_id()
+            self._write_object(self.info_id, f"<< /Producer ({self.producer}) >>")
+
+        xref_offset = self.file.tell()
+        if self.prev_xref is None:
+            self.file.write(f"xref\n0 {len(self.offsets)}\n".encode('ascii'))
+            self.file.write(b'0000000000 65535 f \n')
+            for offset in self.offsets[1:]:
+                self.file.write(f"{offset:010d} 00000 n \n".encode('ascii'))
+        else:
+            # 只列出本次写入的对象，按连续的对象号分段（第一段是对象0的空闲项）
+            self.file.write(b'xref\n0 1\n0000000000 65535 f \n')
+            written = [obj_id for obj_id, offset in enumerate(self.offsets) if offset is not None]
+            start = 0
+            for i in range(1, len(written) + 1):
+                if i == len(written) or written[i] != written[i - 1] + 1:
+                    self.file.write(f"{written[start]} {i - start}\n".encode('ascii'))
+                    for obj_id in written[start:i]:
+                        self.file.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode('ascii'))
+                    start = i
+
+        trailer = f"/Size {len(self.offsets)} /Root {self.catalog_id} 0 R"
+        if self.info_id is not None:
+            trailer += f" /Info {self.info_id} 0 R"
+        if self.prev_xref is not None:
+            trailer += f" /Prev {self.prev_xref}"
+        self.file.write(f"trailer\n<< {trailer} >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,206 @@
+"""
+下载阶段使用的jmcomic下载器
+单独成一个模块，只有真正需要下载时才导入jmcomic，跳过已完成的本子、查看帮助等不需要承担它的导入开销。
+"""
+import os
+import time
+from urllib.parse import urlparse
+from typing import List, Optional, Set, Tuple
+
+from jmcomic import JmDownloader
+
+from concurrency import DownloadCancelled
+
+
+def image_cache_key(image, img_save_path: str, decode: bool) -> str:
+    """图片缓存键：图片URL（去掉查询参数）+ 是否解密 + 保存格式"""
+    url = image.download_url.split('?', 1)[0]
+    suffix = os.path.splitext(img_save_path)[1].lower()
+    return f"{url}|decode={int(bool(decode))}|{suffix}"
+
+
+class PipelineDownloader(JmDownloader):
+    """每下载完一张图片就提交给预处理流水线的下载器
+    
+    可选使用本地图片缓存、记录/跳过已完成图片的任务日志、按运行期健康度调整域名顺序，
+    以及按域名自适应限制同时进行的图片请求数。设置cancel_event后尚未开始的章节和图片不再下载。
+    传入metrics时逐张记录图片的字节数、耗时和来源。
+    每个章节开始时记录其全部图片的保存路径（expected_images），供下载后的完整性校验使用。
+    传入existing_photos（已生成的PDF包含的章节）时，如果它们仍是本子开头的章节，只下载之后的新章节。
+    """
+    
+    def __init__(self,
+                 option,
+                 pipeline=None,
+                 image_cache=None,
+                 journal=None,
+                 domain_ranker=None,
+                 limiter=None,
+                 cancel_event=None,
+                 metrics=None,
+                 existing_photos: Optional[List[str]] = None):
+        self.domain_ranker = domain_ranker
+        self.limiter = limiter
+        self.cancel_event = cancel_event
+        self.metrics = metrics
+        super().__init__(option)
+        self.pipeline = pipeline
+        self.image_cache = image_cache
+        self.journal = journal
+        self.existing_photos = existing_photos
+        self.skip_photos: Set[str] = set()
+        self.expected_photos = set()
+        self.expected_images = {}  # 规范化的保存路径 -> (保存路径, 图片信息)
+    
+    def create_client(self):
+        client = super().create_client()
+        if self.domain_ranker is not None:
+            self.domain_ranker.attach(client)
+        if self.limiter is not None:
+            self.limiter.attach(client)
+        return client
+    
+    def _fetch_image(self, image, img_save_path: str):
+        """从网络下载图片，自适应模式下先占用对应域名的并发槽位（等待槽位的时间不计入耗时）"""
+        host = urlparse(image.download_url).netloc
+        started = self.limiter.acquire(host) if self.limiter is not None else time.perf_counter()
+        ok = False
+        size = 0
+        try:
+            super().download_by_image_detail(image)
+            ok = os.path.exists(img_save_path)
+            size = os.path.getsize(img_save_path) if ok else 0
+        finally:
+            if self.limiter is not None:
+                self.limiter.release(host, started, ok, size)
+        
+        if ok:
+            self.report_image(image, size, time.perf_counter() - started)
+    
+    def report_image(self, image, size: int, latency: float, source: str = 'network', decode: float = None):
+        """记录一张图片的统计（未传入metrics时忽略）"""
+        if self.metrics is not None:
+            self.metrics.image(urlparse(image.download_url).netloc, size, latency, source, decode)
+    
+    def _skip_download(self, image, img_save_path: str):
+        """图片已在本地，不访问网络，只触发回调"""
+        image.save_path = img_save_path
+        image.exists = True
+        image.cache = True
+        self.before_image(image, img_save_path)
+        self.after_image(image, img_save_path)
+    
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+    
+    def reuse_local_image(self, image, img_save_path: str) -> tuple:
+        """任务日志或图片缓存中已有图片时直接使用，返回(是否已跳过下载, 缓存键)"""
+        # 上次运行已完整下载的图片
+        if self.journal is not None and self.journal.has_image(img_save_path):
+            self._skip_download(image, img_save_path)
+            self.report_image(image, os.path.getsize(img_save_path), 0.0, source='journal')
+            return True, None
+        
+        key = None
+        if self.image_cache is not None:
+            key = image_cache_key(image, img_save_path, self.option.decide_download_image_decode(image))
+            
+            # 缓存命中时不访问网络
+            if not os.path.exists(img_save_path) and self.image_cache.get(key, img_save_path):
+                self._skip_download(image, img_save_path)
+                self.report_image(image, os.path.getsize(img_save_path), 0.0, source='cache')
+                if self.journal is not None:
+                    self.journal.record_image(img_save_path)
+                return True, None
+        
+        return False, key
+    
+    def store_image(self, img_save_path: str, key: Optional[str]):
+        """图片下载完成后写入缓存和任务日志"""
+        if os.path.exists(img_save_path):
+            if key is not None:
+                self.image_cache.put(key, img_save_path)
+            if self.journal is not None:
+                self.journal.record_image(img_save_path)
+    
+    def download_by_photo_detail(self, photo):
+        if self.cancelled():
+            return
+        super().download_by_photo_detail(photo)
+    
+    def download_by_image_detail(self, image):
+        # 已取消的任务只记录失败，不再发起请求
+        if self.cancelled():
+            self.download_failed_image.append((image, DownloadCancelled('任务已取消')))
+            return
+        
+        img_save_path = self.option.decide_image_filepath(image)
+        skipped, key = self.reuse_local_image(image, img_save_path)
+        if skipped:
+            return
+        
+        self._fetch_image(image, img_save_path)
+        self.store_image(img_save_path, key)
+    
+    def before_album(self, album):
+        super().before_album(album)
+        if self.journal is not None:
+            self.journal.record_download_dir(self.option.dir_rule.decide_album_root_dir(album))
+        
+        if not self.existing_photos:
+            return
+        photo_ids = [str(photo.id) for photo in album]
+        if photo_ids[:len(self.existing_photos)] == list(self.existing_photos):
+            self.skip_photos = set(self.existing_photos)
+        else:
+            # 已有的章节被删除或调整了顺序，不能只在末尾追加
+            print("本子的章节列表有变化，重新下载全部章节")
+    
+    def do_filter(self, detail):
+        detail = super().do_filter(detail)
+        if self.skip_photos and detail.is_album():
+            return [photo for photo in detail if str(photo.id) not in self.skip_photos]
+        return detail
+    
+    def before_photo(self, photo):
+        super().before_photo(photo)
+        self.expected_photos.add(str(photo.id))
+        for image in photo:
+            img_save_path = self.option.decide_image_filepath(image)
+            self.expected_images[os.path.normcase(os.path.abspath(img_save_path))] = (img_save_path, image)
+        if self.metrics is not None:
+            self.metrics.photo(photo.id, len(photo))
+    
+    def expected_image(self, img_path: str) -> Optional[Tuple[str, object]]:
+        """按保存路径查找章节中记录的图片，返回(保存路径, 图片信息)"""
+        return self.expected_images.get(os.path.normcase(os.path.abspath(img_path)))
+    
+    def refetch_image(self, image, img_save_path: str) -> bool:
+        """删除本地文件并重新从网络下载一张图片（不使用图片缓存），返回是否下载成功"""
+        try:
+            os.remove(img_save_path)
+        except FileNotFoundError:
+            pass
+        
+        key = None
+        if self.image_cache is not None:
+            key = image_cache_key(image, img_save_path, self.option.decide_download_image_decode(image))
+        
+        try:
+            self._fetch_image(image, img_save_path)
+        except Exception as e:
+            print(f"重新下载失败 {os.path.basename(img_save_path)}: {e}")
+            return False
+        # 缓存中的旧内容可能就是损坏的，下载成功后覆盖
+        self.store_image(img_save_path, key)
+        return os.path.exists(img_save_path)
+    
+    def after_photo(self, photo):
+        super().after_photo(photo)
+        if self.journal is not None:
+            self.journal.record_photo(photo.id)
+    
+    def after_image(self, image, img_save_path):
+        super().after_image(image, img_save_path)
+        if self.pipeline is not None:
+            self.pipeline.submit(img_save_path)
@@ -0,0 +1,202 @@
+"""
+PDF预览数据
+转换PDF时顺便生成预览，界面不需要打开PDF就能显示封面和页面概览：
+  <输出目录>/.previews/<PDF名>.json        页数、每页原图尺寸、封面（内嵌data URL）、缩略图总览的排版信息
+  <输出目录>/.previews/<PDF名>.sheet.webp  缩略图总览（页数较多时均匀抽取）
+
+每页的小缩略图在预处理进程中生成（图片已经解码，基线JPEG按缩小比例解码），主进程只负责拼接；
+封面由第一页重新生成。Pillow不支持WebP时使用JPEG。
+JSON中记录了PDF的大小和修改时间，PDF被替换后预览视为过期。
+在已有PDF后追加页面时载入原来的预览，之前页面的缩略图从缩略图总览中裁出，不需要重新处理原来的图片。
+"""
+import io
+import os
+import json
+import base64
+from typing import List, Optional, Tuple
+
+PREVIEW_DIRNAME = '.previews'
+PREVIEW_VERSION = 1
+
+TILE_SIZE = (96, 136)  # 缩略图总览中每页的最大尺寸
+COVER_SIZE = (320, 452)
+SHEET_COLUMNS = 10
+SHEET_GAP = 4
+MAX_SHEET_TILES = 200
+SHEET_BACKGROUND = (18, 19, 24)
+
+
+def preview_paths(pdf_path: str) -> Tuple[str, str]:
+    """返回PDF对应的 (预览JSON路径, 缩略图总览路径)"""
+    directory, filename = os.path.split(os.path.abspath(pdf_path))
+    stem = os.path.splitext(filename)[0]
+    base = os.path.join(directory, PREVIEW_DIRNAME, stem)
+    return f"{base}.json", f"{base}.sheet.{image_format()[1]}"
+
+
+def image_format() -> Tuple[str, str, str]:
+    """预览图片的 (Pillow格式, 扩展名, MIME类型)"""
+    from PIL import features
+
+    if features.check('webp'):
+        return 'WEBP', 'webp', 'image/webp'
+    return 'JPEG', 'jpg', 'image/jpeg'
+
+
+def make_thumbnail(img, size: Tuple[int, int] = TILE_SIZE) -> bytes:
+    """把已打开的图片缩小为JPEG缩略图（在预处理进程中调用）"""
+    from PIL import Image
+
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    scale = min(size[0] / img.width, size[1] / img.height, 1.0)
+    thumb_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    # 先按整数倍缩小再插值，不复制原图
+    thumb = img.resize(thumb_size, Image.BILINEAR, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    thumb.save(buffer, 'JPEG', quality=75)
+    return buffer.getvalue()
+
+
+def sample_indices(count: int, limit: int) -> List[int]:
+    """页数超过limit时均匀抽取（总是包含第一页和最后一页）"""
+    if count <= limit:
+        return list(range(count))
+    return sorted({round(i * (count - 1) / (limit - 1)) for i in range(limit)})
+
+
+class PreviewBuilder:
+    """按页收集尺寸和缩略图，PDF写完后生成预览文件"""
+
+    def __init__(self, max_tiles: int = MAX_SHEET_TILES, columns: int = SHEET_COLUMNS):
+        self.max_tiles = max_tiles
+        self.columns = columns
+        self.dimensions: List[Tuple[int, int]] = []
+        self.thumbnails: List[Optional[bytes]] = []
+        self.cover_source: Optional[str] = None
+        self.cover: Optional[str] = None  # 载入的已有封面
+
+    def load(self, pdf_path: str) -> bool:
+        """载入PDF已有的预览（追加页面前调用），预览不存在或版本不同时返回False"""
+        from PIL import Image
+
+        json_path, _ = preview_paths(pdf_path)
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != PREVIEW_VERSION or not data.get('dimensions'):
+            return False
+
+        self.dimensions = [tuple(size) for size in data['dimensions']]
+        self.thumbnails = [None] * len(self.dimensions)
+        self.cover = data.get('cover')
+
+        sheet = data.get('sheet')
+        if sheet:
+            tile_w, tile_h = sheet['tile']
+            gap, columns = sheet['gap'], sheet['columns']
+            try:
+                with Image.open(os.path.join(os.path.dirname(json_path), sheet['file'])) as image:
+                    image = image.convert('RGB')
+                    for slot, page in enumerate(sheet['pages']):
+                        row, column = divmod(slot, columns)
+                        x = gap + column * (tile_w + gap)
+                        y = gap + row * (tile_h + gap)
+                        # 裁出整个格子（缩略图居中，周围是背景色），重新拼接时位置不变
+                        buffer = io.BytesIO()
+                        image.crop((x, y, x + tile_w, y + tile_h)).save(buffer, 'JPEG', quality=75)
+                        self.thumbnails[page - 1] = buffer.getvalue()
+            except (OSError, IndexError):
+                pass
+        return True
+
+    def add(self, page):
+        """记录一张已写入PDF的页面（PreparedPage）"""
+        if not self.dimensions:
+            self.cover_source = page.source_path
+        self.dimensions.append((page.width, page.height))
+        self.thumbnails.append(page.thumbnail)
+
+    def _cover(self) -> Optional[str]:
+        from PIL import Image
+
+        if not self.cover_source or not os.path.exists(self.cover_source):
+            return None
+
+        pil_format, _, mime = image_format()
+        with Image.open(self.cover_source) as img:
+            if img.format == 'JPEG':
+                img.draft('RGB', COVER_SIZE)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                # 透明背景转白色，与PDF中的页面一致
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', img.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.split()[-1])
+            else:
+                img = img.convert('RGB')
+            img.thumbnail(COVER_SIZE)
+            buffer = io.BytesIO()
+            img.save(buffer, pil_format, quality=80)
+        return f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+    def _sheet(self, path: str) -> Optional[dict]:
+        from PIL import Image
+
+        indices = [i for i in sample_indices(len(self.thumbnails), self.max_tiles) if self.thumbnails[i]]
+        if not indices:
+            return None
+
+        tile_w, tile_h = TILE_SIZE
+        columns = min(self.columns, len(indices))
+        rows = (len(indices) + columns - 1) // columns
+        width = columns * (tile_w + SHEET_GAP) + SHEET_GAP
+        height = rows * (tile_h + SHEET_GAP) + SHEET_GAP
+        sheet = Image.new('RGB', (width, height), SHEET_BACKGROUND)
+
+        for slot, index in enumerate(indices):
+            with Image.open(io.BytesIO(self.thumbnails[index])) as thumb:
+                thumb = thumb.convert('RGB')
+                row, column = divmod(slot, columns)
+                x = SHEET_GAP + column * (tile_w + SHEET_GAP) + (tile_w - thumb.width) // 2
+                y = SHEET_GAP + row * (tile_h + SHEET_GAP) + (tile_h - thumb.height) // 2
+                sheet.paste(thumb, (x, y))
+
+        pil_format = image_format()[0]
+        temp_path = f"{path}.tmp"
+        sheet.save(temp_path, pil_format, quality=70)
+        os.replace(temp_path, path)
+        return {
+            'file': os.path.basename(path),
+            'width': width,
+            'height': height,
+            'columns': columns,
+            'tile': [tile_w, tile_h],
+            'gap': SHEET_GAP,
+            'pages': [i + 1 for i in indices],
+        }
+
+    def write(self, pdf_path: str) -> Optional[str]:
+        """生成预览文件，返回预览JSON的路径；没有页面时返回None"""
+        if not self.dimensions:
+            return None
+
+        json_path, sheet_path = preview_paths(pdf_path)
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+
+        stat = os.stat(pdf_path)
+        data = {
+            'version': PREVIEW_VERSION,
+            'pdf': {'size': stat.st_size, 'mtime_ms': round(stat.st_mtime * 1000, 3)},
+            'pages': len(self.dimensions),
+            'dimensions': [list(size) for size in self.dimensions],
+            'cover': self.cover if self.cover is not None else self._cover(),
+            'sheet': self._sheet(sheet_path),
+        }
+
+        temp_path = f"{json_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, json_path)
+        return json_path
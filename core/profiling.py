@@ -0,0 +1,266 @@
+"""
+性能分析模式
+用 --profiling 或环境变量 JMF_PROFILE=1 开启，处理本子时同时进行：
+  - 采样分析：后台线程定时采样所有线程的调用栈（下载在jmcomic的工作线程中进行），
+    输出折叠栈 <PDF名>.profile.folded，可直接交给 flamegraph.pl / speedscope 生成火焰图
+  - cProfile：对调用线程中的各区段（下载、转换）做确定性分析，输出 <PDF名>.profile.prof（snakeviz/gprof2dot）
+  - tracemalloc：在各阶段结束时做内存快照，汇总峰值、分配最多的代码行和阶段之间的增长
+  - 区段计时：各区段的次数和耗时，以及最慢的页面
+文字汇总写入 <PDF名>.profile.txt。
+
+图片预处理在进程池中执行，不在采样和内存统计范围内，其耗时见事件流中的prepare阶段。
+tracemalloc和采样是进程级的，批量模式同时处理多个本子时结果会互相混合。
+"""
+import io
+import os
+import sys
+import time
+import heapq
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_ENV = 'JMF_PROFILE'
+
+
+def profiling_from_env() -> bool:
+    return os.environ.get(PROFILE_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class StackSampler:
+    """定时采样所有线程的调用栈，按折叠栈计数"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            key = ';'.join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='jmf-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+# tracemalloc是进程级的，多个分析器同时运行时按引用计数启停
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class AlbumProfiler:
+    """单个本子的性能分析，enabled为False时所有方法都不做任何事"""
+
+    def __init__(self, enabled: bool = False, label: str = '', sample_interval: float = 0.005, top: int = 25):
+        self.enabled = enabled
+        self.label = label
+        self.top = top
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.perf_counter()
+
+        self.sections: Dict[str, List[float]] = {}  # 区段 -> [次数, 总耗时, 最长耗时]
+        self.slowest: List[Tuple[float, str]] = []  # 最慢的页面（小顶堆）
+        self.stats = None  # pstats.Stats
+        self.snapshots: List[Tuple[str, object]] = []
+        self.peak_memory = 0
+        self.sampler: Optional[StackSampler] = None
+
+        if enabled:
+            self.sampler = StackSampler(sample_interval)
+            self.sampler.start()
+            _start_tracemalloc()
+
+    @contextmanager
+    def section(self, name: str, item: str = None):
+        """计时一个区段；线程中最外层的区段同时用cProfile分析，传入item时记录最慢的几项"""
+        if not self.enabled:
+            yield
+            return
+
+        import cProfile
+
+        depth = getattr(self.local, 'depth', 0)
+        profile = None
+        if depth == 0:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 已有其他分析器在运行（Python 3.12起同一时间只能有一个）
+                profile = None
+
+        self.local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.local.depth = depth
+            if profile is not None:
+                profile.disable()
+            self._record(name, elapsed, item, profile)
+
+    def _record(self, name: str, elapsed: float, item: Optional[str], profile):
+        import pstats
+
+        with self.lock:
+            total = self.sections.setdefault(name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += elapsed
+            total[2] = max(total[2], elapsed)
+
+            if item is not None:
+                entry = (elapsed, f"{name}: {item}")
+                if len(self.slowest) < 10:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heappushpop(self.slowest, entry)
+
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile, stream=io.StringIO())
+                else:
+                    self.stats.add(profile)
+
+    def snapshot(self, name: str):
+        """阶段结束时记录内存快照"""
+        if not self.enabled:
+            return
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            return
+        # 排除分析工具自身的分配
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '*cProfile.py'),
+            tracemalloc.Filter(False, '*pstats.py'),
+            tracemalloc.Filter(False, '*profile.py'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        with self.lock:
+            self.snapshots.append((name, snapshot))
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+
+    def _report(self) -> str:
+        out = io.StringIO()
+        elapsed = time.perf_counter() - self.started
+        out.write(f"性能分析: {self.label}\n总耗时: {elapsed:.3f}s\n\n")
+
+        out.write("区段耗时:\n")
+        for name, (count, total, longest) in self.sections.items():
+            out.write(f"  {name:<12} 次数 {count:<6} 总计 {total:9.3f}s  最长 {longest:8.4f}s\n")
+
+        if self.slowest:
+            out.write("\n最慢的项:\n")
+            for elapsed, item in sorted(self.slowest, reverse=True):
+                out.write(f"  {elapsed:8.4f}s  {item}\n")
+
+        if self.sampler is not None:
+            out.write(f"\n采样: {self.sampler.samples} 次，间隔 {self.sampler.interval * 1000:.0f}ms\n")
+
+        if self.snapshots:
+            out.write(f"\n内存峰值(tracemalloc): {self.peak_memory / 1024 / 1024:.1f} MB\n")
+            name, last = self.snapshots[-1]
+            out.write(f"\n分配最多的代码行（{name}结束时）:\n")
+            for stat in last.statistics('lineno')[:self.top]:
+                out.write(f"  {stat}\n")
+
+            for (prev_name, prev), (name, snapshot) in zip(self.snapshots, self.snapshots[1:]):
+                out.write(f"\n增长最多的代码行（{prev_name} -> {name}）:\n")
+                for stat in snapshot.compare_to(prev, 'lineno')[:self.top // 2]:
+                    out.write(f"  {stat}\n")
+
+        if self.stats is not None:
+            out.write("\ncProfile（按累计耗时）:\n")
+            self.stats.stream = out
+            self.stats.sort_stats('cumulative').print_stats(self.top * 2)
+
+        return out.getvalue()
+
+    def dump(self, base_path: str) -> List[str]:
+        """停止分析并写出 <base_path>.profile.txt/.folded/.prof，返回写出的文件"""
+        if not self.enabled:
+            return []
+
+        self.enabled = False
+        if self.sampler is not None:
+            self.sampler.stop()
+
+        paths = []
+        try:
+            report = self._report()
+            path = f"{base_path}.profile.txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(report)
+            paths.append(path)
+
+            if self.sampler is not None and self.sampler.counts:
+                path = f"{base_path}.profile.folded"
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(self.sampler.folded())
+                paths.append(path)
+
+            if self.stats is not None:
+                path = f"{base_path}.profile.prof"
+                self.stats.dump_stats(path)
+                paths.append(path)
+        finally:
+            _stop_tracemalloc()
+            self.snapshots.clear()
+
+        return paths
@@ -108,6 +108,7 @@ let outputDir = defaultOutputDir
 
 const downloaderScript = path.join(coreDir, 'downloader.py')
 const depsScript = path.join(coreDir, 'deps.py')
+const libraryScript = path.join(coreDir, 'library.py')
 
 function createWindow() {
     mainWindow = new BrowserWindow({
@@ -507,22 +508,199 @@ function resolvePython() {
     return null
 }
 
-function streamChild(child, event) {
-    if (child.stdout) {
-        child.stdout.setEncoding('utf8')
-        child.stdout.on('data', (data) => {
-            const msg = data.toString('utf8')
-            event.sender.send('download-log', msg)
-        })
+// 常驻下载进程（downloader.py --serve），避免每个本子都重新启动解释器和导入依赖
+let downloadWorker = null
+let downloadWorkerKey = null
+let downloadJobSeq = 0
+const downloadJobs = new Map() // jobId -> { sender, worker }
+
+function getDownloadWorker(py) {
+    // 使用正确的设置目录中的配置文件（如果存在）
+    const userConfigPath = path.join(settingsDir, 'option.yml')
+    const configToUse = fs.existsSync(userConfigPath) ? userConfigPath : path.join(coreDir, 'option.yml')
+
+    // 读取应用设置中只影响Python进程启动参数的选项
+    let adaptiveThreads = false
+    try {
+        const settingsPath = path.join(settingsDir, 'settings.json')
+        if (fs.existsSync(settingsPath)) {
+            const appSettings = JSON.parse(fs.readFileSync(settingsPath, 'utf8'))
+            adaptiveThreads = !!(appSettings.download && appSettings.download.adaptiveThreads)
+        }
+    } catch (error) {
+        console.error('读取设置失败:', error)
     }
 
-    if (child.stderr) {
-        child.stderr.setEncoding('utf8')
-        child.stderr.on('data', (data) => {
-            const msg = data.toString('utf8')
-            event.sender.send('download-log', msg)
-        })
+    // 配置文件、输出目录或启动参数变化时需要重启常驻进程
+    const workerKey = `${py.cmd}|${configToUse}|${outputDir}|${adaptiveThreads}`
+    if (downloadWorker && downloadWorkerKey === workerKey) {
+        return downloadWorker
+    }
+    if (downloadWorker) {
+        stopDownloadWorker()
+    }
+
+    // 准备spawn环境变量，特别适配打包环境
+    const spawnEnv = {
+        ...process.env,
+        PYTHONPATH: coreDir,
+        PYTHONIOENCODING: 'utf-8',
+        PYTHONUTF8: '1',
+        LC_ALL: 'zh_CN.UTF-8',
+        LANG: 'zh_CN.UTF-8'
+    }
+
+    // 在打包环境中增强PATH
+    if (app.isPackaged) {
+        const additionalPaths = [
+            'C:\\Python39',
+            'C:\\Python310',
+            'C:\\Python311',
+            'C:\\Python312',
+            'C:\\Python313',
+            'C:\\Python39\\Scripts',
+            'C:\\Python310\\Scripts',
+            'C:\\Python311\\Scripts',
+            'C:\\Python312\\Scripts',
+            'C:\\Python313\\Scripts'
+        ].filter(p => fs.existsSync(p)).join(';')
+
+        if (additionalPaths) {
+            spawnEnv.PATH = `${spawnEnv.PATH};${additionalPaths}`
+        }
+    }
+
+    // 构建命令行参数，确保路径正确引用
+    const args = [...py.args, downloaderScript, '--serve']
+    if (configToUse) {
+        args.push('--config', configToUse)
+    }
+    if (outputDir) {
+        args.push('--output', outputDir)
+    }
+    if (adaptiveThreads) {
+        args.push('--adaptive-threads')
     }
+
+    console.log('Python命令:', py.cmd)
+    console.log('完整参数:', args)
+    console.log('配置文件路径:', configToUse)
+    console.log('输出目录:', outputDir)
+
+    const child = spawn(py.cmd, args, {
+        cwd: coreDir,
+        env: spawnEnv,
+        windowsHide: true,
+        encoding: 'utf8',
+        stdio: ['pipe', 'pipe', 'pipe'],
+        shell: true // 确保在shell中执行，这在打包环境中很重要
+    })
+
+    // stdout只承载JSON协议消息，日志走stderr
+    let pending = ''
+    child.stdout.setEncoding('utf8')
+    child.stdout.on('data', (data) => {
+        pending += data.toString('utf8')
+        let index
+        while ((index = pending.indexOf('\n')) >= 0) {
+            const line = pending.slice(0, index).trim()
+            pending = pending.slice(index + 1)
+            if (line) {
+                handleWorkerMessage(line)
+            }
+        }
+    })
+
+    child.stderr.setEncoding('utf8')
+    child.stderr.on('data', (data) => {
+        const msg = data.toString('utf8')
+        // 日志只发给这个进程的任务，重启期间新旧进程的日志不会串到别的任务窗口
+        for (const [, { sender }] of workerJobs(child)) {
+            if (!sender.isDestroyed()) {
+                sender.send('download-log', msg)
+            }
+        }
+    })
+
+    child.on('close', (code) => {
+        if (downloadWorker === child) {
+            downloadWorker = null
+            downloadWorkerKey = null
+        }
+        // 进程退出时还没完成的任务（意外退出，或主动重启的旧进程崩溃）直接结束
+        for (const [jobId, { sender }] of workerJobs(child)) {
+            downloadJobs.delete(jobId)
+            if (!sender.isDestroyed()) {
+                sender.send('download-done', code ?? -1)
+            }
+        }
+    })
+
+    child.on('error', (err) => {
+        console.error('Python进程启动错误:', err)
+        const errorMsg = app.isPackaged ?
+            `Python进程错误: ${String(err)}\n\n这可能是由于Python环境配置问题导致的。\n建议:\n1. 确保Python已正确安装\n2. 重新安装Python并勾选"Add Python to PATH"\n3. 重启计算机\n4. 以管理员身份运行此应用` :
+            `Python进程错误: ${String(err)}`
+        for (const [jobId, { sender }] of workerJobs(child)) {
+            downloadJobs.delete(jobId)
+            if (!sender.isDestroyed()) {
+                sender.send('download-error', errorMsg)
+            }
+        }
+    })
+
+    downloadWorker = child
+    downloadWorkerKey = workerKey
+    return child
+}
+
+// 某个常驻进程负责的任务（返回副本，遍历时可以删除）
+function workerJobs(child) {
+    return [...downloadJobs].filter(([, job]) => job.worker === child)
+}
+
+function handleWorkerMessage(line) {
+    let message
+    try {
+        message = JSON.parse(line)
+    } catch (e) {
+        console.log('下载进程输出:', line)
+        return
+    }
+
+    // 进度事件，job为对应任务的请求id
+    if (message.event && message.job !== undefined) {
+        const job = downloadJobs.get(message.job)
+        if (job && !job.sender.isDestroyed()) {
+            job.sender.send('download-event', message)
+        }
+        return
+    }
+
+    if (message.id === undefined || !downloadJobs.has(message.id)) {
+        return
+    }
+
+    const { sender } = downloadJobs.get(message.id)
+    downloadJobs.delete(message.id)
+    if (!sender.isDestroyed()) {
+        // 0: 成功, 1: 失败, 2: 已取消
+        sender.send('download-done', message.ok ? 0 : (message.cancelled ? 2 : 1))
+    }
+}
+
+function stopDownloadWorker() {
+    if (!downloadWorker) {
+        return
+    }
+    try {
+        downloadWorker.stdin.write(JSON.stringify({ cmd: 'shutdown' }) + '\n')
+        downloadWorker.stdin.end()
+    } catch (e) {
+        downloadWorker.kill()
+    }
+    downloadWorker = null
+    downloadWorkerKey = null
 }
 
 app.whenReady().then(() => {
@@ -536,6 +714,7 @@ app.whenReady().then(() => {
 })
 
 app.on('window-all-closed', () => {
+    stopDownloadWorker()
     if (process.platform !== 'darwin') {
         app.quit()
     }
@@ -598,77 +777,10 @@ ipcMain.on('download', async (event, albumId) => {
     }
 
     try {
-        // 准备spawn环境变量，特别适配打包环境
-        const spawnEnv = {
-            ...process.env,
-            PYTHONPATH: coreDir,
-            PYTHONIOENCODING: 'utf-8',
-            PYTHONUTF8: '1',
-            LC_ALL: 'zh_CN.UTF-8',
-            LANG: 'zh_CN.UTF-8'
-        }
-
-        // 在打包环境中增强PATH
-        if (app.isPackaged) {
-            const additionalPaths = [
-                'C:\\Python39',
-                'C:\\Python310',
-                'C:\\Python311',
-                'C:\\Python312',
-                'C:\\Python313',
-                'C:\\Python39\\Scripts',
-                'C:\\Python310\\Scripts',
-                'C:\\Python311\\Scripts',
-                'C:\\Python312\\Scripts',
-                'C:\\Python313\\Scripts'
-            ].filter(p => fs.existsSync(p)).join(';')
-
-            if (additionalPaths) {
-                spawnEnv.PATH = `${spawnEnv.PATH};${additionalPaths}`
-            }
-        }
-
-        // 使用正确的设置目录中的配置文件（如果存在）
-        const userConfigPath = path.join(settingsDir, 'option.yml')
-        const configToUse = fs.existsSync(userConfigPath) ? userConfigPath : path.join(coreDir, 'option.yml')
-
-        // 构建命令行参数，确保路径正确引用
-        const args = [...py.args, downloaderScript, String(albumId)]
-        if (configToUse) {
-            args.push('--config', configToUse)
-        }
-        if (outputDir) {
-            args.push('--output', outputDir)
-        }
-
-        console.log('Python命令:', py.cmd)
-        console.log('完整参数:', args)
-        console.log('配置文件路径:', configToUse)
-        console.log('输出目录:', outputDir)
-
-        const child = spawn(py.cmd, args, {
-            cwd: coreDir,
-            env: spawnEnv,
-            windowsHide: true,
-            encoding: 'utf8',
-            stdio: ['ignore', 'pipe', 'pipe'],
-            shell: true // 确保在shell中执行，这在打包环境中很重要
-        })
-
-        streamChild(child, event)
-
-        child.on('close', (code) => {
-            event.sender.send('download-done', code ?? -1)
-        })
-
-        child.on('error', (err) => {
-            console.error('Python进程启动错误:', err)
-            const errorMsg = app.isPackaged ?
-                `Python进程错误: ${String(err)}\n\n这可能是由于Python环境配置问题导致的。\n建议:\n1. 确保Python已正确安装\n2. 重新安装Python并勾选"Add Python to PATH"\n3. 重启计算机\n4. 以管理员身份运行此应用` :
-                `Python进程错误: ${String(err)}`
-            event.sender.send('download-error', errorMsg)
-        })
-
+        const worker = getDownloadWorker(py)
+        const jobId = ++downloadJobSeq
+        downloadJobs.set(jobId, { sender: event.sender, worker })
+        worker.stdin.write(JSON.stringify({ id: jobId, cmd: 'download', album_id: String(albumId) }) + '\n')
     } catch (err) {
         console.error('启动下载进程失败:', err)
         const errorMsg = app.isPackaged ?
@@ -678,6 +790,20 @@ ipcMain.on('download', async (event, albumId) => {
     }
 })
 
+// 取消该窗口提交的所有下载任务（正在执行的任务会尽快停止，排队中的任务直接结束）
+ipcMain.on('cancel-download', (event) => {
+    for (const [jobId, job] of downloadJobs) {
+        if (job.sender !== event.sender) {
+            continue
+        }
+        try {
+            job.worker.stdin.write(JSON.stringify({ cmd: 'cancel', target: jobId }) + '\n')
+        } catch (err) {
+            console.error('发送取消命令失败:', err)
+        }
+    }
+})
+
 ipcMain.handle('install-deps', async () => {
     console.log('开始安装Python依赖...')
     console.log('运行环境:', app.isPackaged ? '打包环境' : '开发环境')
@@ -827,10 +953,57 @@ ipcMain.handle('open-outdir', async () => {
     }
 })
 
+// 查询本子库索引（core/library.py），返回解析后的JSON，失败时返回null
+function queryLibrary(args) {
+    const py = resolvePython()
+    if (!py || !fs.existsSync(libraryScript)) {
+        return Promise.resolve(null)
+    }
+
+    return new Promise((resolve) => {
+        const child = spawn(py.cmd, [...py.args, libraryScript, '--dir', outputDir, ...args], {
+            cwd: coreDir,
+            env: { ...process.env, PYTHONPATH: coreDir, PYTHONIOENCODING: 'utf-8', PYTHONUTF8: '1' },
+            windowsHide: true
+        })
+
+        let stdout = ''
+        child.stdout.setEncoding('utf8')
+        child.stdout.on('data', (data) => { stdout += data })
+        child.stderr.setEncoding('utf8')
+        child.stderr.on('data', (data) => console.error('本子库索引:', data))
+        child.on('error', (err) => {
+            console.error('查询本子库索引失败:', err)
+            resolve(null)
+        })
+        child.on('close', (code) => {
+            try {
+                resolve(code === 0 ? JSON.parse(stdout) : null)
+            } catch (e) {
+                resolve(null)
+            }
+        })
+    })
+}
+
 // PDF预览功能
 ipcMain.handle('get-pdf-list', async () => {
+    ensureOutputDirectory();
+
+    // 优先读取本子库索引（输出目录没有变化时不遍历目录），索引不可用时直接读取目录
+    const entries = await queryLibrary(['list', '--json', '--sync'])
+    if (entries) {
+        return entries.map(entry => ({
+            name: path.basename(entry.path, path.extname(entry.path)),
+            path: entry.path,
+            size: entry.size,
+            created: entry.created * 1000,
+            albumId: entry.album_id,
+            pages: entry.pages,
+        }));
+    }
+
     try {
-        ensureOutputDirectory();
         const files = fs.readdirSync(outputDir);
         const pdfFiles = files
             .filter(file => file.toLowerCase().endsWith('.pdf'))
@@ -1153,6 +1326,32 @@ ipcMain.handle('get-pdf-info', async (event, filePath) => {
     }
 })
 
+// 读取转换时生成的预览（core/preview.py）：封面、缩略图总览和页面尺寸，不需要打开PDF
+ipcMain.handle('get-pdf-preview', async (event, filePath) => {
+    try {
+        const previewDir = path.join(path.dirname(filePath), '.previews')
+        const stem = path.basename(filePath, path.extname(filePath))
+        const previewPath = path.join(previewDir, `${stem}.json`)
+        if (!fs.existsSync(previewPath)) {
+            return null
+        }
+
+        const preview = JSON.parse(await fs.promises.readFile(previewPath, 'utf8'))
+        const stats = await fs.promises.stat(filePath)
+        // PDF被替换后预览已过期
+        if (preview.pdf && (preview.pdf.size !== stats.size || Math.abs(preview.pdf.mtime_ms - stats.mtimeMs) > 1)) {
+            return null
+        }
+        if (preview.sheet) {
+            preview.sheet.path = path.join(previewDir, preview.sheet.file)
+        }
+        return preview
+    } catch (error) {
+        console.error('读取PDF预览失败:', error)
+        return null
+    }
+})
+
 // 应用信息
 ipcMain.handle('get-app-info', () => {
     return {
@@ -4,9 +4,11 @@ const { contextBridge, ipcRenderer } = require('electron')
 contextBridge.exposeInMainWorld('jmf', {
     // 下载功能
     download: (albumId) => ipcRenderer.send('download', albumId),
+    cancel: () => ipcRenderer.send('cancel-download'),
     onLog: (cb) => ipcRenderer.on('download-log', (_, msg) => cb(msg)),
     onDone: (cb) => ipcRenderer.on('download-done', (_, code) => cb(code)),
     onError: (cb) => ipcRenderer.on('download-error', (_, err) => cb(err)),
+    onEvent: (cb) => ipcRenderer.on('download-event', (_, event) => cb(event)),
 
     // 工具功能
     installDeps: () => ipcRenderer.invoke('install-deps'),
@@ -15,6 +17,7 @@ contextBridge.exposeInMainWorld('jmf', {
     // PDF预览功能
     getPDFList: () => ipcRenderer.invoke('get-pdf-list'),
     getPDFInfo: (filePath) => ipcRenderer.invoke('get-pdf-info', filePath),
+    getPDFPreview: (filePath) => ipcRenderer.invoke('get-pdf-preview', filePath),
     openPDFExternal: (filePath) => ipcRenderer.invoke('open-pdf-external', filePath),
     openPDFInNewWindow: () => ipcRenderer.invoke('open-pdf-in-new-window'),
     readPDFFile: (filePath) => ipcRenderer.invoke('read-pdf-file', filePath),
@@ -19,6 +19,7 @@ class JMcomicApp {
             // 输入和按钮
             albumIdInput: document.getElementById('albumId'),
             btnDownload: document.getElementById('btnDownload'),
+            btnCancel: document.getElementById('btnCancel'),
             btnInstall: document.getElementById('btnInstall'),
             btnOpenOut: document.getElementById('btnOpenOut'),
             btnPreview: document.getElementById('btnPreview'),
@@ -36,6 +37,7 @@ class JMcomicApp {
     initEventListeners() {
         // 下载功能
         this.elements.btnDownload.addEventListener('click', () => this.handleDownload());
+        this.elements.btnCancel.addEventListener('click', () => this.handleCancel());
         this.elements.albumIdInput.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') this.handleDownload();
         });
@@ -57,6 +59,7 @@ class JMcomicApp {
             window.jmf.onLog((msg) => this.appendLog(msg));
             window.jmf.onDone((code) => this.handleDownloadDone(code));
             window.jmf.onError((err) => this.handleDownloadError(err));
+            window.jmf.onEvent?.((event) => this.handleDownloadEvent(event));
         }
     }
 
@@ -235,6 +238,8 @@ class JMcomicApp {
         this.elements.btnDownload.disabled = busy;
         this.elements.albumIdInput.disabled = busy;
         this.elements.btnInstall.disabled = busy;
+        this.elements.btnCancel.style.display = busy ? '' : 'none';
+        this.elements.btnCancel.disabled = false;
 
         if (busy) {
             this.setStatus('处理中...', 'processing');
@@ -282,12 +287,40 @@ class JMcomicApp {
         }
     }
 
+    // 取消下载
+    handleCancel() {
+        this.elements.btnCancel.disabled = true;
+        this.appendLog('\n正在取消...\n');
+        this.updateLogHint('正在取消，请稍候...');
+        window.jmf?.cancel();
+    }
+
+    // 处理下载进度事件
+    handleDownloadEvent(event) {
+        if (event.event === 'image' && event.total > 0) {
+            const progress = Math.min(100, Math.round(event.done / event.total * 100));
+            this.elements.progressFill.classList.remove('indeterminate');
+            this.elements.progressFill.style.width = `${progress}%`;
+            this.updateLogHint(`正在下载 ${event.done}/${event.total}`);
+        } else if (event.event === 'stage' && event.stage === 'download') {
+            this.updateLogHint('正在生成PDF...');
+        } else if (event.event === 'album' && event.success && !event.skipped) {
+            this.appendLog(`统计: ${event.pages} 页, ${(event.bytes / 1024 / 1024).toFixed(1)} MB, ` +
+                `${event.elapsed}s, ${event.pages_per_s} 页/s\n`);
+        }
+    }
+
     // 处理下载完成
     handleDownloadDone(code) {
         this.setBusy(false);
         this.showProgress(false);
 
-        if (code === 0) {
+        if (code === 2) {
+            this.appendLog('\n⏹ 已取消，已下载的图片会在下次下载时继续使用\n');
+            this.setStatus('已取消', 'idle');
+            this.showNotification('下载已取消', 'info');
+            this.updateLogHint('操作已取消');
+        } else if (code === 0) {
             this.appendLog('\n✅ 下载和转换完成！\n', 'success');
             this.setStatus('完成', 'success');
             this.showNotification('下载完成！', 'success');
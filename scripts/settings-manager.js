@@ -18,6 +18,7 @@ class SettingsManager {
                 ],
                 retryTimes: 3,
                 imageThreads: 20,
+                adaptiveThreads: false,
                 enableProxy: false,
                 proxyAddress: '127.0.0.1:7890'
             },
@@ -49,6 +50,7 @@ class SettingsManager {
         this.addDomainBtn = document.getElementById('addDomain');
         this.retryTimesInput = document.getElementById('retryTimes');
         this.imageThreadsInput = document.getElementById('imageThreads');
+        this.adaptiveThreadsCheck = document.getElementById('adaptiveThreads');
         this.enableProxyCheck = document.getElementById('enableProxy');
         this.proxyAddressInput = document.getElementById('proxyAddress');
         this.proxySettings = document.querySelector('.proxy-settings');
@@ -177,6 +179,7 @@ class SettingsManager {
         this.populateDomainList();
         this.retryTimesInput.value = this.currentSettings.download.retryTimes;
         this.imageThreadsInput.value = this.currentSettings.download.imageThreads;
+        this.adaptiveThreadsCheck.checked = !!this.currentSettings.download.adaptiveThreads;
         this.enableProxyCheck.checked = this.currentSettings.download.enableProxy;
         this.proxyAddressInput.value = this.currentSettings.download.proxyAddress;
         this.toggleProxySettings();
@@ -246,6 +249,7 @@ class SettingsManager {
                 domains: [...this.currentSettings.download.domains],
                 retryTimes: parseInt(this.retryTimesInput.value),
                 imageThreads: parseInt(this.imageThreadsInput.value),
+                adaptiveThreads: this.adaptiveThreadsCheck.checked,
                 enableProxy: this.enableProxyCheck.checked,
                 proxyAddress: this.proxyAddressInput.value
             },
@@ -7,6 +7,8 @@ class PDFViewerApp {
         this.scale = 1.2;
         this.pdfFiles = [];
         this.selectedFile = null;
+        this.previews = new Map(); // PDF路径 -> 预览数据（null表示没有预览）
+        this.coverObserver = null;
 
         this.initElements();
         this.initEventListeners();
@@ -91,6 +93,16 @@ class PDFViewerApp {
             return;
         }
 
+        // 列表项进入可视区域时才读取封面
+        this.coverObserver?.disconnect();
+        this.coverObserver = new IntersectionObserver((entries) => {
+            entries.forEach(entry => {
+                if (!entry.isIntersecting) return;
+                this.coverObserver.unobserve(entry.target);
+                this.loadCover(entry.target);
+            });
+        }, { root: this.pdfList, rootMargin: '200px' });
+
         this.pdfFiles.forEach(file => {
             const item = document.createElement('div');
             item.className = 'pdf-item';
@@ -98,23 +110,71 @@ class PDFViewerApp {
 
             const createdDate = new Date(file.created).toLocaleDateString('zh-CN');
             const fileSize = this.formatFileSize(file.size);
+            const pages = file.pages ? ` • ${file.pages}页` : '';
 
             item.innerHTML = `
-                <div class="pdf-item-name">${file.name}</div>
-                <div class="pdf-item-info">${fileSize} • ${createdDate}</div>
+                <img class="pdf-item-cover" alt="">
+                <div class="pdf-item-text">
+                    <div class="pdf-item-name">${file.name}</div>
+                    <div class="pdf-item-info">${fileSize}${pages} • ${createdDate}</div>
+                </div>
             `;
 
             item.addEventListener('click', () => this.selectPDF(file, item));
             this.pdfList.appendChild(item);
+            this.coverObserver.observe(item);
         });
     }
 
+    // 读取转换时生成的预览（没有预览时返回null），结果缓存
+    async getPreview(filePath) {
+        if (!this.previews.has(filePath)) {
+            const preview = await window.jmf?.getPDFPreview?.(filePath) || null;
+            this.previews.set(filePath, preview);
+        }
+        return this.previews.get(filePath);
+    }
+
+    async loadCover(item) {
+        const preview = await this.getPreview(item.dataset.filePath);
+        const cover = item.querySelector('.pdf-item-cover');
+        if (preview?.cover && cover) {
+            cover.src = preview.cover;
+            cover.classList.add('loaded');
+        }
+    }
+
+    // 在PDF加载完成前先显示封面、页数和缩略图总览
+    showPreview(preview) {
+        const sheet = preview.sheet ?
+            `<img class="pdf-preview-sheet" src="${this.toFileUrl(preview.sheet.path)}" alt="">` : '';
+        const cover = preview.cover ? `<img class="pdf-preview-cover" src="${preview.cover}" alt="">` : '';
+        this.pdfViewerArea.innerHTML = `
+            <div class="pdf-preview">
+                ${cover}
+                <div class="loading"><div class="loading-spinner"></div><div class="loading-title">共 ${preview.pages} 页，正在加载PDF...</div></div>
+                ${sheet}
+            </div>
+        `;
+    }
+
+    toFileUrl(filePath) {
+        const normalized = filePath.replace(/\\/g, '/').replace(/^\/+/, '');
+        return 'file:///' + encodeURI(normalized).replace(/#/g, '%23').replace(/\?/g, '%3F');
+    }
+
     async selectPDF(file, itemElement) {
         document.querySelectorAll('.pdf-item.active').forEach(item => item.classList.remove('active'));
         itemElement.classList.add('active');
 
         this.selectedFile = file;
-        this.showLoading('正在加载PDF文件...');
+        const preview = await this.getPreview(file.path);
+        if (this.selectedFile !== file) return; // 读取预览期间已选择了其他文件
+        if (preview) {
+            this.showPreview(preview);
+        } else {
+            this.showLoading('正在加载PDF文件...');
+        }
 
         try {
             await this.loadPDF(file.path);